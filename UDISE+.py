@@ -7,7 +7,7 @@ from datetime import datetime, timezone, timedelta, time
 import gspread
 from gspread.exceptions import WorksheetNotFound
 from google.oauth2.service_account import Credentials
-from google.auth.transport.requests import AuthorizedSession
+import sheets_store, photo_store, entry_analytics
 
 # ---------------------------------------------------------
 # AUTHENTICATION GUARD
@@ -62,47 +62,23 @@ def init_gsheets():
         st.error("⚠️ Failed to connect to BPS_Database Google Sheet.")
         st.stop()
 
-@st.cache_resource
-def get_drive_session():
-    return AuthorizedSession(get_google_credentials())
-
 sh = init_gsheets()
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_secure_image_bytes(file_id):
-    try:
-        r = get_drive_session().get(f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media")
-        return r.content if r.status_code == 200 else None
-    except Exception:
-        return None
-
-def get_secure_photo_uri(url):
-    fallback_avatar = "https://www.w3schools.com/howto/img_avatar.png"
-    if pd.isna(url) or url == "" or not isinstance(url, str):
-        return fallback_avatar
-    match = re.search(r"(?:id=|/d/)([\w-]+)", url)
-    if match:
-        img_bytes = fetch_secure_image_bytes(match.group(1))
-        if img_bytes:
-            return f"data:image/jpeg;base64,{base64.b64encode(img_bytes).decode()}"
-    return url if url.startswith("http") else fallback_avatar
-
-@st.cache_data(ttl=300)
+PROGRESSION_SHEET = "udise_progression_2026_27"
+
 def fetch_sheet_data(sheet_name):
     try:
-        ws = sh.worksheet(sheet_name)
-        df = pd.DataFrame(ws.get_all_records())
-        return df.replace({'TRUE': True, 'FALSE': False, 'True': True, 'False': False}).infer_objects(copy=False)
+        return sheets_store.read_sheet("BPS_Database", sheet_name, ttl=300)
     except WorksheetNotFound:
         return pd.DataFrame()
     except Exception:
         return pd.DataFrame()
 
 def clear_sheet_cache():
-    fetch_sheet_data.clear()
+    sheets_store.invalidate("BPS_Database")
 
 def save_progression_record(record_dict):
-    sheet_name = "udise_progression_2026_27"
+    sheet_name = PROGRESSION_SHEET
     headers = [
         "Student_Key", "Roll", "Name", "Previous_Class_2025_26", "Previous_Section_2025_26",
         "Progression_Status", "Marks_Percent", "Days_Attended",
@@ -110,24 +86,15 @@ def save_progression_record(record_dict):
         "Updated_By", "Updated_At"
     ]
     try:
-        ws = sh.worksheet(sheet_name)
+        sheets_store.get_table("BPS_Database", sheet_name).handle()
     except WorksheetNotFound:
         ws = sh.add_worksheet(title=sheet_name, rows=1000, cols=20)
         ws.append_row(headers)
 
-    records = ws.get_all_records()
-    df = pd.DataFrame(records) if records else pd.DataFrame(columns=headers)
-    
-    student_key = str(record_dict["Student_Key"])
-    row_values = [str(record_dict.get(h, "")) for h in headers]
-
-    if not df.empty and "Student_Key" in df.columns and (df["Student_Key"].astype(str) == student_key).any():
-        row_idx = df.index[df["Student_Key"].astype(str) == student_key].tolist()[0] + 2
-        ws.update(range_name=f"A{row_idx}:M{row_idx}", values=[row_values])
-    else:
-        ws.append_row(row_values)
-    
-    clear_sheet_cache()
+    # Student_Key -> row comes from an index kept across saves; saves made within
+    # half a second of each other (several teachers at once) share one batch_update.
+    record = {h: str(record_dict.get(h, "")) for h in headers}
+    sheets_store.queue_upsert("BPS_Database", sheet_name, "Student_Key", record).result()
 
 # ---------------------------------------------------------
 # HEADER
@@ -194,7 +161,7 @@ st.sidebar.info("💡 **Note:** Select a class group, then choose **`'➕ Add St
 # ---------------------------------------------------------
 sm_df = fetch_sheet_data("students_master")
 c6_df = fetch_sheet_data("Class VI")
-prog_df = fetch_sheet_data("udise_progression_2026_27")
+prog_df = fetch_sheet_data(PROGRESSION_SHEET)
 
 if sm_df.empty:
     st.error("❌ No student data found in `students_master`. Please check your BPS_Database Google Sheet.")
@@ -221,77 +188,14 @@ if not c6_df.empty:
 # ---------------------------------------------------------
 # HELPER: AUTOMATIC DATA ENTRY SESSION CLUSTERING
 # ---------------------------------------------------------
-def analyze_automatic_speed_sessions(df):
-    if df.empty or "Updated_At" not in df.columns:
-        return pd.DataFrame()
-        
-    records = []
-    for _, row in df.iterrows():
-        ts_str = str(row.get("Updated_At", "")).strip()
-        parsed_ts = None
-        for fmt in ("%d-%m-%Y %I:%M %p", "%d-%m-%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S"):
-            try:
-                parsed_ts = datetime.strptime(ts_str, fmt)
-                break
-            except Exception:
-                continue
-        if parsed_ts:
-            records.append({
-                "Timestamp": parsed_ts,
-                "Class": str(row.get("Previous_Class_2025_26", "")),
-                "Section": str(row.get("Previous_Section_2025_26", "A")),
-                "Updated_By": str(row.get("Updated_By", "Teacher"))
-            })
-            
-    if not records:
-        return pd.DataFrame()
-        
-    records.sort(key=lambda x: x["Timestamp"])
-    
-    sessions = []
-    current_cluster = [records[0]]
-    
-    for rec in records[1:]:
-        gap_seconds = (rec["Timestamp"] - current_cluster[-1]["Timestamp"]).total_seconds()
-        if gap_seconds <= 300.0:
-            current_cluster.append(rec)
-        else:
-            sessions.append(current_cluster)
-            current_cluster = [rec]
-            
-    if current_cluster:
-        sessions.append(current_cluster)
-        
-    summary_rows = []
-    for idx, cluster in enumerate(sessions, 1):
-        start_t = cluster[0]["Timestamp"]
-        end_t = cluster[-1]["Timestamp"]
-        cnt = len(cluster)
-        
-        duration_sec = max((end_t - start_t).total_seconds(), 30.0 * cnt)
-        duration_min = round(duration_sec / 60.0, 2)
-        avg_sec = round(duration_sec / cnt, 1)
-        speed_hr = round((cnt / duration_sec) * 3600.0, 1)
-        
-        classes_in_session = [r["Class"] for r in cluster if r["Class"]]
-        dom_class = max(set(classes_in_session), key=classes_in_session.count) if classes_in_session else "General"
-        
-        summary_rows.append({
-            "Session_ID": f"Session #{idx:02d}",
-            "Date": start_t.strftime("%d-%m-%Y"),
-            "Class_Group": dom_class,
-            "Start_Time": start_t.strftime("%I:%M %p"),
-            "End_Time": end_t.strftime("%I:%M %p"),
-            "Start_TS": start_t,
-            "End_TS": end_t,
-            "Students_Entered": cnt,
-            "Duration_Minutes": duration_min,
-            "Avg_Seconds_Per_Student": avg_sec,
-            "Entries_Per_Hour": speed_hr,
-            "Operator": cluster[0]["Updated_By"]
-        })
-        
-    return pd.DataFrame(summary_rows)
+@st.cache_data(max_entries=4, show_spinner=False)
+def analyze_automatic_speed_sessions(version, _df):
+    """Entry sessions for the progression sheet, recomputed only when its data version changes."""
+    return entry_analytics.entry_sessions(_df)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def analyze_teacher_throughput(version, _df):
+    return entry_analytics.teacher_throughput(_df)
 
 # ---------------------------------------------------------
 # MAIN UI TABS
@@ -350,7 +254,7 @@ with tab1:
                 
                 thumb_url = stu_record.get("Thumb_URL", "")
                 with st.spinner("Loading student thumbnail..."):
-                    photo_uri = get_secure_photo_uri(thumb_url)
+                    photo_uri = photo_store.get_photo_uri(thumb_url)
                 
                 st.divider()
                 st.markdown(f"""
@@ -560,7 +464,7 @@ with tab1:
             
             thumb_url = stu_record.get("Thumb_URL", "")
             with st.spinner("Loading student thumbnail..."):
-                photo_uri = get_secure_photo_uri(thumb_url)
+                photo_uri = photo_store.get_photo_uri(thumb_url)
             
             prev_class_2025_26 = PREV_CLASS_MAP.get(selected_class, "Unknown / Previous Class")
             
@@ -853,7 +757,8 @@ with tab3:
     st.markdown("### ⏱️ Automatic Speed & Performance Monitor")
     st.caption("⚡ **Fully Auto-Detected:** Sessions start on your first UDISE+ entry and close automatically after **5 minutes of inactivity**.")
     
-    auto_sessions_df = analyze_automatic_speed_sessions(prog_df)
+    prog_version = sheets_store.version("BPS_Database", PROGRESSION_SHEET, ttl=300)
+    auto_sessions_df = analyze_automatic_speed_sessions(prog_version, prog_df)
     
     if auto_sessions_df.empty:
         st.info("💡 No UDISE+ progression entries detected yet. Start saving student progressions in **Tab 1** to automatically trigger live session tracking!")
@@ -908,6 +813,14 @@ with tab3:
             hide_index=True,
             use_container_width=True
         )
+        
+        st.markdown("##### 🧑‍🏫 Per-Teacher Throughput")
+        st.caption("Each teacher's own entries are clustered into sessions, so overlapping work by two teachers is not mixed.")
+        st.dataframe(
+            analyze_teacher_throughput(prog_version, prog_df)[["Teacher", "Sessions", "Records", "Active_Minutes", "Records_Per_Minute"]],
+            hide_index=True,
+            use_container_width=True
+        )
 
 with tab4:
     st.markdown("### 📥 Master UDISE+ Cloud Database")
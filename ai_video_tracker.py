@@ -1,11 +1,11 @@
 import streamlit as st
 import gspread
-from google.oauth2.service_account import Credentials
 import pandas as pd
 from datetime import datetime
 import pytz
 import time
 import re
+import sheets_store
 
 # --- Constants & Formulas ---
 GS_FORMULA = '=IF(INDIRECT("C"&ROW())="RUNNING", "RUNNING", IFERROR(TEXT(MOD(INDIRECT("C"&ROW())-INDIRECT("B"&ROW()), 1), "h:mm"), ""))'
@@ -16,17 +16,10 @@ st.set_page_config(page_title="AI Video Tracker", page_icon="🎬", layout="cent
 # ==========================================
 # Database Connection & Helper Functions
 # ==========================================
-@st.cache_resource
-def init_connection():
-    scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-    creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scopes)
-    return gspread.authorize(creds)
-
 @st.cache_data(ttl=300, show_spinner="Fetching Data...")
 def get_all_data():
-    conn = init_connection()
     try:
-        ss = conn.open("AI Videos")
+        ss = sheets_store.open_spreadsheet("AI Videos")
         
         # 1. Get Video Patterns (Sheet1)
         try:
@@ -65,7 +58,7 @@ def get_all_data():
 
         # 3. Get Routine Log (Fallback for old sessions)
         try:
-            routine_sheet = conn.open("MY ROUTINE 2026").worksheet("activity_log")
+            routine_sheet = sheets_store.worksheet_handle("MY ROUTINE 2026", "activity_log")
             data3 = routine_sheet.get_all_values()
             if data3: data3[0] = [str(x).strip() for x in data3[0]]
             df_routine = pd.DataFrame(data3[1:], columns=data3[0]) if len(data3) > 1 else pd.DataFrame()
@@ -196,13 +189,11 @@ col_start, col_finish = st.columns(2)
 with col_start:
     if st.button(f"▶️ Start {next_session_name}", use_container_width=True, disabled=is_running, type="primary"):
         try:
-            conn = init_connection()
-            
-            routine_sheet = conn.open("MY ROUTINE 2026").worksheet("activity_log")
+            routine_sheet = sheets_store.worksheet_handle("MY ROUTINE 2026", "activity_log")
             routine_row = [today_str, current_time_str, "RUNNING", GS_FORMULA, "AI Videos", next_session_name, "", "Generating AI Videos", "YouTube Creator", "TRUE", "TRUE", "6"]
             routine_sheet.append_row(routine_row, value_input_option="USER_ENTERED")
             
-            videos_sheet = conn.open("AI Videos").worksheet("Sessions")
+            videos_sheet = sheets_store.worksheet_handle("AI Videos", "Sessions")
             session_row = [today_str, current_time_str, "RUNNING", GS_FORMULA, next_session_name]
             videos_sheet.append_row(session_row, value_input_option="USER_ENTERED")
 
@@ -217,17 +208,16 @@ with col_finish:
     btn_label = f"🛑 Finish {active_session_name}" if is_running else "🛑 Finish Active Session"
     if st.button(btn_label, use_container_width=True, disabled=not is_running):
         try:
-            conn = init_connection()
-            
             if active_row_idx_sessions:
-                ws_sessions = conn.open("AI Videos").worksheet("Sessions")
+                ws_sessions = sheets_store.worksheet_handle("AI Videos", "Sessions")
                 try: ws_sessions.update(range_name=f"C{active_row_idx_sessions}:D{active_row_idx_sessions}", values=[[current_time_str, GS_FORMULA]], value_input_option="USER_ENTERED")
                 except TypeError: ws_sessions.update(f"C{active_row_idx_sessions}:D{active_row_idx_sessions}", [[current_time_str, GS_FORMULA]], value_input_option="USER_ENTERED")
             
             if active_row_idx_routine:
-                ws_routine = conn.open("MY ROUTINE 2026").worksheet("activity_log")
+                ws_routine = sheets_store.worksheet_handle("MY ROUTINE 2026", "activity_log")
                 try: ws_routine.update(range_name=f"C{active_row_idx_routine}:D{active_row_idx_routine}", values=[[current_time_str, GS_FORMULA]], value_input_option="USER_ENTERED")
                 except TypeError: ws_routine.update(f"C{active_row_idx_routine}:D{active_row_idx_routine}", [[current_time_str, GS_FORMULA]], value_input_option="USER_ENTERED")
+                sheets_store.invalidate("MY ROUTINE 2026", "activity_log")
 
             get_all_data.clear() 
             st.toast(f"✅ {active_session_name} Finished and Logged!")
@@ -470,8 +460,7 @@ with tab_entry:
                     rows_to_append.append(row_data)
             
             if rows_to_append:
-                conn = init_connection()
-                sheet = conn.open("AI Videos").sheet1
+                sheet = sheets_store.open_spreadsheet("AI Videos").sheet1
                 sheet.append_rows(rows_to_append, value_input_option="USER_ENTERED")
                 get_all_data.clear() 
                 
@@ -0,0 +1,192 @@
+import streamlit as st
+import pandas as pd
+import os
+import re
+import sys
+import json
+import time
+import threading
+import collections
+from gspread.http_client import HTTPClient
+
+# ==========================================
+# GOOGLE API CALL METERING
+# ==========================================
+# Every request gspread sends (from any page's client) and every request of
+# the Drive sessions handed to instrument_session() is timed and logged with
+# the page and function it came from, its size and status. Cached loaders
+# report hits and misses alongside, so the admin panel can show where the
+# Sheets quota (60 requests per minute per user for reads, the same for
+# writes) actually goes. The log is kept in memory only, for the last
+# MAX_EVENTS calls.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_EVENTS = 20000
+QUOTA_PER_MINUTE = 60
+_SKIP_FILES = {os.path.join(REPO_DIR, f) for f in ("api_metrics.py", "sheets_store.py", "cache_registry.py")}
+_READ_SUFFIXES = (":batchGet", ":batchGetByDataFilter")
+
+@st.cache_resource
+def _store():
+    return collections.deque(maxlen=MAX_EVENTS), collections.deque(maxlen=MAX_EVENTS), threading.Lock()
+
+def _origin():
+    """(page, function) of the code that triggered the current call, from the call stack."""
+    page = function = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if path.startswith(REPO_DIR):
+            is_page = frame.f_globals.get("__name__") == "__main__"
+            if function is None and path not in _SKIP_FILES:
+                name = frame.f_code.co_name
+                if is_page: function = "page body" if name == "<module>" else name
+                else: function = f"{os.path.splitext(os.path.basename(path))[0]}.{name}"
+            if is_page:
+                page = os.path.basename(path)
+                break
+        frame = frame.f_back
+    return page or "background", function or "-"
+
+def _endpoint(url):
+    path = re.sub(r"^https?://[^/]+", "", str(url)).split("?")[0]
+    path = re.sub(r"/spreadsheets/[^/:]+", "/spreadsheets/{id}", path)
+    path = re.sub(r"/values/[^/:]+", "/values/{range}", path)
+    return re.sub(r"/files/[^/?]+", "/files/{id}", path)
+
+def _failed(status): return status == "error" or (isinstance(status, int) and status >= 400)
+
+def _is_read(method, endpoint): return method.upper() == "GET" or endpoint.endswith(_READ_SUFFIXES)
+
+def _size(body):
+    if body is None: return 0
+    if isinstance(body, (bytes, str)): return len(body)
+    try: return len(json.dumps(body))
+    except Exception: return 0
+
+def record_call(service, method, url, status, seconds, bytes_in, bytes_out):
+    page, function = _origin()
+    endpoint = _endpoint(url)
+    calls, _, lock = _store()
+    with lock:
+        calls.append((time.time(), page, function, service, method.upper(), endpoint,
+                      "read" if _is_read(method, endpoint) else "write", status, seconds, bytes_in, bytes_out))
+
+def record_cache(function, hit):
+    """Logs one cached-loader lookup; hit=False when the loader actually ran."""
+    page, _ = _origin()
+    _, lookups, lock = _store()
+    with lock: lookups.append((time.time(), page, function, bool(hit)))
+
+def _received(resp):
+    try: return int(resp.headers.get("Content-Length") or len(resp.content))
+    except Exception: return 0
+
+def _metered(service, send):
+    def request(method, url, *args, **kwargs):
+        started, status, received = time.perf_counter(), "error", 0
+        try:
+            resp = send(method, url, *args, **kwargs)
+            status, received = resp.status_code, _received(resp)
+            return resp
+        except Exception as e:
+            resp = getattr(e, "response", None)
+            if resp is not None: status, received = getattr(resp, "status_code", "error"), _received(resp)
+            raise
+        finally:
+            sent = _size(kwargs.get("json")) or _size(kwargs.get("data"))
+            record_call(service, method, url, status, time.perf_counter() - started, received, sent)
+    return request
+
+def install():
+    """Meters every gspread client in the process, including the ones pages authorize themselves. Safe to call repeatedly."""
+    if getattr(HTTPClient.request, "_metered", False): return
+    plain = HTTPClient.request
+    def request(self, method, endpoint, *args, **kwargs):
+        return _metered("sheets", lambda m, u, *a, **k: plain(self, m, u, *a, **k))(method, endpoint, *args, **kwargs)
+    request._metered = True
+    HTTPClient.request = request
+
+def instrument_session(session, service="drive"):
+    """Meters a requests / AuthorizedSession instance (e.g. the Drive photo session) and returns it."""
+    if not getattr(session.request, "_metered", False):
+        session.request = _metered(service, session.request)
+        session.request._metered = True
+    return session
+
+# ==========================================
+# REPORTS
+# ==========================================
+CALL_COLUMNS = ["Time", "Page", "Function", "Service", "Method", "Endpoint", "Kind", "Status", "Seconds", "Bytes_In", "Bytes_Out"]
+LOOKUP_COLUMNS = ["Time", "Page", "Function", "Hit"]
+
+def calls_frame():
+    calls, _, lock = _store()
+    with lock: df = pd.DataFrame(list(calls), columns=CALL_COLUMNS)
+    df["Time"] = pd.to_datetime(df["Time"], unit="s")
+    return df
+
+def lookups_frame():
+    _, lookups, lock = _store()
+    with lock: df = pd.DataFrame(list(lookups), columns=LOOKUP_COLUMNS)
+    df["Time"] = pd.to_datetime(df["Time"], unit="s")
+    return df
+
+def reset():
+    calls, lookups, lock = _store()
+    with lock:
+        calls.clear()
+        lookups.clear()
+
+def last_minute():
+    """{"read": n, "write": n} Sheets requests sent in the last 60 seconds, to compare with QUOTA_PER_MINUTE."""
+    calls, _, lock = _store()
+    since = time.time() - 60
+    with lock: kinds = [c[6] for c in calls if c[0] >= since and c[3] == "sheets"]
+    return {"read": kinds.count("read"), "write": kinds.count("write")}
+
+def summary(by=("Page", "Function")):
+    """Calls, errors, latency and bytes per group, with cache hits and misses of the same group, busiest first."""
+    by = list(by)
+    calls, lookups = calls_frame(), lookups_frame()
+    # Grouping the empty frame as well keeps the index shape the cache join below expects.
+    out = calls.groupby(by).agg(
+        Calls=("Endpoint", "size"), Reads=("Kind", lambda k: int((k == "read").sum())),
+        Throttled=("Status", lambda s: int((s == 429).sum())), Errors=("Status", lambda s: int(s.map(_failed).sum())),
+        Avg_ms=("Seconds", lambda s: round(s.mean() * 1000)), Max_ms=("Seconds", lambda s: round(s.max() * 1000)),
+        KB_In=("Bytes_In", lambda b: round(b.sum() / 1024, 1)), KB_Out=("Bytes_Out", lambda b: round(b.sum() / 1024, 1)),
+    )
+    if not lookups.empty and set(by) <= set(LOOKUP_COLUMNS):
+        hits = lookups.groupby(by)["Hit"].agg(Cache_Hits="sum", Cache_Lookups="size")
+        out = out.join(hits, how="outer")
+        out["Cache_Misses"] = out["Cache_Lookups"] - out["Cache_Hits"]
+        out = out.drop(columns="Cache_Lookups")
+    out = out.fillna(0)
+    counts = [c for c in ("Calls", "Reads", "Throttled", "Errors", "Avg_ms", "Max_ms", "Cache_Hits", "Cache_Misses") if c in out.columns]
+    out[counts] = out[counts].astype(int)
+    return out.sort_values("Calls", ascending=False).reset_index()
+
+def render_panel():
+    """Admin view: quota use in the last minute, per-page / per-function breakdown and CSV export."""
+    used = last_minute()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Sheets reads (last 60 s)", f"{used['read']} / {QUOTA_PER_MINUTE}")
+    c2.metric("Sheets writes (last 60 s)", f"{used['write']} / {QUOTA_PER_MINUTE}")
+    calls = calls_frame()
+    c3.metric("Throttled (429) since start", int((calls["Status"] == 429).sum()) if not calls.empty else 0)
+    if max(used.values()) >= QUOTA_PER_MINUTE * 0.8:
+        st.warning("⚠️ Close to the per-minute Sheets quota; teachers may start seeing 'API Busy'.")
+
+    st.markdown("#### 📄 Per page")
+    st.dataframe(summary(("Page",)), hide_index=True, use_container_width=True)
+    st.markdown("#### 🧩 Per page and function")
+    st.dataframe(summary(), hide_index=True, use_container_width=True)
+    with st.expander("🕒 Latest calls"):
+        st.dataframe(calls.tail(200).iloc[::-1], hide_index=True, use_container_width=True)
+
+    d1, d2, d3 = st.columns(3)
+    d1.download_button("⬇️ Calls CSV", calls.to_csv(index=False).encode("utf-8"), "api_calls.csv", "text/csv", use_container_width=True)
+    d2.download_button("⬇️ Cache lookups CSV", lookups_frame().to_csv(index=False).encode("utf-8"), "cache_lookups.csv", "text/csv", use_container_width=True)
+    if d3.button("🧹 Reset counters", use_container_width=True):
+        reset()
+        st.rerun()
@@ -0,0 +1,28 @@
+import streamlit as st
+import api_metrics, cache_warmup
+
+# ==========================================
+# ADMIN-ONLY GATEKEEPER
+# ==========================================
+if 'authenticated' not in st.session_state or not st.session_state.authenticated:
+    st.warning("🔒 Unauthorized Access. Please log in through the main portal.")
+    st.stop()
+
+if st.session_state.get('user_role') != "admin":
+    st.error("🚫 Access Denied: API usage is only visible to the Head Teacher (Admin).")
+    st.stop()
+
+# ==========================================
+# GOOGLE API USAGE DASHBOARD
+# ==========================================
+st.title("📡 Google API Usage")
+st.caption("Every Sheets and Drive request made by this server since it started (or since the last reset), "
+           "grouped by the page and function that made it. Cache rows show how often a loader was served without a request.")
+
+if st.button("🔄 Refresh", use_container_width=True):
+    st.rerun()
+
+api_metrics.render_panel()
+
+st.markdown("#### 🔥 Cache warm-up")
+cache_warmup.render_status()
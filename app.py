@@ -4,6 +4,11 @@ import pandas as pd
 from datetime import datetime, timedelta, timezone
 import gspread
 from google.oauth2.service_account import Credentials
+import api_metrics, cache_warmup
+
+api_metrics.install()
+# Warms the shared data and photo caches at startup and before the 11:15 MDM rush.
+cache_warmup.start()
 
 # ==========================================
 # 1. GLOBAL PAGE CONFIGURATION
@@ -294,6 +299,7 @@ udise_page = st.Page("UDISE+.py", title="UDISE+ Progression", icon="🎓")
 gas_page = st.Page("bps_gas_tracker.py", title="Gas Tracker", icon="🛢️")
 exam_page = st.Page("bps_exam.py", title="BPS Exams", icon="📝")
 assembly_page = st.Page("bps_assembly.py", title="Assembly Planner", icon="🎙️") # <-- 1. Assembly Page Registered
+api_usage_page = st.Page("api_usage.py", title="API Usage", icon="📡")
 
 def home_page_ui():
     st.markdown(f"<h3 style='margin-bottom: 5px;'>👋 Welcome, {st.session_state.user_name}</h3>", unsafe_allow_html=True)
@@ -343,6 +349,7 @@ if st.session_state.user_role == "admin":
     nav_pages["Applications"].append(assembly_page) # <-- 3. Added to Admin Sidebar
     nav_pages["Applications"].append(udise_page)
     nav_pages["Applications"].append(gas_page)
+    nav_pages["Applications"].append(api_usage_page)
 
 pg = st.navigation(nav_pages)
 pg.run()
@@ -0,0 +1,600 @@
+import os
+import io
+import re
+import sys
+import json
+import time
+import random
+import threading
+import collections
+from datetime import date, datetime, timedelta
+import requests
+import gspread
+from gspread.utils import numericise_all, rowcol_to_a1
+from google.oauth2.service_account import Credentials
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path: sys.path.insert(0, REPO_DIR)
+import api_metrics
+
+# ==========================================
+# LOCAL STAND-IN FOR GOOGLE SHEETS & DRIVE
+# ==========================================
+# Backend keeps spreadsheets as plain lists of string rows in memory and
+# answers the parts of gspread's Client / Spreadsheet / Worksheet API the
+# pages use, plus Drive's files/<id> (modifiedTime and ?alt=media) for the
+# photo store. Every simulated request sleeps for the configured latency and
+# is logged through api_metrics.record_call, exactly like a real one, so the
+# admin usage panel and the benchmarks count them the same way. Drive calls
+# are counted by api_metrics.instrument_session (photo_store wraps its
+# session), not here. Formulas written USER_ENTERED are not evaluated; they
+# read back blank. install() swaps the fakes in for gspread.authorize and
+# the Drive AuthorizedSession in the current process.
+
+LATENCY = {"read": 0.25, "write": 0.40, "drive": 0.15}
+SHEETS_URL = "https://sheets.googleapis.com/v4/spreadsheets/"
+DRIVE_URL = "https://www.googleapis.com/drive/v3/files"
+
+class FakeResponse:
+    """Just enough of requests.Response for gspread.exceptions.APIError and photo_store."""
+
+    def __init__(self, status_code=200, payload=None, content=b""):
+        self.status_code, self.payload = status_code, payload
+        self.content = content if payload is None else json.dumps(payload).encode("utf-8")
+        self.headers = {"Content-Length": str(len(self.content))}
+        self.text = self.content.decode("utf-8", "replace") if payload is not None else ""
+
+    def json(self): return self.payload if self.payload is not None else json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400: raise requests.exceptions.HTTPError(f"{self.status_code} fake error", response=self)
+
+def _error(status, message):
+    return FakeResponse(status, {"error": {"code": status, "message": message, "status": "FAKE"}})
+
+def _text(v):
+    # What Sheets shows (FORMATTED_VALUE) for a written value.
+    if isinstance(v, bool): return "TRUE" if v else "FALSE"
+    if v is None: return ""
+    if isinstance(v, float) and v.is_integer(): return str(int(v))
+    return str(v)
+
+def _entered(v, user_entered):
+    v = _text(v)
+    return "" if user_entered and v.startswith("=") else v
+
+def _trimmed(rows):
+    # Sheets leaves out trailing empty cells and rows.
+    out = [list(r) for r in rows]
+    for r in out:
+        while r and r[-1] == "": r.pop()
+    while out and not out[-1]: out.pop()
+    return out
+
+def _col_number(letters):
+    n = 0
+    for ch in letters.upper(): n = n * 26 + ord(ch) - 64
+    return n
+
+def _bounds(rng):
+    """(first_row, first_col, last_row, last_col) of an A1 range, 1-based; None where it is open-ended."""
+    parts = rng.split(":")
+    found = []
+    for p in parts:
+        m = re.fullmatch(r"([A-Za-z]*)(\d*)", p.strip().replace("$", ""))
+        if not m: raise ValueError(f"bad range {rng}")
+        found.append((int(m.group(2)) if m.group(2) else None, _col_number(m.group(1)) if m.group(1) else None))
+    (r0, c0), (r1, c1) = found[0], found[-1]
+    if len(parts) == 1: return r0 or 1, c0 or 1, r0, c0
+    return r0 or 1, c0 or 1, r1, c1
+
+# ==========================================
+# BACKEND
+# ==========================================
+class Backend:
+    """In-memory Google: books is {title: {worksheet: [rows]}}, first row the header."""
+
+    def __init__(self, books=None, latency=None, jitter=0.2, quota_per_minute=None, photo_count=0, seed=0):
+        self.latency = dict(LATENCY, **(latency or {}))
+        self.jitter, self.quota = jitter, quota_per_minute
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.books, self.keys, self.sheet_ids = {}, {}, {}
+        self.sent = {"read": collections.deque(), "write": collections.deque()}
+        for title, sheets in (books or {}).items(): self.add_book(title, sheets)
+        self.photos = {f"FAKE{i:05d}": "2025-06-01T10:00:00.000Z" for i in range(photo_count)}
+        self._jpeg = None
+
+    def add_book(self, title, sheets):
+        with self.lock:
+            key = f"fake-{len(self.keys) + 1:04d}-" + re.sub(r"\W", "", title)[:20]
+            self.keys[key] = title
+            self.books[title] = collections.OrderedDict()
+            for name, rows in sheets.items(): self.add_sheet(title, name, rows)
+            return key
+
+    def add_sheet(self, title, name, rows=()):
+        with self.lock:
+            self.sheet_ids[(title, name)] = len(self.sheet_ids) + 1
+            self.books[title][name] = [[_text(v) for v in r] for r in rows]
+
+    def key_of(self, title):
+        return next(k for k, t in self.keys.items() if t == title)
+
+    def sheet_title(self, title, sheet_id):
+        return next(n for (t, n), i in self.sheet_ids.items() if t == title and i == sheet_id)
+
+    def call(self, kind, method, url, body=None, answer=None):
+        """Simulates one request: quota check, latency, metering. answer() runs under the data lock."""
+        started = time.perf_counter()
+        status, result = 200, None
+        try:
+            self._spend(kind)
+            time.sleep(max(0.0, self.latency[kind] * (1 + self.random.uniform(-self.jitter, self.jitter))))
+            with self.lock: result = answer() if answer else None
+            return result
+        except gspread.exceptions.APIError as e:
+            status = e.response.status_code
+            raise
+        except (gspread.exceptions.WorksheetNotFound, gspread.exceptions.SpreadsheetNotFound):
+            status = 404
+            raise
+        finally:
+            # Sizing the payload stands in for the JSON decoding a real call pays for; it is not part of the latency.
+            seconds = time.perf_counter() - started
+            sent = len(json.dumps(body, default=str)) if body is not None else 0
+            received = len(json.dumps(result, default=str)) if isinstance(result, (dict, list)) else 0
+            api_metrics.record_call("sheets", method, url, status, seconds, received, sent)
+
+    def _spend(self, kind):
+        if not self.quota: return
+        with self.lock:
+            sent, now = self.sent[kind], time.time()
+            while sent and sent[0] < now - 60: sent.popleft()
+            if len(sent) >= self.quota: raise gspread.exceptions.APIError(_error(429, "Quota exceeded (fake backend)"))
+            sent.append(now)
+
+    def jpeg(self):
+        if self._jpeg is None:
+            from PIL import Image
+            buf = io.BytesIO()
+            Image.new("RGB", (600, 800), (180, 200, 220)).save(buf, "JPEG", quality=85)
+            self._jpeg = buf.getvalue()
+        return self._jpeg
+
+# ==========================================
+# GSPREAD STAND-INS
+# ==========================================
+class FakeHTTPClient:
+    def __init__(self): self.session = requests.Session()
+
+class FakeClient:
+    def __init__(self, backend):
+        self.backend, self.http_client = backend, FakeHTTPClient()
+
+    def open(self, title, folder_id=None):
+        # gspread searches Drive for the title, then fetches the spreadsheet metadata.
+        def search():
+            if title not in self.backend.books: raise gspread.exceptions.SpreadsheetNotFound(title)
+            return {"files": [{"id": self.backend.key_of(title), "name": title}]}
+        self.backend.call("read", "GET", DRIVE_URL, answer=search)
+        return self.open_by_key(self.backend.key_of(title))
+
+    def open_by_key(self, key):
+        def meta():
+            if key not in self.backend.keys: raise gspread.exceptions.SpreadsheetNotFound(key)
+            return {"spreadsheetId": key}
+        self.backend.call("read", "GET", SHEETS_URL + key, answer=meta)
+        return FakeSpreadsheet(self.backend, key)
+
+    def open_by_url(self, url):
+        return self.open_by_key(re.search(r"/d/([\w-]+)", url).group(1))
+
+    def openall(self, title=None):
+        found = self.backend.call("read", "GET", DRIVE_URL, answer=lambda: [k for k, t in self.backend.keys.items() if title in (None, t)])
+        return [FakeSpreadsheet(self.backend, k) for k in found]
+
+class FakeSpreadsheet:
+    def __init__(self, backend, key):
+        self.backend, self.id = backend, key
+        self.title = backend.keys[key]
+        self.url = f"https://docs.google.com/spreadsheets/d/{key}"
+
+    def _url(self, suffix=""): return SHEETS_URL + self.id + suffix
+
+    def _sheets(self): return self.backend.books[self.title]
+
+    def _handle(self, name): return FakeWorksheet(self, name, self.backend.sheet_ids[(self.title, name)])
+
+    def worksheets(self, exclude_hidden=False):
+        names = self.backend.call("read", "GET", self._url(), answer=lambda: list(self._sheets()))
+        return [self._handle(n) for n in names]
+
+    def worksheet(self, title):
+        def find():
+            if title not in self._sheets(): raise gspread.exceptions.WorksheetNotFound(title)
+            return title
+        return self._handle(self.backend.call("read", "GET", self._url(), answer=find))
+
+    def get_worksheet(self, index):
+        names = self.backend.call("read", "GET", self._url(), answer=lambda: list(self._sheets()))
+        return self._handle(names[index]) if index < len(names) else None
+
+    @property
+    def sheet1(self): return self.get_worksheet(0)
+
+    def add_worksheet(self, title, rows=1000, cols=26, index=None):
+        def add():
+            if title in self._sheets(): raise gspread.exceptions.APIError(_error(400, f"A sheet with the name \"{title}\" already exists."))
+            self.backend.add_sheet(self.title, title)
+            return {"replies": [{"addSheet": {"properties": {"title": title}}}]}
+        self.backend.call("write", "POST", self._url(":batchUpdate"), body={"addSheet": title}, answer=add)
+        return self._handle(title)
+
+    def _resolve(self, a1):
+        """(worksheet, bounds) of an A1 reference; a bare name is a whole sheet, a bare range the first sheet."""
+        if "!" in a1:
+            name, rng = a1.rsplit("!", 1)
+        elif a1.strip("'").replace("''", "'") in self._sheets():
+            name, rng = a1, None
+        else:
+            name, rng = next(iter(self._sheets())), a1
+        name = name[1:-1].replace("''", "'") if name.startswith("'") else name
+        if name not in self._sheets(): raise gspread.exceptions.APIError(_error(400, f"Unable to parse range: {a1}"))
+        return name, (_bounds(rng) if rng else (1, 1, None, None))
+
+    def _values(self, a1):
+        name, (r0, c0, r1, c1) = self._resolve(a1)
+        rows = self._sheets()[name][r0 - 1:r1]
+        return name, _trimmed([r[c0 - 1:c1] for r in rows])
+
+    def values_batch_get(self, ranges, params=None):
+        def get():
+            out = []
+            for a1 in ranges:
+                name, values = self._values(a1)
+                vr = {"range": f"'{name}'!{a1.split('!')[-1] if '!' in a1 else 'A1:ZZ'}", "majorDimension": "ROWS"}
+                if values: vr["values"] = values
+                out.append(vr)
+            return {"spreadsheetId": self.id, "valueRanges": out}
+        return self.backend.call("read", "GET", self._url("/values:batchGet"), answer=get)
+
+    def values_get(self, range, params=None):
+        return self.values_batch_get([range], params)["valueRanges"][0]
+
+    def batch_update(self, body):
+        def apply():
+            for req in body.get("requests", []):
+                kind, spec = next(iter(req.items()))
+                if kind == "updateCells":
+                    start = spec["start"]
+                    rows = self._sheets()[self.backend.sheet_title(self.title, start["sheetId"])]
+                    for i, row in enumerate(spec.get("rows", [])):
+                        _put(rows, start.get("rowIndex", 0) + i, start.get("columnIndex", 0), [_cell_text(c) for c in row.get("values", [])])
+                elif kind == "appendCells":
+                    rows = self._sheets()[self.backend.sheet_title(self.title, spec["sheetId"])]
+                    at = len(_trimmed(rows))
+                    for i, row in enumerate(spec.get("rows", [])): _put(rows, at + i, 0, [_cell_text(c) for c in row.get("values", [])])
+                elif kind == "deleteDimension" and spec["range"].get("dimension") == "ROWS":
+                    rows = self._sheets()[self.backend.sheet_title(self.title, spec["range"]["sheetId"])]
+                    del rows[spec["range"]["startIndex"]:spec["range"]["endIndex"]]
+            return {"spreadsheetId": self.id, "replies": [{} for _ in body.get("requests", [])]}
+        return self.backend.call("write", "POST", self._url(":batchUpdate"), body=body, answer=apply)
+
+def _cell_text(cell):
+    v = cell.get("userEnteredValue", {})
+    if "boolValue" in v: return _text(v["boolValue"])
+    if "numberValue" in v: return _text(v["numberValue"])
+    if "formulaValue" in v: return ""
+    return _text(v.get("stringValue", ""))
+
+def _put(rows, r, c, values):
+    # 0-based row / column; grows the grid as Sheets would.
+    while len(rows) <= r: rows.append([])
+    row = rows[r]
+    if len(row) < c + len(values): row.extend([""] * (c + len(values) - len(row)))
+    row[c:c + len(values)] = values
+
+class FakeCell:
+    def __init__(self, row, col, value): self.row, self.col, self.value = row, col, value
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, sheet_id):
+        self.spreadsheet, self.title, self.id = spreadsheet, title, sheet_id
+        self.backend = spreadsheet.backend
+
+    def __repr__(self): return f"<FakeWorksheet {self.title!r} id:{self.id}>"
+
+    def _rows(self): return self.spreadsheet._sheets()[self.title]
+
+    def _url(self, rng="", suffix=""):
+        return self.spreadsheet._url(f"/values/'{self.title}'!{rng}{suffix}" if rng or suffix else f"/values/'{self.title}'")
+
+    def _read(self, rng, answer): return self.backend.call("read", "GET", self._url(rng), answer=answer)
+
+    def _write(self, rng, suffix, body, answer): return self.backend.call("write", "POST" if suffix else "PUT", self._url(rng, suffix), body=body, answer=answer)
+
+    @property
+    def row_count(self): return max(1000, len(self._rows()))
+
+    @property
+    def col_count(self): return max([26] + [len(r) for r in self._rows()])
+
+    # --- reads ---
+    def get_all_values(self, **kwargs):
+        def get():
+            rows = _trimmed(self._rows())
+            width = max((len(r) for r in rows), default=0)
+            return [r + [""] * (width - len(r)) for r in rows]
+        return self._read("", get)
+
+    def get_values(self, range_name=None, **kwargs):
+        return self.get(range_name) if range_name else self.get_all_values()
+
+    def get_all_records(self, head=1, default_blank="", **kwargs):
+        values = self.get_all_values()
+        if len(values) < head: return []
+        header, width = values[head - 1], len(values[head - 1])
+        return [dict(zip(header, numericise_all([v if v != "" else default_blank for v in (r + [""] * width)[:width]]))) for r in values[head:]]
+
+    def get(self, range_name=None, **kwargs):
+        return self._read(range_name or "", lambda: self.spreadsheet._values(f"'{self.title}'!{range_name}" if range_name else f"'{self.title}'")[1])
+
+    def batch_get(self, ranges, **kwargs):
+        return self.backend.call("read", "GET", self.spreadsheet._url("/values:batchGet"),
+                                 answer=lambda: [self.spreadsheet._values(f"'{self.title}'!{r}")[1] for r in ranges])
+
+    def row_values(self, row, **kwargs):
+        def get():
+            found = _trimmed(self._rows()[row - 1:row])
+            return found[0] if found else []
+        return self._read(f"{row}:{row}", get)
+
+    def col_values(self, col, **kwargs):
+        def get():
+            values = [r[col - 1] if len(r) >= col else "" for r in self._rows()]
+            while values and values[-1] == "": values.pop()
+            return values
+        return self._read(rowcol_to_a1(1, col)[:-1], get)
+
+    def acell(self, label, **kwargs):
+        r, c, _, _ = _bounds(label)
+        return FakeCell(r, c, self.cell(r, c).value)
+
+    def cell(self, row, col, **kwargs):
+        def get():
+            rows = self._rows()
+            return rows[row - 1][col - 1] if row <= len(rows) and col <= len(rows[row - 1]) else ""
+        value = self._read(rowcol_to_a1(row, col), get)
+        return FakeCell(row, col, value or None)
+
+    # --- writes ---
+    def append_rows(self, values, value_input_option="RAW", insert_data_option=None, table_range=None, **kwargs):
+        user_entered = value_input_option == "USER_ENTERED"
+        def append():
+            rows = self._rows()
+            start = len(_trimmed(rows))
+            for i, row in enumerate(values): _put(rows, start + i, 0, [_entered(v, user_entered) for v in row])
+            width = max((len(r) for r in values), default=1)
+            return {"spreadsheetId": self.spreadsheet.id, "updates": {
+                "updatedRange": f"'{self.title}'!A{start + 1}:{rowcol_to_a1(start + len(values), width)}", "updatedRows": len(values)}}
+        return self._write("A1", ":append", {"values": values}, append)
+
+    def append_row(self, values, value_input_option="RAW", **kwargs):
+        return self.append_rows([values], value_input_option=value_input_option, **kwargs)
+
+    def update(self, range_name=None, values=None, raw=True, value_input_option=None, **kwargs):
+        # gspread 6 takes (values, range_name); older code passes (range_name, values). Both reach here.
+        if isinstance(range_name, list): range_name, values = values, range_name
+        range_name = range_name or "A1"
+        user_entered = value_input_option == "USER_ENTERED" or not raw
+        def put():
+            r0, c0, _, _ = _bounds(range_name.split("!")[-1])
+            for i, row in enumerate(values or []): _put(self._rows(), r0 - 1 + i, c0 - 1, [_entered(v, user_entered) for v in row])
+            return {"updatedRange": f"'{self.title}'!{range_name}"}
+        return self._write(range_name, "", {"values": values}, put)
+
+    def update_acell(self, label, value): return self.update(label, [[value]], raw=False)
+
+    def update_cell(self, row, col, value): return self.update(rowcol_to_a1(row, col), [[value]], raw=False)
+
+    def batch_update(self, data, raw=True, value_input_option=None, **kwargs):
+        user_entered = value_input_option == "USER_ENTERED" or not raw
+        def put():
+            for d in data:
+                r0, c0, _, _ = _bounds(d["range"].split("!")[-1])
+                for i, row in enumerate(d["values"]): _put(self._rows(), r0 - 1 + i, c0 - 1, [_entered(v, user_entered) for v in row])
+            return {"totalUpdatedCells": sum(len(r) for d in data for r in d["values"])}
+        return self.backend.call("write", "POST", self.spreadsheet._url("/values:batchUpdate"), body=data, answer=put)
+
+    def delete_rows(self, start_index, end_index=None):
+        def delete():
+            del self._rows()[start_index - 1:end_index or start_index]
+            return {}
+        return self.backend.call("write", "POST", self.spreadsheet._url(":batchUpdate"), body={"deleteDimension": [start_index, end_index]}, answer=delete)
+
+    def clear(self):
+        def wipe():
+            self._rows().clear()
+            return {}
+        return self._write("", ":clear", {}, wipe)
+
+# ==========================================
+# DRIVE STAND-IN
+# ==========================================
+class FakeDriveSession:
+    """AuthorizedSession stand-in answering files/<id>?fields=modifiedTime and files/<id>?alt=media."""
+
+    def __init__(self, backend, credentials=None): self.backend = backend
+
+    def request(self, method, url, params=None, **kwargs):
+        time.sleep(max(0.0, self.backend.latency["drive"] * (1 + self.backend.random.uniform(-self.backend.jitter, self.backend.jitter))))
+        params = dict(params or {})
+        query = url.split("?", 1)[1] if "?" in url else ""
+        params.update(p.split("=", 1) for p in query.split("&") if "=" in p)
+        file_id = url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+        modified = self.backend.photos.get(file_id)
+        if modified is None: return _error(404, f"File not found: {file_id}")
+        if params.get("alt") == "media": return FakeResponse(200, content=self.backend.jpeg())
+        return FakeResponse(200, {"id": file_id, "modifiedTime": modified})
+
+    def get(self, url, **kwargs): return self.request("GET", url, **kwargs)
+
+    def mount(self, prefix, adapter): pass
+
+# ==========================================
+# INSTALL
+# ==========================================
+class _FakeCredentials:
+    valid, expired, token = True, False, "fake-token"
+    def with_scopes(self, scopes): return self
+
+def install(backend):
+    """Routes gspread.authorize(), service-account credentials and the photo store's Drive session to backend."""
+    gspread.authorize = lambda credentials=None, *args, **kwargs: FakeClient(backend)
+    gspread.service_account_from_dict = lambda *args, **kwargs: FakeClient(backend)
+    gspread.service_account = lambda *args, **kwargs: FakeClient(backend)
+    Credentials.from_service_account_info = classmethod(lambda cls, info, **kwargs: _FakeCredentials())
+    import google.auth.transport.requests as google_requests
+    google_requests.AuthorizedSession = lambda credentials=None, *args, **kwargs: FakeDriveSession(backend, credentials)
+    import photo_store
+    photo_store.AuthorizedSession = google_requests.AuthorizedSession
+    # Calls are attributed to the page code that made them, not to these fakes.
+    api_metrics._SKIP_FILES.add(os.path.abspath(__file__))
+    return backend
+
+# ==========================================
+# SYNTHETIC DATA
+# ==========================================
+TEACHERS = {"SUKHAMAY KISKU": "SK", "TAPASI RANA": "TR", "SUJATA BISWAS ROTHA": "SBR", "ROHINI SINGH": "RS", "UDAY NARAYAN JANA": "UNJ",
+            "BIMAL KUMAR PATRA": "BKP", "SUSMITA PAUL": "SP", "TAPAN KUMAR MANDAL": "TKM", "MANJUMA KHATUN": "MK"}
+CLASSES = [("CLASS PP", "A"), ("CLASS I", "A"), ("CLASS II", "A"), ("CLASS III", "A"), ("CLASS IV", "A"), ("CLASS IV", "B"), ("CLASS V", "A")]
+PERIODS = [("10:30", "11:15"), ("11:15", "12:00"), ("12:00", "12:45"), ("13:30", "14:15"), ("14:15", "15:00"), ("15:00", "15:45")]
+SUBJECTS = ["BENGALI", "ENGLISH", "MATHS", "EVS", "HEALTH", "ART"]
+FIRST = ["RAHUL", "PRIYA", "ANIK", "MOUMITA", "SAYAN", "RIYA", "AKASH", "PUJA", "SOURAV", "TANIA", "ARIF", "SABINA"]
+LAST = ["MANDAL", "DAS", "KISKU", "HANSDA", "PAUL", "MONDAL", "KHATUN", "SK", "JANA", "BISWAS"]
+
+def school_days(days_back, today=None, holidays=()):
+    """Dates (newest last) of the last days_back calendar days that are not Sundays or holidays."""
+    today = today or date.today()
+    return [d for d in (today - timedelta(days=i) for i in range(days_back, -1, -1)) if d.weekday() != 6 and d.strftime("%d-%m-%Y") not in holidays]
+
+def _holidays():
+    try:
+        with open(os.path.join(REPO_DIR, "holidays.csv"), encoding="utf-8") as f:
+            return {line.split(",")[0].strip() for line in f.read().splitlines()[1:] if line.strip()}
+    except OSError: return set()
+
+def school_books(students=500, mdm_years=2, attendance_days=60, fee_rows=2000, seed=0, today=None):
+    """BPS_Database, bps_routine, BPS EXAM and SCH_Exam_Fees with students spread over the school's classes."""
+    rnd = random.Random(seed)
+    holidays = _holidays()
+    roster = []
+    for i in range(students):
+        cls, sec = CLASSES[i % len(CLASSES)]
+        roll = i // len(CLASSES) + 1
+        photo = f"https://drive.google.com/open?id=FAKE{i:05d}"
+        roster.append([cls, sec, str(roll), f"{rnd.choice(FIRST)} {rnd.choice(LAST)}", photo, rnd.choice(["M", "F"]), photo,
+                       rnd.choice(["GEN", "SC", "ST", "OBC-A", "OBC-B"]), rnd.choice(["HINDU", "MUSLIM"]), f"9{rnd.randint(100000000, 999999999)}",
+                       date(2014 + i % 7, 1 + i % 12, 1 + i % 28).strftime("%d-%m-%Y")])
+    initials = list(TEACHERS.values())
+    days = school_days(int(365 * mdm_years), today, holidays)
+
+    mdm = [["Date", "Teacher", "Class", "Section", "Roll", "Name", "Time"]]
+    for d in days:
+        ds = d.strftime("%d-%m-%Y")
+        for cls, sec, roll, name, *_ in roster:
+            if rnd.random() < 0.85:
+                mdm.append([ds, list(TEACHERS)[CLASSES.index((cls, sec)) % len(TEACHERS)], cls, sec, roll, name, "11:2" + str(rnd.randint(0, 9))])
+    attendance = [["Date", "Class", "Section", "Roll", "Name", "Status"]]
+    for d in days[-attendance_days:]:
+        for cls, sec, roll, name, *_ in roster: attendance.append([d.strftime("%d-%m-%Y"), cls, sec, roll, name, "TRUE" if rnd.random() < 0.9 else "FALSE"])
+    leave = [["Date", "Teacher", "Type", "Substitute"]]
+    for d in days[-120:]:
+        if rnd.random() < 0.2: leave.append([d.strftime("%d-%m-%Y"), rnd.choice(list(TEACHERS)), rnd.choice(["CL", "SL", "Half Day", "On Duty"]), rnd.choice(initials)])
+
+    routine = [["Day", "Start_Time", "End_Time", "Class", "Section", "Subject", "Teacher"]]
+    for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]:
+        for p, (start, end) in enumerate(PERIODS):
+            for c, (cls, sec) in enumerate(CLASSES):
+                routine.append([day, start, end, cls, sec, SUBJECTS[(p + c) % len(SUBJECTS)], initials[(p + c) % len(initials)]])
+    exams = [["Date", "Class", "Section", "Subject", "Teacher"]]
+    for i, d in enumerate(school_days(20, (today or date.today()) + timedelta(days=20), holidays)[-8:]):
+        for cls, sec in CLASSES: exams.append([d.strftime("%d-%m-%Y"), cls, sec, SUBJECTS[i % len(SUBJECTS)], initials[i % len(initials)]])
+
+    fees = [["Date", "Name", "Class", "Section", "Roll", "Amount", "Payer_Type", "Teacher_Involved", "Collection Type", "Handover_Status"]]
+    for _ in range(fee_rows):
+        cls, sec, roll, name, *_ = rnd.choice(roster)
+        fees.append([rnd.choice(days).strftime("%d-%m-%Y"), name, cls, sec, roll, str(rnd.choice([20, 30, 50])), "Student",
+                     rnd.choice(list(TEACHERS)), rnd.choice(["Exam Fee", "Sports Fee"]), rnd.choice(["Pending", "Settled"])])
+    return {
+        "BPS_Database": {
+            "students_master": [["Class", "Section", "Roll", "Name", "Thumb_URL", "Gender", "Photo_URL", "Social Category", "Religion", "Mobile", "DOB"]] + roster,
+            "mdm_log": mdm,
+            "student_attendance_master": attendance,
+            "teacher_leave": leave,
+            "settings": [["Key", "Value"], ["MDM_REGULAR_THRESHOLD", "5"]],
+            "notice": [["Staff meeting after school on Friday."]],
+            "TEACHERS_DETAIL": [["Name", "Initials"]] + [[n, i] for n, i in TEACHERS.items()],
+        },
+        "bps_routine": {"Sheet1": routine, "daily_override": [routine[0] + ["Date"]]},
+        "BPS EXAM": {"schedules": exams},
+        "SCH_Exam_Fees": {
+            "Sheet1": fees,
+            "Britti_List": [["Class", "Section", "Roll", "Name"]] + [r[:4] for r in roster[::25]],
+            "Investigation_List": [["Class", "Section", "Roll", "Name", "Collection Type", "Date_Flagged", "Status"]],
+        },
+    }
+
+ACTIVITIES = [("WORK", "SCHOOL"), ("WORK", "MDM RETURN"), ("HEALTH", "WALK"), ("HEALTH", "YOGA"), ("PEOPLE", "FAMILY"), ("LEARN", "READING"), ("HOME", "CHORES")]
+PLACES = ["HOME", "SCHOOL", "BUS STAND", "MARKET", "FRUIT SHOP", "KARIM HOUSE", "BANK"]
+
+def routine_books(activity_rows=50000, location_rows=20000, seed=0, today=None):
+    """MY ROUTINE 2026, sk_money_location and Personal_Dashboard_Data with activity_rows logged entries ending today."""
+    rnd = random.Random(seed)
+    today = today or date.today()
+    per_day = 12
+    start = datetime.combine(today - timedelta(days=activity_rows // per_day), datetime.min.time())
+    log = [["Date", "Start_Time", "End_Time", "Duration", "Activity", "Sub_Activities", "check_list", "Notes", "Role", "Urgent", "Important", "Energy_Level"]]
+    for i in range(activity_rows):
+        t = start + timedelta(days=i // per_day, minutes=360 + (i % per_day) * 75)
+        act, sub = rnd.choice(ACTIVITIES)
+        mins = rnd.randint(10, 70)
+        log.append([t.strftime("%Y-%m-%d"), t.strftime("%H:%M"), (t + timedelta(minutes=mins)).strftime("%H:%M"), f"{mins // 60}:{mins % 60:02d}",
+                    act, sub, "", "", rnd.choice(["Teacher", "Parent", "Self"]), str(rnd.random() < 0.3), str(rnd.random() < 0.5), str(rnd.randint(3, 9))])
+    master = [["Day", "Start_Time", "End_Time", "Duration", "Activity", "Sub_Activities", "check_list", "App", "Role", "Urgent", "Important", "Energy_Level"]]
+    for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]:
+        for h in range(5, 23, 2):
+            act, sub = ACTIVITIES[h % len(ACTIVITIES)]
+            master.append([day, f"{h:02d}:00", f"{h + 2:02d}:00", "2:00", act, sub, "Water bottle, Notes", "", "Self", "FALSE", "TRUE", "6"])
+    future = [["Due_Date", "Due_Time", "Activity", "Type", "Task_Name", "Entity", "Status", "Cancel_Reason", "Role", "Urgent", "Important", "Energy_Level"]]
+    for i in range(300):
+        d = today + timedelta(days=rnd.randint(-30, 30))
+        future.append([d.strftime("%Y-%m-%d"), f"{rnd.randint(6, 21):02d}:00", rnd.choice(ACTIVITIES)[0], rnd.choice(["Sub-Activity", "Checklist", "Special"]),
+                       f"TASK {i}", "Personal", rnd.choice(["Pending", "Completed"]), "", "Self", "FALSE", "TRUE", "5"])
+    moves = [["Date", "Time", "Move", "Place", "People", "Remark"]]
+    t = datetime.combine(today, datetime.min.time()) - timedelta(minutes=135 * location_rows)
+    for i in range(location_rows):
+        t += timedelta(minutes=rnd.randint(30, 240))
+        place = rnd.choice(PLACES)
+        moving = i % 2 == 0
+        moves.append([t.strftime("%Y-%m-%d"), t.strftime("%H:%M"), rnd.choice(["WALK", "BUS", "BIKE"]) if moving else "- Stationary -", place,
+                      rnd.choice(["SELF", "SELF, WIFE", "FAMILY"]), f"Started Route: HOME-{place} towards {place}" if moving and rnd.random() < 0.3 else ""])
+    payments = [["Month", "Bill_Name", "Type", "Est_Amount", "Due_Date", "Status", "Fund", "Account", "Actual_Paid"]]
+    for m in range(12):
+        for bill in ["Electricity", "Internet", "Gas", "Insurance"]:
+            payments.append([date(today.year, m + 1, 1).strftime("%B"), bill, "Monthly", "500", "10", rnd.choice(["Paid", "Pending"]), "Salary", "SBI", ""])
+    return {
+        "MY ROUTINE 2026": {
+            "activity_log": log, "routine_master": master, "future_tasks": future,
+            "holidays": [["Date", "Occasion"]] + [[d, "Holiday"] for d in sorted(_holidays())],
+            "must_do": [["Main Category", "Task Name"], ["HEALTH", "Drink water"], ["WORK", "Check MDM"]],
+            "PRE": [["Main Category", "Task Name"], ["WORK", "Pack bag"]],
+            "prep_checklists": [["Type", "Task Name"], ["SCHOOL", "ID card"]],
+        },
+        "sk_money_location": {
+            "LOCATION_DATA": moves, "PAYMENT_CHECKLIST": payments,
+            "VISITED_PLACES": [["Place", "Purpose"]] + [[p, "Errand"] for p in PLACES],
+        },
+        "Personal_Dashboard_Data": {"Tracker": [["App Name", "Last Opened"], ["routine_app", today.strftime("%Y-%m-%d")]]},
+    }
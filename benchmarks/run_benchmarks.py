@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+
+import fake_google
+from fake_google import REPO_DIR
+import sheets_store, write_queue, photo_store, api_metrics
+
+# ==========================================
+# OFFLINE PAGE BENCHMARKS
+# ==========================================
+# Runs pages through Streamlit's AppTest against the fake_google backend
+# (no network, no credentials) and reports, for the cold first load and each
+# warm rerun: wall time, Sheets and Drive calls, cache hits and misses and
+# peak Python memory. Results can be saved as JSON and later runs compared
+# against them, exiting non-zero on a regression. A run that raised or
+# showed an error is reported as failed (exit status 2) and is never
+# compared, since a page that stopped early looks faster than it is:
+#
+#   python benchmarks/run_benchmarks.py --save bench_baseline.json
+#   python benchmarks/run_benchmarks.py --baseline bench_baseline.json
+#
+# Pages see the real clock, so what they render (school day or holiday,
+# which class is at 11:15) depends on when the benchmark runs; compare runs
+# made at similar times. Peak memory comes from tracemalloc, which slows the
+# runs a little; pass --no-memory for timings only.
+
+DEFAULT_PAGES = ["bps_digital.py", "routine_app.py", "sch_exam_fees.py", "routine_audit.py"]
+COMPARED = ("Seconds", "Sheets_Calls", "Drive_Calls")
+PROBLEMS = ("Exceptions", "Errors_Shown")
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark pages against a local fake Google Sheets / Drive backend.")
+    p.add_argument("pages", nargs="*", default=DEFAULT_PAGES, help="page scripts, relative to the repo (default: %(default)s)")
+    p.add_argument("--reruns", type=int, default=2, help="warm reruns after the cold load")
+    p.add_argument("--role", default="admin", choices=["admin", "teacher"])
+    p.add_argument("--user", default="SUKHAMAY KISKU")
+    p.add_argument("--students", type=int, default=500)
+    p.add_argument("--mdm-years", type=float, default=2)
+    p.add_argument("--activity-rows", type=int, default=50000)
+    p.add_argument("--location-rows", type=int, default=20000)
+    p.add_argument("--read-ms", type=float, default=fake_google.LATENCY["read"] * 1000)
+    p.add_argument("--write-ms", type=float, default=fake_google.LATENCY["write"] * 1000)
+    p.add_argument("--drive-ms", type=float, default=fake_google.LATENCY["drive"] * 1000)
+    p.add_argument("--quota", type=int, default=None, help="fake per-minute read / write quota; over it calls get 429")
+    p.add_argument("--timeout", type=float, default=300, help="seconds one run may take")
+    p.add_argument("--no-memory", action="store_true")
+    p.add_argument("--save", help="write the results to this JSON file")
+    p.add_argument("--baseline", help="compare with results saved by --save")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed relative increase over the baseline")
+    return p.parse_args(argv)
+
+def make_backend(args):
+    books = fake_google.school_books(students=args.students, mdm_years=args.mdm_years)
+    books.update(fake_google.routine_books(activity_rows=args.activity_rows, location_rows=args.location_rows))
+    latency = {"read": args.read_ms / 1000, "write": args.write_ms / 1000, "drive": args.drive_ms / 1000}
+    return fake_google.install(fake_google.Backend(books, latency=latency, quota_per_minute=args.quota, photo_count=args.students))
+
+def fresh_process_state(folder):
+    """Empties every in-process cache and points the on-disk caches at folder, as after a restart with a clean disk."""
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    sheets_store.KEYS_FILE = os.path.join(folder, ".spreadsheet_keys.json")
+    write_queue.QUEUE_DB = os.path.join(folder, ".write_queue.sqlite")
+    photo_store.PHOTO_DIR = os.path.join(folder, "photos")
+
+def _settle(timeout=60):
+    # Photo downloads started by a run finish in the background; count them with that run.
+    _, in_flight, lock = photo_store._background()
+    until = time.time() + timeout
+    while time.time() < until:
+        with lock:
+            if not in_flight: return
+        time.sleep(0.05)
+
+def measure(at, args):
+    api_metrics.reset()
+    if not args.no_memory: tracemalloc.reset_peak()
+    started = time.perf_counter()
+    at.run(timeout=args.timeout)
+    seconds = time.perf_counter() - started
+    _settle()
+    calls, lookups = api_metrics.calls_frame(), api_metrics.lookups_frame()
+    sheets, drive = calls[calls["Service"] == "sheets"], calls[calls["Service"] == "drive"]
+    return {
+        "Seconds": round(seconds, 3),
+        "Sheets_Calls": len(sheets), "Reads": int((sheets["Kind"] == "read").sum()), "Writes": int((sheets["Kind"] == "write").sum()),
+        "Drive_Calls": len(drive), "Throttled": int((calls["Status"] == 429).sum()),
+        "Cache_Hits": int(lookups["Hit"].sum()), "Cache_Misses": int((~lookups["Hit"].astype(bool)).sum()),
+        "Peak_MB": None if args.no_memory else round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1),
+        "Exceptions": len(at.exception), "Errors_Shown": len(at.error),
+        "First_Problem": (at.exception[0].message if len(at.exception) else at.error[0].value if len(at.error) else "")[:120],
+    }
+
+def bench_page(page, args, folder):
+    fresh_process_state(folder)
+    at = AppTest.from_file(os.path.join(REPO_DIR, page), default_timeout=args.timeout)
+    at.session_state["authenticated"] = True
+    at.session_state["user_role"] = args.role
+    at.session_state["user_name"] = args.user
+    rows = []
+    for i in range(args.reruns + 1):
+        result = measure(at, args)
+        rows.append({"Page": page, "Run": "cold" if i == 0 else f"warm {i}", **result})
+        print(f"  {page:<22} {rows[-1]['Run']:<7} {result['Seconds']:>8.2f} s  {result['Sheets_Calls']:>4} sheets  {result['Drive_Calls']:>4} drive", file=sys.stderr)
+    return rows
+
+def failed(row):
+    return any(row.get(col) for col in PROBLEMS)
+
+def compare(results, baseline, tolerance):
+    """Rows of results worse than baseline by more than tolerance on any COMPARED column; failed runs on either side are skipped."""
+    old = {(b["Page"], b["Run"]): b for b in baseline}
+    worse = []
+    for r in results:
+        b = old.get((r["Page"], r["Run"]))
+        if not b or failed(r) or failed(b): continue
+        for col in COMPARED:
+            # A small absolute slack keeps near-zero values (0 calls, a few ms) from tripping the check.
+            slack = 0.05 if col == "Seconds" else 1
+            if r[col] > b[col] * (1 + tolerance) + slack:
+                worse.append({"Page": r["Page"], "Run": r["Run"], "Metric": col, "Baseline": b[col], "Now": r[col]})
+    return worse
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.chdir(REPO_DIR)  # pages open logo.png, holidays.csv etc. relative to the repo
+    secrets = Secrets()
+    secrets._secrets = {"gcp_service_account": {"type": "service_account", "client_email": "bench@example.invalid"}}
+    st.secrets = secrets
+    if not args.no_memory: tracemalloc.start()
+
+    print("Generating synthetic data...", file=sys.stderr)
+    make_backend(args)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        for n, page in enumerate(args.pages):
+            results += bench_page(page, args, os.path.join(tmp, str(n)))
+
+    table = pd.DataFrame(results)
+    with pd.option_context("display.max_columns", None, "display.width", 200, "display.max_colwidth", 60):
+        print(table.to_string(index=False))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f: json.dump(results, f, indent=1)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: worse = compare(results, json.load(f), args.tolerance)
+        if worse:
+            print("\nREGRESSIONS (over baseline by more than {:.0%}):".format(args.tolerance))
+            print(pd.DataFrame(worse).to_string(index=False))
+            status = 1
+        else: print("\nNo regressions against the baseline.")
+    bad = [r for r in results if failed(r)]
+    if bad:
+        print("\nFAILED RUNS (left out of the comparison):")
+        print(pd.DataFrame(bad)[["Page", "Run", *PROBLEMS, "First_Problem"]].to_string(index=False))
+        status = 2
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,11 @@
-import streamlit as st, streamlit.components.v1 as components, pandas as pd, os, calendar, base64, re, concurrent.futures
+import streamlit as st, streamlit.components.v1 as components, pandas as pd, os, calendar, base64, threading
 from datetime import datetime, time, timedelta, timezone
+from collections import Counter
 from streamlit_qrcode_scanner import qrcode_scanner
 import gspread
 from gspread.exceptions import WorksheetNotFound, SpreadsheetNotFound
 from google.oauth2.service_account import Credentials
-from google.auth.transport.requests import AuthorizedSession
+import sheets_store, photo_store, mdm_index, write_queue
 
 # If accessed directly without logging in via app.py, block execution
 if 'authenticated' not in st.session_state or not st.session_state.authenticated:
@@ -65,13 +66,6 @@ def inject_security_css(user_name):
         ".floating-counter { position: fixed; top: 15px; right: 15px; background: linear-gradient(135deg, #007bff, #0056b3); color: white; padding: 10px 20px; border-radius: 30px; z-index: 999999; font-size: 16px; font-weight: 900; box-shadow: 0px 4px 12px rgba(0,0,0,0.3); border: 2px solid #ffffff; pointer-events: none; transition: all 0.3s ease; }"
         "@media (max-width: 768px) {"
         ".floating-counter { top: 10px; right: 10px; font-size: 14px; padding: 8px 16px; }"
-        ".roster-container [data-testid=\"stHorizontalBlock\"] { display: flex !important; flex-direction: row !important; flex-wrap: nowrap !important; align-items: center !important; width: 100% !important; }"
-        ".roster-container [data-testid=\"column\"] { display: block !important; min-width: 0 !important; margin-top: 0 !important; padding: 0 4px !important; }"
-        ".roster-container [data-testid=\"column\"]:nth-child(1) { flex: 0 0 55px !important; max-width: 55px !important; width: 55px !important; }"
-        ".roster-container [data-testid=\"column\"]:nth-child(2) { flex: 1 1 0% !important; max-width: calc(100% - 150px) !important; width: auto !important; }"
-        ".roster-container [data-testid=\"column\"]:nth-child(3) { flex: 0 0 95px !important; max-width: 95px !important; width: 95px !important; }"
-        ".roster-container .stCheckbox p { font-size: 13px !important; padding-left: 1.2rem !important; margin-bottom: 0px !important; line-height: 1.2 !important; }"
-        ".roster-container .stCheckbox { min-height: 1.2rem; }"
         ".header-school-name { font-size: 18px !important; }"
         "}"
         "</style><script>document.addEventListener('contextmenu', e => e.preventDefault());</script><div class=\"watermark\"></div>"
@@ -91,16 +85,20 @@ def init_routine_gsheet():
     try: return gspread.authorize(get_google_credentials()).open("bps_routine")
     except Exception: return None
 
-@st.cache_resource
-def get_drive_session(): return AuthorizedSession(get_google_credentials())
-
 sh = init_gsheets()
 
-@st.cache_data(ttl=600) 
 def fetch_sheet_data(sheet_name):
-    try: return pd.DataFrame(sh.worksheet(sheet_name).get_all_records()).replace({'TRUE': True, 'FALSE': False, 'True': True, 'False': False}).infer_objects(copy=False)
+    # Rows still waiting in the write queue are shown as if already on the sheet, so nothing is submitted twice.
+    try: return write_queue.with_pending(sheets_store.read_sheet("BPS_Database", sheet_name, ttl=600), "BPS_Database", sheet_name, booleans=True)
     except Exception: return pd.DataFrame()
 
+def queued_mdm(tc=None, ts=None):
+    """mdm_log rows still waiting in the write queue, optionally only one class (and section)."""
+    q = write_queue.with_pending(pd.DataFrame(columns=sheets_store.get_table("BPS_Database", "mdm_log").header), "BPS_Database", "mdm_log", booleans=True)
+    if q.empty or tc is None: return q
+    q = q[q['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else q['Class'] == tc]
+    return q if ts is None else q[q['Section'] == ts]
+
 # ==========================================
 # SYSTEM SETTINGS ENGINE
 # ==========================================
@@ -112,24 +110,16 @@ def get_mdm_threshold():
     return "1"
 
 def set_setting(key, value):
-    try: ws = sh.worksheet("settings")
+    try: sheets_store.get_table("BPS_Database", "settings").handle()
     except Exception: ws = sh.add_worksheet(title="settings", rows=10, cols=2); ws.append_row(["Key", "Value"])
-    df = fetch_sheet_data('settings')
-    if df.empty or 'Key' not in df.columns: df = pd.DataFrame([{"Key": key, "Value": value}])
-    else:
-        if key in df['Key'].values: df.loc[df['Key'] == key, 'Value'] = value
-        else: df = pd.concat([df, pd.DataFrame([{"Key": key, "Value": value}])], ignore_index=True)
-    overwrite_sheet_df('settings', df)
+    replace_sheet_rows("settings", {"Key": key}, [{"Key": key, "Value": value}])
 
 # ==========================================
 # BPS EXAM ROUTINE ENGINE
 # ==========================================
-@st.cache_data(ttl=300)
 def fetch_exam_schedules():
     try:
-        sh_ex = gspread.authorize(get_google_credentials()).open("BPS EXAM")
-        ws = sh_ex.worksheet("schedules")
-        df = pd.DataFrame(ws.get_all_records()).astype(str)
+        df = sheets_store.read_sheet("BPS EXAM", "schedules", ttl=300).astype(str)
         df.columns = [str(c).strip() for c in df.columns]
         return df
     except Exception:
@@ -221,15 +211,13 @@ def build_exam_day_routine(date_str):
         
     return pd.DataFrame(routine_rows)
 
-@st.cache_data(ttl=600)
 def fetch_all_routines():
     try:
-        r_sh = init_routine_gsheet()
-        if r_sh:
-            df_base = pd.DataFrame(r_sh.worksheet("Sheet1").get_all_records()).astype(str)
+        if init_routine_gsheet():
+            df_base = sheets_store.read_sheet("bps_routine", "Sheet1", ttl=600).astype(str)
             df_base.columns = [str(c).strip() for c in df_base.columns]
             try: 
-                df_override = pd.DataFrame(r_sh.worksheet("daily_override").get_all_records()).astype(str)
+                df_override = sheets_store.read_sheet("bps_routine", "daily_override", ttl=600).astype(str)
                 df_override.columns = [str(c).strip() for c in df_override.columns]
             except Exception: 
                 df_override = pd.DataFrame()
@@ -258,64 +246,111 @@ def get_active_routine(date_str, day_of_week):
         
     return pd.DataFrame()
 
+# ==========================================
+# COMPILED DAY ROUTINE INDEX
+# ==========================================
+# get_active_routine() rebuilds a day's routine from three sheets; the result
+# is compiled once per date (times parsed, rows indexed by teacher and start
+# slot) and reused until one of those sheets changes.
+ROUTINE_SOURCES = [("BPS EXAM", "schedules", 300), ("bps_routine", "Sheet1", 600), ("bps_routine", "daily_override", 600)]
+
+class DayRoutine:
+    """One date's routine with Start/End parsed once. Shared across sessions: treat frames as read-only."""
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        if not df.empty and {'Start_Time', 'End_Time', 'Teacher'}.issubset(df.columns):
+            times = {v: parse_time_safe(v) for v in set(df['Start_Time'].astype(str)) | set(df['End_Time'].astype(str))}
+            df['Start_Obj'] = df['Start_Time'].astype(str).map(times)
+            df['End_Obj'] = df['End_Time'].astype(str).map(times)
+            timed = df.dropna(subset=['Start_Obj']).sort_values('Start_Obj', kind='stable')
+        else: timed = df.iloc[0:0]
+        self.df = df
+        first = df.iloc[0] if not df.empty else {}
+        self.is_exam_day = bool(first.get('Is_Exam_Day', False))
+        self.is_custom = bool(first.get('Is_Custom', False))
+        self.slots = list(zip(timed.index, timed['Teacher'], timed['Start_Obj'], timed['End_Obj'])) if not timed.empty else []
+        self.by_teacher, self.by_start = {}, {}
+        for pos, t, s, _ in self.slots:
+            self.by_teacher.setdefault(t, []).append(pos)
+            self.by_start.setdefault(s, []).append(pos)
+
+    @property
+    def empty(self): return self.df.empty
+
+    def timeline(self):
+        """Rows with both times parsed, in start order."""
+        return self.df.loc[[p for p, _, _, e in self.slots if e is not None]]
+
+    def for_teacher(self, teacher):
+        return self.df.loc[self.by_teacher.get(teacher, [])]
+
+    def at_slot(self, start, teacher=None):
+        return self.df.loc[[p for p in self.by_start.get(start, []) if teacher is None or self.df.at[p, 'Teacher'] == teacher]]
+
+    def live_at(self, now_t, teacher=None):
+        return self.df.loc[[p for p, t, s, e in self.slots if (teacher is None or t == teacher) and e is not None and s <= now_t <= e]]
+
+@st.cache_resource
+def _routine_index():
+    return {}, threading.Lock()
+
+def get_day_routine(date_str):
+    """Compiled routine for a date; rebuilt only when one of ROUTINE_SOURCES has changed."""
+    version = tuple(sheets_store.version(s, w, ttl) for s, w, ttl in ROUTINE_SOURCES)
+    cache, lock = _routine_index()
+    with lock: hit = cache.get(date_str)
+    if hit and hit[0] == version: return hit[1]
+    day = DayRoutine(get_active_routine(date_str, datetime.strptime(date_str, "%d-%m-%Y").strftime('%A')))
+    with lock:
+        cache.pop(date_str, None)
+        cache[date_str] = (version, day)
+        while len(cache) > 31: cache.pop(next(iter(cache)))
+    return day
+
 def save_daily_routine(date_str, edited_df):
     r_sh = init_routine_gsheet()
     if not r_sh: return
-    try: ws = r_sh.worksheet("daily_override")
+    try: sheets_store.get_table("bps_routine", "daily_override").handle()
     except WorksheetNotFound: 
         ws = r_sh.add_worksheet(title="daily_override", rows=1000, cols=10)
         ws.append_row(["Date", "Start_Time", "End_Time", "Class", "Section", "Subject", "Teacher"])
         
-    records = ws.get_all_records()
-    existing = pd.DataFrame(records)
-    if not existing.empty and 'Date' in existing.columns:
-        existing = existing[existing['Date'].astype(str) != date_str]
-        
     edited_df['Date'] = date_str
     cols = ["Date", "Start_Time", "End_Time", "Class", "Section", "Subject", "Teacher"]
     for c in cols:
         if c not in edited_df.columns: edited_df[c] = ""
             
-    edited_df = edited_df[cols]
-    final_df = pd.concat([existing, edited_df], ignore_index=True) if not existing.empty else edited_df
-    ws.clear()
-    ws.update([final_df.columns.values.tolist()] + final_df.fillna("").values.tolist())
-    fetch_all_routines.clear()
+    sheets_store.replace_rows("bps_routine", "daily_override", {"Date": date_str}, edited_df[cols].fillna("").to_dict('records'))
 
 def delete_daily_routine(date_str):
-    r_sh = init_routine_gsheet()
-    if not r_sh: return
-    try: ws = r_sh.worksheet("daily_override")
+    if not init_routine_gsheet(): return
+    try: sheets_store.delete_rows("bps_routine", "daily_override", {"Date": date_str})
     except WorksheetNotFound: return
-        
-    records = ws.get_all_records()
-    existing = pd.DataFrame(records)
-    if not existing.empty and 'Date' in existing.columns:
-        existing = existing[existing['Date'].astype(str) != date_str]
-        ws.clear()
-        if not existing.empty: ws.update([existing.columns.values.tolist()] + existing.fillna("").values.tolist())
-        else: ws.append_row(["Date", "Start_Time", "End_Time", "Class", "Section", "Subject", "Teacher"])
-    fetch_all_routines.clear()
 
 def clear_sheet_cache():
-    fetch_sheet_data.clear()
+    sheets_store.invalidate("BPS_Database")
     get_notice.clear()
-    fetch_all_routines.clear()
-    fetch_exam_schedules.clear()
+    sheets_store.invalidate("bps_routine")
+    sheets_store.invalidate("BPS EXAM", "schedules")
 
 def append_sheet_df(sheet_name, df):
     if df.empty: return
-    try: ws = sh.worksheet(sheet_name)
+    try: sheets_store.get_table("BPS_Database", sheet_name).handle()
     except WorksheetNotFound: ws = sh.add_worksheet(title=sheet_name, rows=1000, cols=20); ws.append_row(list(df.columns))
-    except Exception: st.error("⚠️ API Busy."); return
-    try: ws.append_rows(df.fillna("").astype(str).values.tolist()); clear_sheet_cache()
+    except Exception: pass  # Google busy or offline: the rows still go into the write queue below.
+    # Paced and merged with the other teachers' submits; if Google is slow the rows stay queued on this device.
+    if not write_queue.submit("BPS_Database", sheet_name, df.fillna("").astype(str).values.tolist()):
+        st.warning("📤 Saved on this device; Google Sheets is busy, it will sync automatically.")
+
+def replace_sheet_rows(sheet_name, where, records):
+    try: sheets_store.replace_rows("BPS_Database", sheet_name, where, records)
     except Exception: st.error("⚠️ Submit Failed.")
 
-def overwrite_sheet_df(sheet_name, df):
-    try: ws = sh.worksheet(sheet_name)
-    except WorksheetNotFound: ws = sh.add_worksheet(title=sheet_name, rows=1000, cols=20)
-    except Exception: return
-    try: ws.clear(); df = df.fillna("").astype(str); ws.update(values=[df.columns.values.tolist()] + df.values.tolist(), range_name='A1') if not df.empty else None; clear_sheet_cache()
+def delete_sheet_rows(sheet_name, where):
+    try:
+        write_queue.drain("BPS_Database", sheet_name)
+        sheets_store.delete_rows("BPS_Database", sheet_name, where)
     except Exception: st.error("⚠️ Clear Failed.")
 
 @st.cache_data(ttl=600)
@@ -326,26 +361,10 @@ def get_notice():
 def publish_notice(text):
     try: ws = sh.worksheet("notice")
     except Exception: ws = sh.add_worksheet(title="notice", rows=10, cols=10)
-    ws.update_acell("A1", text); clear_sheet_cache()
+    ws.update_acell("A1", text); get_notice.clear()
 
 def get_local_csv(file): return pd.read_csv(file) if os.path.exists(file) else pd.DataFrame()
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_secure_image_bytes(file_id):
-    try:
-        r = get_drive_session().get(f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media")
-        return r.content if r.status_code == 200 else None
-    except Exception: return None
-
-def get_secure_photo_uri(url):
-    fb = "https://www.w3schools.com/howto/img_avatar.png"
-    if pd.isna(url) or url == "" or not isinstance(url, str): return fb
-    match = re.search(r"(?:id=|/d/)([\w-]+)", url)
-    if match:
-        b = fetch_secure_image_bytes(match.group(1))
-        if b: return f"data:image/jpeg;base64,{base64.b64encode(b).decode()}"
-    return url if url.startswith("http") else fb
-
 utc_now = datetime.now(timezone.utc)
 now = utc_now + timedelta(hours=5, minutes=30)
 curr_date_str, curr_time = now.strftime("%d-%m-%Y"), now.time()
@@ -356,6 +375,84 @@ def parse_time_safe(t_str):
         except Exception: continue
     return None
 
+# ==========================================
+# MDM ROSTER ENGINE
+# ==========================================
+ROSTER_COLUMNS = {
+    'Photo': st.column_config.ImageColumn("Photo", width="small"),
+    'Name': st.column_config.TextColumn("Student", width="medium"),
+    'Roll': st.column_config.TextColumn("Roll", width="small"),
+    'MDM Days': st.column_config.NumberColumn("📅 MDM Days", width="small"),
+}
+
+def class_mask(df, tc, ts):
+    cls = df['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else df['Class'] == tc
+    return cls & (df['Section'] == ts)
+
+def fetch_mdm_day(date_str, tc=None, ts=None):
+    try: day = mdm_index.rows_on(date_str, tc, ts)
+    except Exception: return pd.DataFrame()
+    q = queued_mdm(tc, ts)
+    q = q[q['Date'].astype(str).str.strip() == date_str] if not q.empty else q
+    return pd.concat([day, q], ignore_index=True) if not q.empty else day
+
+def fetch_mdm_counts(tc, ts):
+    try: counts = Counter(mdm_index.day_counts(tc, ts))
+    except Exception: return {}
+    q = queued_mdm(tc, ts)
+    if not q.empty: counts.update(q['Roll'].astype(str).str.strip())
+    return dict(counts)
+
+def fetch_mdm_latest(tc, ts=None, before=None):
+    try: return mdm_index.latest_date(tc, ts, before)
+    except Exception: return None
+
+def build_mdm_roster(sm, tc, ts, date_str):
+    """Students of one class with MDM (Ate) on date_str and Historical_Count (MDM days so far) from the MDM index."""
+    if 'Section' not in sm.columns: sm['Section'] = 'A'
+    ros = sm[class_mask(sm, tc, ts)].copy()
+    rolls = ros['Roll'].astype(str).str.strip()
+    today = fetch_mdm_day(date_str, tc, ts)
+    ros['MDM (Ate)'] = rolls.isin(today['Roll'].astype(str).str.strip()) if not today.empty else False
+    ros['Historical_Count'] = rolls.map(fetch_mdm_counts(tc, ts)).fillna(0).astype(int)
+    ros['Scan_Key'] = ros['Roll'].astype(str) + "_" + ros['Name'].astype(str)
+    if 'Thumb_URL' not in ros.columns: ros['Thumb_URL'] = ""
+    return ros
+
+def split_regular(ros, th_val):
+    if th_val == "None": return ros, ros.iloc[0:0]
+    regular = ros['Historical_Count'] >= int(th_val)
+    return ros[regular], ros[~regular]
+
+def roster_view(ros, checks):
+    """Photo, name, roll and MDM days of a roster plus the given checkbox columns, with their column config."""
+    view = pd.DataFrame({'Photo': ros['Photo'], 'Name': ros['Name'].astype(str), 'Roll': ros['Roll'].astype(str), 'MDM Days': ros['Historical_Count']})
+    for col, values in checks.items(): view[col] = values
+    return view, dict(ROSTER_COLUMNS, **{c: st.column_config.CheckboxColumn(c, width="small") for c in checks})
+
+def roster_editor(ros, key, checks, editable):
+    """Whole roster as one data_editor; only the editable checkbox column can be ticked."""
+    view, config = roster_view(ros, checks)
+    return st.data_editor(view, key=key, hide_index=True, use_container_width=True, row_height=60, column_config=config, disabled=[c for c in view.columns if c != editable])
+
+def clear_editors(*keys):
+    # data_editor keeps edits by row position; once a submit changes the roster, stale ticks would land on other students.
+    for k in keys: st.session_state.pop(k, None)
+
+def mdm_roster_editor(ros, key, scanned_keys):
+    """Returns the students newly ticked (or scanned) as having eaten; students already logged today are listed read-only below."""
+    if ros.empty: return ros
+    done = ros['MDM (Ate)'].to_numpy(dtype=bool)
+    todo, picked = ros[~done], ros.iloc[0:0]
+    if not todo.empty:
+        ed = roster_editor(todo, key, {'Ate MDM': todo['Scan_Key'].isin(scanned_keys)}, 'Ate MDM')
+        picked = todo[ed['Ate MDM'].to_numpy(dtype=bool)]
+    if done.any():
+        view, config = roster_view(ros[done], {'Done': True})
+        st.caption(f"✅ Done ({int(done.sum())})")
+        st.dataframe(view, hide_index=True, use_container_width=True, row_height=60, column_config=config)
+    return picked
+
 def render_header():
     if os.path.exists("logo.png"):
         with open("logo.png", "rb") as f:
@@ -381,6 +478,7 @@ def render_header():
 # EXECUTE MAIN APPLICATION
 # -------------------------------
 render_header()
+write_queue.render_pending("BPS_Database")
 inject_security_css(st.session_state.user_name)
 
 # -------------------------------
@@ -410,21 +508,20 @@ if st.session_state.user_role == "teacher":
 
         with at_tabs[0]: 
             take_other = st.checkbox("🔄 Take MDM for another class")
-            ml = fetch_sheet_data('mdm_log')
             already_sub = False
             
             if not take_other:
-                if not ml.empty and 'Date' in ml.columns and 'Teacher' in ml.columns:
-                    if not ml[(ml['Date'].astype(str).str.strip() == curr_date_str) & (ml['Teacher'].astype(str).str.strip() == t_name_select)].empty:
+                tml = fetch_mdm_day(curr_date_str)
+                if not tml.empty and 'Teacher' in tml.columns:
+                    if not tml[tml['Teacher'].astype(str).str.strip() == t_name_select].empty:
                         already_sub = True
 
             if already_sub: 
                 st.success("✅ MDM Submitted for today.")
             else:
                 st.subheader("Student MDM Entry")
-                tdy = now.strftime('%A')
                 mc = TEACHER_INITIALS.get(t_name_select, t_name_select)
-                active_rout = get_active_routine(curr_date_str, tdy)
+                day_rout = get_day_routine(curr_date_str)
                 
                 assigned_mdm_classes = []
 
@@ -435,14 +532,11 @@ if st.session_state.user_role == "teacher":
                         assigned_mdm_classes.append({'class': c_name, 'sec': s_name})
                         st.info(f"📌 Override Mode: Managing **{c_name} - {s_name}**")
                 else:
-                    if not active_rout.empty:
-                        active_rout['Start_Obj'] = active_rout['Start_Time'].apply(parse_time_safe)
-                        my_1115 = active_rout[(active_rout['Teacher'] == mc) & (active_rout['Start_Obj'] == time(11, 15))]
-                        for _, r in my_1115.iterrows():
-                            assigned_mdm_classes.append({
-                                'class': str(r['Class']).strip(), 
-                                'sec': str(r.get('Section', 'A')).strip()
-                            })
+                    for _, r in day_rout.at_slot(time(11, 15), mc).iterrows():
+                        assigned_mdm_classes.append({
+                            'class': str(r['Class']).strip(), 
+                            'sec': str(r.get('Section', 'A')).strip()
+                        })
                             
                 if assigned_mdm_classes:
                     primary = assigned_mdm_classes[0]
@@ -457,27 +551,12 @@ if st.session_state.user_role == "teacher":
                     sm = fetch_sheet_data('students_master')
 
                     if not sm.empty:
-                        if 'Section' not in sm.columns: sm['Section'] = 'A'
-                        if tc == 'CLASS PP': ros = sm[(sm['Class'].isin(['CLASS PP', 'CLASS LPP'])) & (sm['Section'] == ts)].copy()
-                        else: ros = sm[(sm['Class'] == tc) & (sm['Section'] == ts)].copy()
+                        ros = build_mdm_roster(sm, tc, ts, curr_date_str)
                         
                         if not ros.empty:
-                            me = ml[(ml['Date'].astype(str) == curr_date_str) & (ml['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else ml['Class'] == tc) & (ml['Section'] == ts)]['Roll'].astype(str).tolist() if not ml.empty else []
-                            ros['MDM (Ate)'] = ros['Roll'].astype(str).isin(me)
-
-                            # ----- HISTORICAL DATA CHECK -----
-                            mdm_day_counts = {}
-                            if not ml.empty:
-                                class_cond = ml['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else (ml['Class'] == tc)
-                                hist_ml = ml[class_cond & (ml['Section'] == ts)]
-                                mdm_day_counts = hist_ml['Roll'].astype(str).str.strip().value_counts().to_dict()
-                                
-                            ros['Historical_Count'] = ros['Roll'].astype(str).str.strip().map(lambda x: mdm_day_counts.get(x, 0))
-                            # ---------------------------------
-
                             if 'scanned_keys' not in st.session_state: st.session_state.scanned_keys = []
                             
-                            st.write("📸 **Scan ID Cards (or tick manually below):**")
+                            st.write("📸 **Scan ID Cards first, then tick the rest below:**")
                             qv = qrcode_scanner(key='at_qr')
                             
                             if st.session_state.scan_msg:
@@ -492,82 +571,36 @@ if st.session_state.user_role == "teacher":
                                     if sr and sn:
                                         match_df = ros[(ros['Roll'].astype(str).str.strip() == sr) & (ros['Name'].astype(str).str.strip() == sn)]
                                         if not match_df.empty:
-                                            ar, an = match_df.iloc[0]['Roll'], match_df.iloc[0]['Name']
-                                            if str(ar) in me:
-                                                st.warning(f"⚠️ {an} is already marked for MDM today!")
-                                            else:
-                                                sk = f"{ar}_{an}"
-                                                if sk not in st.session_state.scanned_keys: 
-                                                    st.session_state.scanned_keys.append(sk)
-                                                    st.session_state[f"mdm_{ar}_{an}"] = True 
-                                                    st.session_state.scan_msg = f"✅ Scanned Successfully: {an}"
-                                                    should_rerun = True
+                                            mr = match_df.iloc[0]
+                                            if mr['MDM (Ate)']:
+                                                st.warning(f"⚠️ {mr['Name']} is already marked for MDM today!")
+                                            elif mr['Scan_Key'] not in st.session_state.scanned_keys: 
+                                                st.session_state.scanned_keys.append(mr['Scan_Key'])
+                                                st.session_state.scan_msg = f"✅ Scanned Successfully: {mr['Name']}"
+                                                should_rerun = True
                                         else: st.error(f"❌ MISMATCH: {sn} is NOT in {tc} {ts}!")
                                 except Exception: st.warning("⚠️ Invalid ID Card.")
                                 if should_rerun: st.rerun()
 
-                            ros['Scan_Key'] = ros['Roll'].astype(str) + "_" + ros['Name'].astype(str)
-                            if 'Thumb_URL' not in ros.columns: ros['Thumb_URL'] = ""
                             with st.spinner("Loading profiles..."):
-                                with concurrent.futures.ThreadPoolExecutor(max_workers=10) as exe: 
-                                    ros['Photo'] = list(exe.map(get_secure_photo_uri, ros['Thumb_URL'].tolist()))
-
-                            # Dynamic Splitting using Threshold
-                            th_val = get_mdm_threshold()
-                            if th_val == "None":
-                                regular_ros = ros.copy()
-                                not_regular_ros = ros.iloc[0:0].copy()
-                            else:
-                                th_num = int(th_val)
-                                regular_ros = ros[ros['Historical_Count'] >= th_num].copy()
-                                not_regular_ros = ros[ros['Historical_Count'] < th_num].copy()
+                                ros['Photo'] = photo_store.get_photo_uris(ros['Thumb_URL'].tolist())
+                            regular_ros, not_regular_ros = split_regular(ros, get_mdm_threshold())
 
+                            st.markdown(f"<div class='floating-counter'>📸 Scanned: {len(st.session_state.scanned_keys)} | Done: {int(ros['MDM (Ate)'].sum())}</div>", unsafe_allow_html=True)
                             st.markdown("### Class Roster (Regular)")
-                            cp = st.empty()
-                            st.markdown('<div class="roster-container">', unsafe_allow_html=True)
-                            sel_mdm, alc = [], 0
-                            
-                            for _, r in regular_ros.iterrows():
-                                c1, c2, c3 = st.columns([1, 4, 2])
-                                with c1: st.image(r['Photo'], width=85) 
-                                with c2: 
-                                    lbl = "<div style='line-height:1.2; font-size:14px; margin-top:2px;'><b>" + str(r['Name']) + "</b><br><span style='font-size:12px; color:gray;'>Roll: " + str(r['Roll']) + " | " + str(r['Class']) + "<br>📅 MDM Days: <b>" + str(r['Historical_Count']) + "</b></span></div>"
-                                    st.markdown(lbl, unsafe_allow_html=True)
-                                with c3:
-                                    if r['MDM (Ate)']:
-                                        st.markdown("<span style='color:#28a745; font-weight:bold;'>✅ Done</span>", unsafe_allow_html=True)
-                                        alc += 1
-                                    else:
-                                        isc = r['Scan_Key'] in st.session_state.scanned_keys
-                                        if st.checkbox("Ate MDM", value=isc, key=f"mdm_{r['Roll']}_{r['Name']}"): sel_mdm.append(r)
-                                st.divider()
-                                
-                            if not not_regular_ros.empty:
-                                with st.expander("⚠️ Show Not Regular Students (" + str(len(not_regular_ros)) + " Students)"):
-                                    for _, r in not_regular_ros.iterrows():
-                                        c1, c2, c3 = st.columns([1, 4, 2])
-                                        with c1: st.image(r['Photo'], width=85) 
-                                        with c2: 
-                                            lbl = "<div style='line-height:1.2; font-size:14px; margin-top:2px;'><b>" + str(r['Name']) + "</b><br><span style='font-size:12px; color:gray;'>Roll: " + str(r['Roll']) + " | " + str(r['Class']) + "<br>📅 MDM Days: <b>" + str(r['Historical_Count']) + "</b></span></div>"
-                                            st.markdown(lbl, unsafe_allow_html=True)
-                                        with c3:
-                                            if r['MDM (Ate)']:
-                                                st.markdown("<span style='color:#28a745; font-weight:bold;'>✅ Done</span>", unsafe_allow_html=True)
-                                                alc += 1
-                                            else:
-                                                isc = r['Scan_Key'] in st.session_state.scanned_keys
-                                                if st.checkbox("Ate MDM", value=isc, key=f"mdm_{r['Roll']}_{r['Name']}"): sel_mdm.append(r)
-                                        st.divider()
-                            
-                            cp.markdown(f"<div class='floating-counter'>✅ Selected: {len(sel_mdm)} | Done: {alc}</div>", unsafe_allow_html=True)
-                            st.markdown(f"<h3 style='text-align:center;'>✅ New Selected: {len(sel_mdm)}</h3>", unsafe_allow_html=True)
-                            if st.button("Submit MDM Data"):
-                                if sel_mdm:
-                                    nr = [{'Date': curr_date_str, 'Teacher': t_name_select, 'Class': x['Class'], 'Section': ts, 'Roll': x['Roll'], 'Name': x['Name'], 'Time': now.strftime("%H:%M")} for x in sel_mdm]
-                                    append_sheet_df('mdm_log', pd.DataFrame(nr))
+                            with st.form(f"mdm_form_{tc}_{ts}"):
+                                sel_mdm = mdm_roster_editor(regular_ros, f"mdm_ed_{tc}_{ts}", st.session_state.scanned_keys)
+                                if not not_regular_ros.empty:
+                                    with st.expander("⚠️ Show Not Regular Students (" + str(len(not_regular_ros)) + " Students)"):
+                                        sel_mdm = pd.concat([sel_mdm, mdm_roster_editor(not_regular_ros, f"mdm_nr_{tc}_{ts}", st.session_state.scanned_keys)])
+                                submitted = st.form_submit_button("Submit MDM Data", use_container_width=True)
+                            if submitted:
+                                if not sel_mdm.empty:
+                                    nr = pd.DataFrame({'Date': curr_date_str, 'Teacher': t_name_select, 'Class': sel_mdm['Class'], 'Section': ts, 'Roll': sel_mdm['Roll'], 'Name': sel_mdm['Name'], 'Time': now.strftime("%H:%M")})
+                                    append_sheet_df('mdm_log', nr)
+                                    clear_editors(f"mdm_ed_{tc}_{ts}", f"mdm_nr_{tc}_{ts}")
                                     st.session_state.scanned_keys = []; st.success(f"Submitted {len(nr)} to Cloud DB!"); st.rerun()
                                 else: st.warning("No new students selected.")
-                            st.markdown('</div>', unsafe_allow_html=True)
                             
                             att = fetch_sheet_data('student_attendance_master')
                             if not att.empty and 'Date' in att.columns:
@@ -581,11 +614,10 @@ if st.session_state.user_role == "teacher":
         with at_tabs[1]:
             st.subheader("Live Class Status")
             ll = fetch_sheet_data('teacher_leave')
-            tdy = now.strftime('%A')
             mc = TEACHER_INITIALS.get(t_name_select, t_name_select)
-            active_rout = get_active_routine(curr_date_str, tdy)
+            day_rout = get_day_routine(curr_date_str)
             
-            if not active_rout.empty and active_rout.iloc[0].get('Is_Exam_Day', False):
+            if day_rout.is_exam_day:
                 st.success("📝 **EXAM DAY MODE:** Operating on **BPS EXAM** schedule (11:15-12:45 Exam | 12:45-13:30 Next Day Prep | 14:20-15:30 Copies Check). Regular routine is suspended.")
             elif not ll.empty and 'Date' in ll.columns:
                 mtl = ll[(ll['Date'] == curr_date_str) & (ll['Teacher'] == t_name_select)]
@@ -594,26 +626,19 @@ if st.session_state.user_role == "teacher":
                     if ld['Type'] not in ['Class Shift / Internal Duty']:
                         st.warning(f"🏖️ You are marked for **{ld['Type']}** today. Follow custom routine if assigned.")
             
-            ms = active_rout[active_rout['Teacher'] == mc].copy() if not active_rout.empty else pd.DataFrame()
+            ms = day_rout.for_teacher(mc)
             
             if not ms.empty:
-                ms['Start_Obj'] = ms['Start_Time'].apply(parse_time_safe)
-                ms = ms.dropna(subset=['Start_Obj']).sort_values('Start_Obj')
-                
-                active_classes = []
-                for _, r in ms.iterrows():
-                    st_time, et = r['Start_Obj'], parse_time_safe(r['End_Time'])
-                    if st_time and et and st_time <= curr_time <= et: 
-                        active_classes.append(r)
+                active_classes = day_rout.live_at(curr_time, mc)
                         
-                if active_classes:
-                    for cc in active_classes:
+                if not active_classes.empty:
+                    for _, cc in active_classes.iterrows():
                         sty = "border-left: 5px solid #28a745;"
                         px = "🔴 NOW: "
-                        if active_rout.iloc[0].get('Is_Exam_Day', False):
+                        if day_rout.is_exam_day:
                             sty = "border-left: 5px solid #6f42c1; background-color:#f3e8ff;"
                             px = "📝 EXAM SLOT: "
-                        elif active_rout.iloc[0].get('Is_Custom', False):
+                        elif day_rout.is_custom:
                             sty = "border-left: 5px solid #ffc107; background-color:#fff3cd;"
                             px = "🔄 ASSIGNED: "
                             
@@ -625,8 +650,8 @@ if st.session_state.user_role == "teacher":
                 st.divider()
                 st.markdown("#### Your Schedule Today")
                 def hls(row):
-                    if active_rout.iloc[0].get('Is_Exam_Day', False): return ['background-color: #f3e8ff'] * len(row)
-                    elif active_rout.iloc[0].get('Is_Custom', False): return ['background-color: #fff3cd'] * len(row)
+                    if day_rout.is_exam_day: return ['background-color: #f3e8ff'] * len(row)
+                    elif day_rout.is_custom: return ['background-color: #fff3cd'] * len(row)
                     return [''] * len(row)
                 st.dataframe(ms[['Start_Time', 'End_Time', 'Class', 'Section', 'Subject']].style.apply(hls, axis=1), hide_index=True)
             else: st.info("No classes scheduled for you today.")
@@ -656,7 +681,6 @@ elif st.session_state.user_role == "admin":
     
     with tabs[0]: 
         st.subheader(f"MDM Status: {curr_date_str}")
-        ml = fetch_sheet_data('mdm_log')
         tdy = now.strftime('%A')
         hd = get_local_csv('holidays.csv')
         is_h = not hd[hd['Date'] == curr_date_str].empty if not hd.empty else False
@@ -664,10 +688,9 @@ elif st.session_state.user_role == "admin":
         if is_h or tdy == 'Sunday':
             st.info("🏖️ School is closed today. No MDM expected.")
         else:
-            active_rout = get_active_routine(curr_date_str, tdy)
-            if not active_rout.empty:
-                active_rout['Start_Obj'] = active_rout['Start_Time'].apply(parse_time_safe)
-                r_1115 = active_rout[active_rout['Start_Obj'] == time(11, 15)]
+            day_rout = get_day_routine(curr_date_str)
+            if not day_rout.empty:
+                r_1115 = day_rout.at_slot(time(11, 15))
                 
                 expected_mdm = {} 
                 for _, r in r_1115.iterrows():
@@ -675,7 +698,7 @@ elif st.session_state.user_role == "admin":
                         expected_mdm[(r['Class'], r.get('Section', 'A'))] = r['Teacher']
                 
                 completed_mdm_actual = {}
-                today_ml = ml[ml['Date'].astype(str) == curr_date_str] if not ml.empty else pd.DataFrame()
+                today_ml = fetch_mdm_day(curr_date_str)
                 if not today_ml.empty:
                     for _, r in today_ml.iterrows():
                         c = str(r['Class']).strip()
@@ -730,7 +753,7 @@ elif st.session_state.user_role == "admin":
         c1, c2 = st.columns([2, 1])
         vd = c1.date_input("Select Date", datetime.now()).strftime("%d-%m-%Y")
         sa = c2.checkbox("Show All")
-        fm = ml if sa else ml[ml['Date'].astype(str) == vd].copy() if not ml.empty else pd.DataFrame()
+        fm = fetch_sheet_data('mdm_log') if sa else fetch_mdm_day(vd)
         fa = al[al['Status'] == True] if sa else al[(al['Date'].astype(str) == vd) & (al['Status'] == True)].copy() if not al.empty else pd.DataFrame()
         cf = "All"
         if not fm.empty or not fa.empty:
@@ -751,11 +774,9 @@ elif st.session_state.user_role == "admin":
         else: st.info("No data available for this date.")
         st.divider()
         if st.button(f"🗑️ Clear Data ({cf})"):
-            tm = fetch_sheet_data('mdm_log')
-            if not tm.empty:
-                if cf == "All": tm = tm[tm['Date'].astype(str) != curr_date_str]
-                else: tm = tm[~((tm['Date'].astype(str) == curr_date_str) & ((tm['Class'].astype(str) + " " + tm['Section'].astype(str)) == cf))]
-                overwrite_sheet_df('mdm_log', tm); st.success("Cleared!"); st.rerun()
+            where = {'Date': curr_date_str}
+            if cf != "All": where['Class'], where['Section'] = cf.rsplit(' ', 1)
+            delete_sheet_rows('mdm_log', where); st.success("Cleared!"); st.rerun()
 
     with tabs[1]:
         st.subheader("Admin MDM Entry (Late/Missed)")
@@ -763,27 +784,11 @@ elif st.session_state.user_role == "admin":
         if sc_mdm != "Select Class...":
             tc, ts = sc_mdm.rsplit(' ', 1)
             sm = fetch_sheet_data('students_master')
-            ml = fetch_sheet_data('mdm_log')
             if not sm.empty:
-                if 'Section' not in sm.columns: sm['Section'] = 'A'
-                if tc == 'CLASS PP': ros = sm[(sm['Class'].isin(['CLASS PP', 'CLASS LPP'])) & (sm['Section'] == ts)].copy()
-                else: ros = sm[(sm['Class'] == tc) & (sm['Section'] == ts)].copy()
+                ros = build_mdm_roster(sm, tc, ts, curr_date_str)
                 
                 if not ros.empty:
-                    me = ml[(ml['Date'].astype(str) == curr_date_str) & (ml['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else ml['Class'] == tc) & (ml['Section'] == ts)]['Roll'].astype(str).tolist() if not ml.empty else []
-                    ros['MDM (Ate)'] = ros['Roll'].astype(str).isin(me)
-                    
-                    # ----- HISTORICAL DATA CHECK -----
-                    mdm_day_counts = {}
-                    if not ml.empty:
-                        class_cond = ml['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else (ml['Class'] == tc)
-                        hist_ml = ml[class_cond & (ml['Section'] == ts)]
-                        mdm_day_counts = hist_ml['Roll'].astype(str).str.strip().value_counts().to_dict()
-                        
-                    ros['Historical_Count'] = ros['Roll'].astype(str).str.strip().map(lambda x: mdm_day_counts.get(x, 0))
-                    # ---------------------------------
-                    
-                    st.write("📸 **Scan Missed ID Cards (or tick manually below):**")
+                    st.write("📸 **Scan Missed ID Cards first, then tick the rest below:**")
                     qv = qrcode_scanner(key='adm_mdm_qr')
                     
                     if st.session_state.admin_scan_msg:
@@ -798,81 +803,36 @@ elif st.session_state.user_role == "admin":
                             if sr and sn:
                                 match_df = ros[(ros['Roll'].astype(str).str.strip() == sr) & (ros['Name'].astype(str).str.strip() == sn)]
                                 if not match_df.empty:
-                                    ar, an = match_df.iloc[0]['Roll'], match_df.iloc[0]['Name']
-                                    if str(ar) in me:
-                                        st.warning(f"⚠️ {an} is already marked for MDM today!")
-                                    else:
-                                        sk = f"{ar}_{an}"
-                                        if sk not in st.session_state.admin_scanned_keys: 
-                                            st.session_state.admin_scanned_keys.append(sk)
-                                            st.session_state[f"adm_mdm_{ar}_{an}"] = True 
-                                            st.session_state.admin_scan_msg = f"✅ Scanned Successfully: {an}"
-                                            should_rerun = True
+                                    mr = match_df.iloc[0]
+                                    if mr['MDM (Ate)']:
+                                        st.warning(f"⚠️ {mr['Name']} is already marked for MDM today!")
+                                    elif mr['Scan_Key'] not in st.session_state.admin_scanned_keys: 
+                                        st.session_state.admin_scanned_keys.append(mr['Scan_Key'])
+                                        st.session_state.admin_scan_msg = f"✅ Scanned Successfully: {mr['Name']}"
+                                        should_rerun = True
                                 else: st.error(f"❌ MISMATCH: {sn} is NOT in {tc} {ts}!")
                         except Exception: st.warning("⚠️ Invalid ID Card.")
                         if should_rerun: st.rerun()
 
-                    ros['Scan_Key'] = ros['Roll'].astype(str) + "_" + ros['Name'].astype(str)
-                    if 'Thumb_URL' not in ros.columns: ros['Thumb_URL'] = ""
                     with st.spinner("Loading profiles..."):
-                        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as exe: 
-                            ros['Photo'] = list(exe.map(get_secure_photo_uri, ros['Thumb_URL'].tolist()))
-
-                    th_val = get_mdm_threshold()
-                    if th_val == "None":
-                        regular_ros = ros.copy()
-                        not_regular_ros = ros.iloc[0:0].copy()
-                    else:
-                        th_num = int(th_val)
-                        regular_ros = ros[ros['Historical_Count'] >= th_num].copy()
-                        not_regular_ros = ros[ros['Historical_Count'] < th_num].copy()
+                        ros['Photo'] = photo_store.get_photo_uris(ros['Thumb_URL'].tolist())
+                    regular_ros, not_regular_ros = split_regular(ros, get_mdm_threshold())
 
+                    st.markdown(f"<div class='floating-counter'>📸 Scanned: {len(st.session_state.admin_scanned_keys)} | Done: {int(ros['MDM (Ate)'].sum())}</div>", unsafe_allow_html=True)
                     st.markdown("### Class Roster (Regular)")
-                    cp = st.empty()
-                    st.markdown('<div class="roster-container">', unsafe_allow_html=True)
-                    sel_mdm, alc = [], 0
-                    
-                    for _, r in regular_ros.iterrows():
-                        c1, c2, c3 = st.columns([1, 4, 2])
-                        with c1: st.image(r['Photo'], width=85) 
-                        with c2: 
-                            lbl = "<div style='line-height:1.2; font-size:14px; margin-top:2px;'><b>" + str(r['Name']) + "</b><br><span style='font-size:12px; color:gray;'>Roll: " + str(r['Roll']) + " | " + str(r['Class']) + "<br>📅 MDM Days: <b>" + str(r['Historical_Count']) + "</b></span></div>"
-                            st.markdown(lbl, unsafe_allow_html=True)
-                        with c3:
-                            if r['MDM (Ate)']:
-                                st.markdown("<span style='color:#28a745; font-weight:bold;'>✅ Done</span>", unsafe_allow_html=True)
-                                alc += 1
-                            else:
-                                isc = r['Scan_Key'] in st.session_state.admin_scanned_keys
-                                if st.checkbox("Ate MDM", value=isc, key=f"adm_mdm_{r['Roll']}_{r['Name']}"): sel_mdm.append(r)
-                        st.divider()
-                        
-                    if not not_regular_ros.empty:
-                        with st.expander("⚠️ Show Not Regular Students (" + str(len(not_regular_ros)) + " Students)"):
-                            for _, r in not_regular_ros.iterrows():
-                                c1, c2, c3 = st.columns([1, 4, 2])
-                                with c1: st.image(r['Photo'], width=85) 
-                                with c2: 
-                                    lbl = "<div style='line-height:1.2; font-size:14px; margin-top:2px;'><b>" + str(r['Name']) + "</b><br><span style='font-size:12px; color:gray;'>Roll: " + str(r['Roll']) + " | " + str(r['Class']) + "<br>📅 MDM Days: <b>" + str(r['Historical_Count']) + "</b></span></div>"
-                                    st.markdown(lbl, unsafe_allow_html=True)
-                                with c3:
-                                    if r['MDM (Ate)']:
-                                        st.markdown("<span style='color:#28a745; font-weight:bold;'>✅ Done</span>", unsafe_allow_html=True)
-                                        alc += 1
-                                    else:
-                                        isc = r['Scan_Key'] in st.session_state.admin_scanned_keys
-                                        if st.checkbox("Ate MDM", value=isc, key=f"adm_mdm_{r['Roll']}_{r['Name']}"): sel_mdm.append(r)
-                                st.divider()
-                    
-                    cp.markdown(f"<div class='floating-counter'>✅ Selected: {len(sel_mdm)} | Done: {alc}</div>", unsafe_allow_html=True)
-                    st.markdown(f"<h3 style='text-align:center;'>✅ New Selected: {len(sel_mdm)}</h3>", unsafe_allow_html=True)
-                    if st.button("Submit Admin MDM Data"):
-                        if sel_mdm:
-                            nr = [{'Date': curr_date_str, 'Teacher': f"{st.session_state.user_name} (Admin)", 'Class': x['Class'], 'Section': ts, 'Roll': x['Roll'], 'Name': x['Name'], 'Time': now.strftime("%H:%M")} for x in sel_mdm]
-                            append_sheet_df('mdm_log', pd.DataFrame(nr))
+                    with st.form(f"adm_mdm_form_{tc}_{ts}"):
+                        sel_mdm = mdm_roster_editor(regular_ros, f"adm_mdm_ed_{tc}_{ts}", st.session_state.admin_scanned_keys)
+                        if not not_regular_ros.empty:
+                            with st.expander("⚠️ Show Not Regular Students (" + str(len(not_regular_ros)) + " Students)"):
+                                sel_mdm = pd.concat([sel_mdm, mdm_roster_editor(not_regular_ros, f"adm_mdm_nr_{tc}_{ts}", st.session_state.admin_scanned_keys)])
+                        submitted = st.form_submit_button("Submit Admin MDM Data", use_container_width=True)
+                    if submitted:
+                        if not sel_mdm.empty:
+                            nr = pd.DataFrame({'Date': curr_date_str, 'Teacher': f"{st.session_state.user_name} (Admin)", 'Class': sel_mdm['Class'], 'Section': ts, 'Roll': sel_mdm['Roll'], 'Name': sel_mdm['Name'], 'Time': now.strftime("%H:%M")})
+                            append_sheet_df('mdm_log', nr)
+                            clear_editors(f"adm_mdm_ed_{tc}_{ts}", f"adm_mdm_nr_{tc}_{ts}")
                             st.session_state.admin_scanned_keys = []; st.success(f"Added {len(nr)} late entries to Cloud DB!"); st.rerun()
                         else: st.warning("No new students selected.")
-                    st.markdown('</div>', unsafe_allow_html=True)
                 else: st.warning("No students found.")
 
     with tabs[2]:
@@ -881,66 +841,33 @@ elif st.session_state.user_role == "admin":
         if sc != "Select Class...":
             tc, ts = sc.rsplit(' ', 1)
             sm = fetch_sheet_data('students_master')
-            ml = fetch_sheet_data('mdm_log')
             if not sm.empty:
-                if 'Section' not in sm.columns: sm['Section'] = 'A'
-                if tc == 'CLASS PP': ros = sm[(sm['Class'].isin(['CLASS PP', 'CLASS LPP'])) & (sm['Section'] == ts)].copy()
-                else: ros = sm[(sm['Class'] == tc) & (sm['Section'] == ts)].copy()
+                ros = build_mdm_roster(sm, tc, ts, curr_date_str)
                 
                 if not ros.empty:
-                    me = ml[(ml['Date'].astype(str) == curr_date_str) & (ml['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else ml['Class'] == tc) & (ml['Section'] == ts)]['Roll'].astype(str).tolist() if not ml.empty else []
-                    ros['MDM (Ate)'] = ros['Roll'].astype(str).isin(me)
-                    
-                    mdm_day_counts = {}
-                    if not ml.empty:
-                        class_cond = ml['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else (ml['Class'] == tc)
-                        hist_ml = ml[class_cond & (ml['Section'] == ts)]
-                        mdm_day_counts = hist_ml['Roll'].astype(str).str.strip().value_counts().to_dict()
-                    
-                    if 'Thumb_URL' not in ros.columns: ros['Thumb_URL'] = ""
                     with st.spinner("Loading profiles..."):
-                        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as exe: ros['Photo'] = list(exe.map(get_secure_photo_uri, ros['Thumb_URL'].tolist()))
+                        ros['Photo'] = photo_store.get_photo_uris(ros['Thumb_URL'].tolist())
                     
                     th_val = get_mdm_threshold()
+                    default_present = ros['Historical_Count'] >= int(th_val) if th_val != "None" else False
 
                     st.markdown("### Class Roster")
                     cp = st.empty()
-                    st.markdown('<div class="roster-container">', unsafe_allow_html=True)
-                    ad, pc = [], 0
-                    for _, r in ros.iterrows():
-                        roll_str = str(r['Roll']).strip()
-                        days_attended = mdm_day_counts.get(roll_str, 0)
-                        
-                        if th_val == "None":
-                            default_present = False
-                        else:
-                            default_present = days_attended >= int(th_val)
-                        
-                        c1, c2, c3 = st.columns([1, 4, 2.5])
-                        with c1: st.image(r['Photo'], width=85) 
-                        with c2: 
-                            label_html = "<div style='line-height:1.2; font-size:14px; margin-top:2px;'><b>" + str(r['Name']) + "</b><br><span style='font-size:12px; color:gray;'>Roll: " + str(r['Roll']) + " | " + str(r['Class']) + "<br>📅 MDM Days: <b>" + str(days_attended) + "</b></span></div>"
-                            st.markdown(label_html, unsafe_allow_html=True)
-                        with c3:
-                            ip = st.checkbox("Present", value=default_present, key=f"att_{r['Roll']}_{r['Name']}")
-                            if ip: pc += 1
-                            st.checkbox("MDM Entry", value=bool(r['MDM (Ate)']), disabled=True, key=f"mdm_ro_{r['Roll']}_{r['Name']}")
-                            ad.append({'Date': curr_date_str, 'Class': r['Class'], 'Section': ts, 'Roll': r['Roll'], 'Name': r['Name'], 'Status': ip})
-                        st.divider()
-                    
-                    cp.markdown(f"<div class='floating-counter'>✅ Present: {pc}</div>", unsafe_allow_html=True)
-                    st.markdown(f"<h3 style='text-align:center;'>✅ Total Present: {pc}</h3>", unsafe_allow_html=True)
-                    if st.button(f"Save Attendance"):
-                        append_sheet_df('student_attendance_master', pd.DataFrame(ad)); st.success("Saved."); st.rerun()
-                    st.markdown('</div>', unsafe_allow_html=True)
+                    with st.form(f"att_form_{tc}_{ts}"):
+                        ed = roster_editor(ros, f"att_ed_{tc}_{ts}", {'MDM Entry': ros['MDM (Ate)'], 'Present': default_present}, 'Present')
+                        submitted = st.form_submit_button("Save Attendance", use_container_width=True)
+                    present = ed['Present'].to_numpy(dtype=bool)
+                    cp.markdown(f"<div class='floating-counter'>✅ Present: {int(present.sum())}</div>", unsafe_allow_html=True)
+                    if submitted:
+                        ad = pd.DataFrame({'Date': curr_date_str, 'Class': ros['Class'], 'Section': ts, 'Roll': ros['Roll'], 'Name': ros['Name'], 'Status': present})
+                        append_sheet_df('student_attendance_master', ad); clear_editors(f"att_ed_{tc}_{ts}"); st.success("Saved."); st.rerun()
 
                     ac = fetch_sheet_data('student_attendance_master')
                     is_sub = not ac[(ac['Date'].astype(str) == curr_date_str) & (ac['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else ac['Class'] == tc) & (ac['Section'] == ts)].empty if not ac.empty else False
                     if is_sub:
                         st.info(f"🔒 Attendance is submitted.")
                         if st.button("🗑️ Clear Today's Attendance"):
-                            ta = ac[~((ac['Date'].astype(str) == curr_date_str) & (ac['Class'].isin(['CLASS PP', 'CLASS LPP']) if tc == 'CLASS PP' else ac['Class'] == tc) & (ac['Section'] == ts))]
-                            overwrite_sheet_df('student_attendance_master', ta); st.rerun()
+                            delete_sheet_rows('student_attendance_master', {'Date': curr_date_str, 'Class': ['CLASS PP', 'CLASS LPP'] if tc == 'CLASS PP' else tc, 'Section': ts}); st.rerun()
 
         st.divider()
         st.subheader("📊 Daily Report")
@@ -959,31 +886,24 @@ elif st.session_state.user_role == "admin":
 
     with tabs[3]: 
         st.subheader(f"🏫 Live Master Routine")
-        tdy = now.strftime('%A')
-        active_rout = get_active_routine(curr_date_str, tdy)
+        day_rout = get_day_routine(curr_date_str)
+        active_rout = day_rout.timeline()
         
         if not active_rout.empty:
-            active_rout['Start_Obj'] = active_rout['Start_Time'].apply(parse_time_safe)
-            active_rout['End_Obj'] = active_rout['End_Time'].apply(parse_time_safe)
-            active_rout = active_rout.dropna(subset=['Start_Obj', 'End_Obj']).sort_values('Start_Obj')
-            
-            is_exam_day = active_rout.iloc[0].get('Is_Exam_Day', False)
-            is_custom = active_rout.iloc[0].get('Is_Custom', False)
+            is_exam_day = day_rout.is_exam_day
+            is_custom = day_rout.is_custom
             
             if is_exam_day:
                 st.success("📝 **EXAM DAY ROUTINE ACTIVE:** Operating on automatic **BPS EXAM** schedule (11:15-12:45 Exam | 12:45-13:30 Next Day Prep | 14:20-15:30 Copies Check).")
             elif is_custom:
                 st.success("🟢 Operating on Custom Generated Routine for today.")
             
-            lc = []
-            for _, r in active_rout.iterrows():
-                if r['Start_Obj'] <= curr_time <= r['End_Obj']:
-                    lc.append(r)
+            lc = day_rout.live_at(curr_time)
                     
             st.markdown("### 🔴 LIVE NOW")
-            if lc:
+            if not lc.empty:
                 cls = st.columns(2)
-                for i, r in enumerate(lc):
+                for i, (_, r) in enumerate(lc.iterrows()):
                     is_sub = is_custom and r['Teacher'] != "--- UNASSIGNED ---"
                     tn = f"👨‍🏫 {INV_TEACHER_INITIALS.get(r['Teacher'], r['Teacher'])}"
                     if r['Teacher'] == "--- UNASSIGNED ---": tn = "🚫 UNASSIGNED"
@@ -1005,7 +925,6 @@ elif st.session_state.user_role == "admin":
         st.subheader("🛠️ 3-Step Daily Routine Planner")
         sds = st.date_input("Select Date to Manage", datetime.now())
         sds_str = sds.strftime("%d-%m-%Y")
-        tdy_name = sds.strftime('%A')
         
         st.markdown("### Step 1: Manage Absences")
         ll = fetch_sheet_data('teacher_leave')
@@ -1024,13 +943,11 @@ elif st.session_state.user_role == "admin":
                 leave_types[t] = cols[i%3].selectbox(f"Type: {t}", opts, index=idx, key=f"lt_{t}")
             
             if st.button("💾 Save Absences"):
-                new_ll = ll[ll['Date'] != sds_str] if not ll.empty and 'Date' in ll.columns else ll.copy() if not ll.empty else pd.DataFrame(columns=["Date", "Teacher", "Type", "Substitute", "Detailed_Sub_Log"])
                 new_records = []
                 for t in absent_teachers:
                     new_records.append({"Date": sds_str, "Teacher": t, "Type": leave_types[t], "Substitute": "Managed via Custom Routine", "Detailed_Sub_Log": "See bps_routine (daily_override)"})
-                if new_records:
-                    new_ll = pd.concat([new_ll, pd.DataFrame(new_records)], ignore_index=True)
-                overwrite_sheet_df('teacher_leave', new_ll)
+                if ll.empty: append_sheet_df('teacher_leave', pd.DataFrame(new_records))
+                else: replace_sheet_rows('teacher_leave', {'Date': sds_str}, new_records)
                 st.success("Absences Saved! Move to Step 2.")
                 st.rerun()
                 
@@ -1038,30 +955,17 @@ elif st.session_state.user_role == "admin":
         st.markdown("### Step 2: Class Size Reference (MDM Data)")
         st.caption("Use this latest MDM data to strategically decide which classes to combine.")
         
-        ml = fetch_sheet_data('mdm_log')
         classes_ref = ["CLASS PP", "CLASS I", "CLASS II", "CLASS III", "CLASS IV", "CLASS V"]
+        target_obj = datetime.strptime(sds_str, "%d-%m-%Y").date()
         summary = []
-        if ml.empty or 'Date' not in ml.columns:
-            for c in classes_ref: summary.append({"Class": c, "Latest MDM Count": 0, "Data Source": "No Data"})
-        else:
-            ml['DateObj'] = pd.to_datetime(ml['Date'], format='%d-%m-%Y', errors='coerce')
-            target_obj = datetime.strptime(sds_str, "%d-%m-%Y")
-            for c in classes_ref:
-                c_ml = ml[ml['Class'] == c]
-                if c_ml.empty:
-                    summary.append({"Class": c, "Latest MDM Count": 0, "Data Source": "No Data"})
-                    continue
-                t_ml = c_ml[c_ml['Date'] == sds_str]
-                if not t_ml.empty:
-                    summary.append({"Class": c, "Latest MDM Count": len(t_ml), "Data Source": "Today"})
-                else:
-                    p_ml = c_ml[c_ml['DateObj'] < target_obj]
-                    if not p_ml.empty:
-                        max_d = p_ml['DateObj'].max()
-                        count = len(p_ml[p_ml['DateObj'] == max_d])
-                        summary.append({"Class": c, "Latest MDM Count": count, "Data Source": f"Past ({max_d.strftime('%d-%m-%Y')})"})
-                    else:
-                        summary.append({"Class": c, "Latest MDM Count": 0, "Data Source": "No Data"})
+        for c in classes_ref:
+            t_ml = fetch_mdm_day(sds_str, c)
+            if not t_ml.empty:
+                summary.append({"Class": c, "Latest MDM Count": len(t_ml), "Data Source": "Today"})
+                continue
+            last = fetch_mdm_latest(c, before=target_obj)
+            if last: summary.append({"Class": c, "Latest MDM Count": len(fetch_mdm_day(last, c)), "Data Source": f"Past ({last})"})
+            else: summary.append({"Class": c, "Latest MDM Count": 0, "Data Source": "No Data"})
                         
         st.dataframe(pd.DataFrame(summary), hide_index=True, use_container_width=True)
         
@@ -1069,7 +973,7 @@ elif st.session_state.user_role == "admin":
         st.markdown("### Step 3: Build Custom Routine")
         st.caption("💡 **Tip to Combine Classes:** Do not edit the class names. Just assign the *same teacher* to multiple classes in the same time slot.")
         
-        active_rout = get_active_routine(sds_str, tdy_name)
+        active_rout = get_day_routine(sds_str).df
         
         if active_rout.empty:
             st.warning("No base routine found for this day to edit.")
@@ -1129,5 +1033,4 @@ elif st.session_state.user_role == "admin":
         if st.button("💾 Save Settings", type="primary"):
             set_setting("MDM_REGULAR_THRESHOLD", new_th)
             st.success("Settings saved! Threshold updated.")
-            clear_sheet_cache()
             st.rerun()
@@ -5,14 +5,13 @@ if st.button("⬅️ Back to BPS Home", type="secondary"):
 st.write("---") 
 # -------------------
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
 from PIL import Image
 import os
 import streamlit.components.v1 as components 
 import plotly.express as px
 import re # Added for parsing allotted Class/Section
+import sheets_store, mdm_index, cache_registry
 
 # ==========================================
 # 1. SETUP & CONFIGURATION
@@ -44,24 +43,52 @@ if 'play_beep' not in st.session_state:
 # ==========================================
 # 2. GOOGLE SHEETS CONNECTION & DATA LOADING
 # ==========================================
-@st.cache_resource
-def get_gspread_client():
-    scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-    credentials = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scopes)
-    return gspread.authorize(credentials)
-
-gc = get_gspread_client()
+LOG_BOOK, LOG_TAB = "BPS_Distribution_Log", "Sheet1"
+LOG_COLUMNS = ['Date', 'Time', 'Teacher', 'Class', 'Section', 'Roll', 'Name', 'Item Given']
 
-@st.cache_data(ttl=600)
+@cache_registry.cached(LOG_BOOK, ttl=600)
 def load_gsheet_data(sheet_name, tab_name):
     """Generic function to load a specific tab from a specific Google Sheet"""
     try:
-        ws = gc.open(sheet_name).worksheet(tab_name)
+        ws = sheets_store.worksheet_handle(sheet_name, tab_name)
         return pd.DataFrame(ws.get_all_records())
     except Exception as e:
         st.error(f"Error loading {tab_name} from {sheet_name}: {e}")
         return pd.DataFrame()
 
+# ==========================================
+# DISTRIBUTION LEDGER
+# ==========================================
+# Item -> student name -> date of the latest log row, both keys normalized.
+# It is folded in from the cached BPS_Distribution_Log sheet in sheets_store,
+# so rows appended on submit are picked up one by one and only a reload of
+# the sheet rebuilds it.
+
+def norm(value): return str(value).strip().lower()
+
+@st.cache_resource
+def _ledger():
+    return {"generation": None, "counted": 0, "last": {}}
+
+def received_on(item, ttl=600):
+    """Normalized student name -> date they last received item."""
+    table = sheets_store.synced_table(LOG_BOOK, LOG_TAB, ttl)
+    with table.lock:
+        led = _ledger()
+        if led["generation"] != table.generation or led["counted"] > table.row_count:
+            led.update(generation=table.generation, counted=0, last={})
+        if led["counted"] < table.row_count and all(c in table.header for c in ('Date', 'Name', 'Item Given')):
+            d, n, i = (table.header.index(c) for c in ('Date', 'Name', 'Item Given'))
+            for r in table.rows[led["counted"]:]: led["last"].setdefault(norm(r[i]), {})[norm(r[n])] = r[d]
+        led["counted"] = table.row_count
+        return dict(led["last"].get(norm(item), {}))
+
+def load_logs():
+    try: return sheets_store.read_sheet(LOG_BOOK, LOG_TAB, ttl=600)
+    except Exception as e:
+        st.error(f"Error loading {LOG_TAB} from {LOG_BOOK}: {e}")
+        return pd.DataFrame()
+
 def get_inventory_items(only_active=True):
     """Fetches items. If only_active is True, hides items marked as 'Hidden'."""
     df_settings = load_gsheet_data("BPS_Distribution_Log", "settings")
@@ -150,9 +177,11 @@ with col3:
 st.markdown("---")
 
 with st.spinner("Loading School Database..."):
-    df_students = load_gsheet_data("BPS_Database", "students_master")
-    df_mdm = load_gsheet_data("BPS_Database", "mdm_log")
-    df_logs_db = load_gsheet_data("BPS_Distribution_Log", "Sheet1")
+    try: df_students = sheets_store.read_sheet("BPS_Database", "students_master", ttl=600)
+    except Exception as e:
+        st.error(f"Error loading students_master from BPS_Database: {e}")
+        df_students = pd.DataFrame()
+    df_logs_db = load_logs()
     
     teacher_active_items = get_inventory_items(only_active=True)
     all_master_items = get_inventory_items(only_active=False)
@@ -173,7 +202,8 @@ with tab_entry:
         st.header("Issue Supplies")
     with col_b:
         if st.button("🔄 Sync Live Data"):
-            st.cache_data.clear()
+            cache_registry.invalidate(LOG_BOOK)
+            cache_registry.invalidate("BPS_Database", "students_master", reload=False)
             st.rerun()
 
     st.info("⚠️ Only showing students who are present in the BPS Digital App today.")
@@ -230,14 +260,15 @@ with tab_entry:
         else:
             today_str = datetime.now().strftime("%d-%m-%Y") 
             
-            if not df_mdm.empty and 'Date' in df_mdm.columns and 'Name' in df_mdm.columns:
-                mdm_today = df_mdm[df_mdm['Date'].astype(str) == today_str]
-                present_names_today = mdm_today['Name'].astype(str).str.strip().str.lower().tolist()
+            try: mdm_today = mdm_index.rows_on(today_str)
+            except Exception: mdm_today = pd.DataFrame()
+            if not mdm_today.empty and 'Name' in mdm_today.columns:
+                present_names_today = set(mdm_today['Name'].map(norm))
                 
                 class_df = df_students[(df_students['Class'].astype(str) == sel_class) & 
                                        (df_students['Section'].astype(str) == sel_section)]
                 
-                class_df = class_df[class_df['Name'].astype(str).str.strip().str.lower().isin(present_names_today)]
+                class_df = class_df[class_df['Name'].map(norm).isin(present_names_today)]
             else:
                 class_df = pd.DataFrame() 
     
@@ -246,39 +277,28 @@ with tab_entry:
             else:
                 st.subheader(f"Present Students: Class {sel_class} ({sel_section})")
                 
-                if 'current_distribution' not in st.session_state:
-                    st.session_state.current_distribution = {}
-    
-                for index, row in class_df.iterrows():
-                    student_name = str(row['Name']).strip()
-                    
-                    already_received = False
-                    received_date = ""
-                    
-                    if not df_logs_db.empty and 'Name' in df_logs_db.columns and 'Item Given' in df_logs_db.columns:
-                        past_records = df_logs_db[
-                            (df_logs_db['Name'].astype(str).str.strip().str.lower() == student_name.lower()) &
-                            (df_logs_db['Item Given'].astype(str).str.strip().str.lower() == distribution_type.strip().lower())
-                        ]
-                        if not past_records.empty:
-                            already_received = True
-                            received_date = past_records.iloc[-1]['Date']
-    
-                    widget_key = f"{sel_class}_{sel_section}_{row['Roll']}_{student_name}"
-                    
-                    if already_received:
-                        st.checkbox(f"Roll {row['Roll']}: {student_name} ✅ (Received on {received_date})", 
-                                    value=True, disabled=True, key=f"dis_{widget_key}")
-                    else:
-                        if widget_key not in st.session_state.current_distribution:
-                            st.session_state.current_distribution[widget_key] = False
-                            
-                        is_checked = st.checkbox(f"Roll {row['Roll']}: {student_name}", key=f"chk_{widget_key}")
-                        
-                        if is_checked and not st.session_state.current_distribution[widget_key]:
-                            st.session_state.play_beep = True
-                            
-                        st.session_state.current_distribution[widget_key] = is_checked
+                try: given = received_on(distribution_type)
+                except Exception: given = {}
+                received = class_df['Name'].map(norm).map(given)
+                view = pd.DataFrame({
+                    'Roll': class_df['Roll'].astype(str).to_numpy(),
+                    'Name': class_df['Name'].astype(str).str.strip().to_numpy(),
+                    'Received On': received.fillna("").astype(str).to_numpy(),
+                    'Give': received.notna().to_numpy(),
+                })
+                # The editor keeps its ticks by row position, so a roster that changes (another MDM entry
+                # adds a student) gets a new key and starts unticked instead of shifting ticks onto other students.
+                roster = hash(tuple(zip(view['Roll'], view['Name'])))
+                editor_key = f"dist_{distribution_type}_{sel_class}_{sel_section}_{roster}"
+                with st.form(f"{editor_key}_form"):
+                    edited = st.data_editor(
+                        view, key=editor_key, hide_index=True, use_container_width=True,
+                        column_config={'Give': st.column_config.CheckboxColumn("✅ Give", width="small")},
+                        disabled=['Roll', 'Name', 'Received On']
+                    )
+                    submitted = st.form_submit_button(f"Submit {distribution_type} Distribution", type="primary")
+                # Students who already received the item stay ticked and are never logged twice.
+                picked = edited['Give'].to_numpy(dtype=bool) & received.isna().to_numpy()
     
                 if st.session_state.play_beep:
                     components.html(
@@ -296,47 +316,31 @@ with tab_entry:
                     )
                     st.session_state.play_beep = False 
     
-                st.markdown("<br>", unsafe_allow_html=True)
-                
-                if st.button(f"Submit {distribution_type} Distribution", type="primary"):
+                if submitted:
                     with st.spinner("Saving logs to Google Sheets..."):
                         try:
-                            log_sheet = gc.open("BPS_Distribution_Log")
-                            log_ws = log_sheet.sheet1 
-                            
                             now = datetime.now()
                             current_date = now.strftime("%d-%m-%Y") 
                             current_time = now.strftime("%H:%M:%S")
                             teacher = st.session_state.current_user
                             
-                            rows_to_append = []
-                            
-                            for index, row in class_df.iterrows():
-                                widget_key = f"{sel_class}_{sel_section}_{row['Roll']}_{row['Name']}"
-                                
-                                if st.session_state.current_distribution.get(widget_key, False):
-                                    log_row = [
-                                        current_date, 
-                                        current_time, 
-                                        teacher,  
-                                        sel_class, 
-                                        sel_section,
-                                        row['Roll'], 
-                                        row['Name'], 
-                                        distribution_type 
-                                    ]
-                                    rows_to_append.append(log_row)
+                            chosen = class_df[picked]
+                            rows_to_append = [
+                                [current_date, current_time, teacher, sel_class, sel_section, roll, name, distribution_type]
+                                for roll, name in zip(chosen['Roll'].tolist(), chosen['Name'].tolist())
+                            ]
                             
                             if rows_to_append:
-                                log_ws.append_rows(rows_to_append)
+                                # Patches the cached log too, so the ledger sees these rows without a re-download.
+                                sheets_store.append_rows(LOG_BOOK, LOG_TAB, rows_to_append)
                                 st.success(f"Successfully logged {len(rows_to_append)} {distribution_type}(s)!")
                                 
                                 if 'recent_logs' not in st.session_state:
                                     st.session_state.recent_logs = []
                                 st.session_state.recent_logs.extend(rows_to_append)
                                 
-                                st.session_state.current_distribution.clear()
-                                st.cache_data.clear() 
+                                st.session_state.pop(editor_key, None)
+                                st.session_state.play_beep = True
                                 st.rerun()
                             else:
                                 st.warning("No new students were selected. Nothing was saved.")
@@ -350,7 +354,7 @@ with tab_summary:
     st.info("This shows the distributions you have logged during this current login session.")
     
     if 'recent_logs' in st.session_state and st.session_state.recent_logs:
-        df_logs = pd.DataFrame(st.session_state.recent_logs, columns=['Date', 'Time', 'Teacher', 'Class', 'Section', 'Roll', 'Name', 'Item Given'])
+        df_logs = pd.DataFrame(st.session_state.recent_logs, columns=LOG_COLUMNS)
         
         df_display = df_logs.drop(columns=['Teacher'])
         st.dataframe(df_display, hide_index=True)
@@ -404,7 +408,7 @@ if st.session_state.current_role == "admin":
                 with st.spinner("Updating inventory in Google Sheets..."):
                     try:
                         final_item = final_item.strip()
-                        ws_settings = gc.open("BPS_Distribution_Log").worksheet("settings")
+                        ws_settings = sheets_store.worksheet_handle(LOG_BOOK, "settings")
                         cell = ws_settings.find(final_item, in_column=1)
                         formatted_date = recv_date.strftime("%d-%m-%Y")
                         
@@ -430,7 +434,7 @@ if st.session_state.current_role == "admin":
                             ws_settings.update_cell(next_row, 4, "Active") 
                             st.success(f"Successfully added NEW item '{final_item}' with a starting quantity of {recv_qty}!")
 
-                        st.cache_data.clear()
+                        cache_registry.invalidate(LOG_BOOK, "settings")
                     except Exception as e:
                         st.error(f"Error updating stock: {e}")
 
@@ -538,7 +542,7 @@ if st.session_state.current_role == "admin":
         
         if st.button("Save Settings", type="primary"):
             try:
-                ws_settings = gc.open("BPS_Distribution_Log").worksheet("settings")
+                ws_settings = sheets_store.worksheet_handle(LOG_BOOK, "settings")
                 
                 with st.spinner("Updating status in Google Sheets..."):
                     col_a_values = ws_settings.col_values(1)
@@ -556,7 +560,7 @@ if st.session_state.current_role == "admin":
                     ws_settings.update(values=status_updates, range_name="D1")
                     
                 st.success("Settings saved successfully! The app display has been updated.")
-                st.cache_data.clear()
+                cache_registry.invalidate(LOG_BOOK, "settings")
                 st.rerun()
             except Exception as e:
                 st.error(f"Error saving settings: {e}")
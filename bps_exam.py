@@ -7,11 +7,9 @@ import pytz
 import gspread
 from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
 from google.oauth2.service_account import Credentials
-from google.auth.transport.requests import AuthorizedSession
 import numpy as np
-import base64
-import concurrent.futures
 import threading
+import sheets_store, photo_store, mdm_index
 
 # ==========================================
 # 1. AUTHENTICATION & SECURITY
@@ -97,10 +95,6 @@ def init_routine_sheet():
     except Exception: 
         return None
 
-@st.cache_resource
-def get_drive_session(): 
-    return AuthorizedSession(get_google_credentials())
-
 def ensure_worksheet(sh, title, headers):
     try: 
         ws = sh.worksheet(title)
@@ -118,12 +112,12 @@ def log_action(action, details):
     
     def background_log():
         try:
-            sh = gspread.authorize(get_google_credentials()).open("BPS EXAM")
             try: 
-                ws = sh.worksheet("audit_log")
+                ws = sheets_store.worksheet_handle("BPS EXAM", "audit_log")
             except WorksheetNotFound: 
-                ws = sh.add_worksheet(title="audit_log", rows=1000, cols=5)
+                ws = sheets_store.open_spreadsheet("BPS EXAM").add_worksheet(title="audit_log", rows=1000, cols=5)
                 ws.append_row(["Timestamp", "User", "Role", "Action", "Details"])
+                sheets_store.forget_handles("BPS EXAM")
             now_str = datetime.now(IST).strftime("%Y-%m-%d %I:%M:%S %p")
             ws.append_row([now_str, user_name, user_role, action, details])
         except Exception: 
@@ -148,47 +142,24 @@ def fetch_audit_logs():
         return pd.DataFrame(columns=["Timestamp", "User", "Role", "Action", "Details"])
 
 def refresh_exam_data():
-    fetch_exam_schedules.clear()
-    fetch_exam_marks.clear()
+    sheets_store.invalidate("BPS EXAM")
     fetch_routine_data.clear()
     init_subject_map.clear()
-    fetch_teacher_status.clear()
     fetch_student_photos.clear()
     fetch_audit_logs.clear()
-    
+    clear_exam_inputs()
+
+def clear_exam_inputs():
     keys_to_clear = [key for key in st.session_state.keys() if key.startswith("act_") or key.startswith("ext_") or key.startswith("roster_")]
     for key in keys_to_clear:
         del st.session_state[key]
 
-@st.cache_data(ttl=300)
-def fetch_mdm_log():
+def fetch_mdm_present(date_str, cls, sec):
     try: 
-        return pd.DataFrame(init_db_sheet().worksheet("mdm_log").get_all_records()).astype(str)
+        return mdm_index.rows_on(str(date_str).strip(), cls, sec, ttl=300).astype(str)
     except Exception: 
         return pd.DataFrame()
 
-# ---------------------------------------------------------
-# SECURE PHOTO ENGINE
-# ---------------------------------------------------------
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_secure_image_bytes(file_id):
-    try:
-        r = get_drive_session().get(f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media")
-        return r.content if r.status_code == 200 else None
-    except Exception: 
-        return None
-
-def get_secure_photo_uri(url):
-    fb = "https://www.w3schools.com/howto/img_avatar.png"
-    if pd.isna(url) or url == "" or not isinstance(url, str): 
-        return fb
-    match = re.search(r"(?:id=|/d/)([\w-]+)", url)
-    if match:
-        b = fetch_secure_image_bytes(match.group(1))
-        if b: 
-            return f"data:image/jpeg;base64,{base64.b64encode(b).decode()}"
-    return url if url.startswith("http") else fb
-
 @st.cache_data(ttl=300)
 def fetch_student_photos():
     try:
@@ -272,31 +243,15 @@ def sort_display_df(df):
     temp_df = temp_df.sort_values(['Sub_Sort', 'C_Sort', 'S_Sort']).drop(columns=['C_Sort', 'S_Sort', 'Sub_Sort']).reset_index(drop=True)
     return temp_df
 
-@st.cache_data(ttl=300)
 def fetch_teacher_status():
-    sh = init_exam_sheet()
-    ws = ensure_worksheet(sh, "teacher_exam_status", ["Teacher", "Status", "Timestamp"])
-    records = ws.get_all_records()
-    if not records: 
+    df = read_exam_sheet("teacher_exam_status", ["Teacher", "Status", "Timestamp"])
+    if df.empty: 
         return pd.DataFrame(columns=["Teacher", "Status", "Timestamp"])
-    return pd.DataFrame(records).astype(str)
+    return df.astype(str)
 
 def update_teacher_status(teacher_name, status):
-    df = fetch_teacher_status()
     now_str = datetime.now(IST).strftime("%Y-%m-%d %I:%M %p")
-    
-    if not df.empty and 'Teacher' in df.columns and teacher_name in df['Teacher'].values:
-        df.loc[df['Teacher'] == teacher_name, 'Status'] = status
-        df.loc[df['Teacher'] == teacher_name, 'Timestamp'] = now_str
-    else:
-        new_row = pd.DataFrame([{"Teacher": teacher_name, "Status": status, "Timestamp": now_str}])
-        if not df.empty:
-            df = pd.concat([df, new_row], ignore_index=True)
-        else:
-            df = new_row
-            
-    overwrite_sheet(init_exam_sheet(), "teacher_exam_status", df, ["Teacher", "Status", "Timestamp"])
-    fetch_teacher_status.clear()
+    replace_exam_rows("teacher_exam_status", {"Teacher": teacher_name}, [{"Teacher": teacher_name, "Status": status, "Timestamp": now_str}], ["Teacher", "Status", "Timestamp"])
 
 @st.cache_data(ttl=300)
 def init_subject_map():
@@ -410,30 +365,21 @@ def get_auto_teacher(cls_name, sec_name, sub_name):
 # ==========================================
 # 4. EXAM SCHEDULES & MARKS ENGINES
 # ==========================================
-@st.cache_data(ttl=300)
 def fetch_exam_schedules():
-    sh = init_exam_sheet()
-    ws = ensure_worksheet(sh, "schedules", ["Exam_ID", "Date", "Class", "Section", "Subject", "Teacher", "Full_Marks"])
-    records = ws.get_all_records()
-    if not records:
+    df = read_exam_sheet("schedules", ["Exam_ID", "Date", "Class", "Section", "Subject", "Teacher", "Full_Marks"])
+    if df.empty:
         return pd.DataFrame(columns=["Exam_ID", "Date", "Class", "Section", "Subject", "Teacher", "Full_Marks"])
         
-    df = pd.DataFrame(records)
     if 'Full_Marks' not in df.columns:
         df['Full_Marks'] = "50"
     return df.astype(str)
 
-@st.cache_data(ttl=300)
 def fetch_exam_marks():
-    sh = init_exam_sheet()
-    ws = ensure_worksheet(sh, "marks", ["Exam_ID", "Date", "Class", "Section", "Subject", "Roll", "Name", "Actual_Marks", "Extra_Marks", "Total_Marks", "Full_Marks", "Percentage", "Graded_By"])
-    records = ws.get_all_records()
+    df = read_exam_sheet("marks", ["Exam_ID", "Date", "Class", "Section", "Subject", "Roll", "Name", "Actual_Marks", "Extra_Marks", "Total_Marks", "Full_Marks", "Percentage", "Graded_By"])
     
-    if not records:
+    if df.empty:
         return pd.DataFrame(columns=["Exam_ID", "Date", "Class", "Section", "Subject", "Roll", "Name", "Actual_Marks", "Extra_Marks", "Total_Marks", "Full_Marks", "Percentage", "Graded_By"])
         
-    df = pd.DataFrame(records)
-    
     if 'Marks_Obtained' in df.columns and 'Actual_Marks' not in df.columns:
         df['Actual_Marks'] = df['Marks_Obtained']
         df['Extra_Marks'] = 0
@@ -448,6 +394,25 @@ def fetch_exam_marks():
         
     return df.astype(str)
 
+def read_exam_sheet(sheet_name, headers):
+    try: 
+        return sheets_store.read_sheet("BPS EXAM", sheet_name, ttl=300)
+    except WorksheetNotFound:
+        ensure_worksheet(init_exam_sheet(), sheet_name, headers)
+        return pd.DataFrame(columns=headers)
+
+def replace_exam_rows(sheet_name, where, records, headers):
+    try: 
+        sheets_store.get_table("BPS EXAM", sheet_name).handle()
+    except WorksheetNotFound:
+        ensure_worksheet(init_exam_sheet(), sheet_name, headers)
+    sheets_store.replace_rows("BPS EXAM", sheet_name, where, records)
+    clear_exam_inputs()
+
+def delete_exam_rows(sheet_name, where):
+    sheets_store.delete_rows("BPS EXAM", sheet_name, where)
+    clear_exam_inputs()
+
 def overwrite_sheet(sh, sheet_name, df, headers):
     ws = ensure_worksheet(sh, sheet_name, headers)
     ws.clear()
@@ -573,7 +538,6 @@ if st.session_state.user_role == "admin":
             )
             
             if st.button("💾 Confirm & Save All Schedules", type="primary"):
-                schedules = fetch_exam_schedules()
                 new_records = []
                 
                 for _, r in edited_schedule_grid.iterrows():
@@ -588,15 +552,7 @@ if st.session_state.user_role == "admin":
                         "Full_Marks": r['Full_Marks']
                     })
                 
-                new_df = pd.DataFrame(new_records)
-                
-                if not schedules.empty:
-                    schedules_cleaned = schedules[~schedules['Exam_ID'].isin(new_df['Exam_ID'])]
-                    final_schedules = pd.concat([schedules_cleaned, new_df], ignore_index=True)
-                else:
-                    final_schedules = new_df
-                    
-                overwrite_sheet(init_exam_sheet(), "schedules", final_schedules, ["Exam_ID", "Date", "Class", "Section", "Subject", "Teacher", "Full_Marks"])
+                replace_exam_rows("schedules", {"Exam_ID": [r["Exam_ID"] for r in new_records]}, new_records, ["Exam_ID", "Date", "Class", "Section", "Subject", "Teacher", "Full_Marks"])
                 log_action("Create Schedule", "Scheduled " + str(len(new_records)) + " exam(s) for " + str(ex_sub) + " on " + str(ex_date))
                 st.success(f"✅ Successfully scheduled {len(new_records)} exam(s) for {ex_sub} on {ex_date}!")
                 st.rerun()
@@ -629,8 +585,7 @@ if st.session_state.user_role == "admin":
             del_id = st.selectbox("Select Exam to Remove", ["Select..."] + schedules_sorted['Exam_ID'].tolist())
             if del_id != "Select...":
                 if st.button("Delete Schedule", type="primary"):
-                    filtered_df = schedules[schedules['Exam_ID'] != del_id]
-                    overwrite_sheet(init_exam_sheet(), "schedules", filtered_df, ["Exam_ID", "Date", "Class", "Section", "Subject", "Teacher", "Full_Marks"])
+                    delete_exam_rows("schedules", {"Exam_ID": del_id})
                     log_action("Delete Schedule", "Deleted exam schedule ID: " + str(del_id))
                     st.success("Deleted!")
                     st.rerun()
@@ -640,7 +595,6 @@ if st.session_state.user_role == "admin":
     with tabs[3]:
         st.subheader("📈 Mark Entry Progress Dashboard")
         schedules = fetch_exam_schedules()
-        mdm = fetch_mdm_log()
         marks = fetch_exam_marks()
         
         if schedules.empty:
@@ -655,14 +609,7 @@ if st.session_state.user_role == "admin":
                 e_sub = r['Subject']
                 allotted_t = r['Teacher']
                 
-                if not mdm.empty:
-                    if e_class == "CLASS PP":
-                        mdm_present = mdm[(mdm['Date'] == e_date) & (mdm['Class'].isin(["CLASS PP", "CLASS LPP"])) & (mdm['Section'] == e_sec)]
-                    else:
-                        mdm_present = mdm[(mdm['Date'] == e_date) & (mdm['Class'] == e_class) & (mdm['Section'] == e_sec)]
-                    tot_present = len(mdm_present)
-                else:
-                    tot_present = 0
+                tot_present = len(fetch_mdm_present(e_date, e_class, e_sec))
                     
                 entered_count = 0
                 graded_by_str = "---"
@@ -844,14 +791,7 @@ elif st.session_state.user_role == "teacher":
                             else:
                                 st.info("✏️ You have previously entered marks for this exam. You can edit them below.")
                 
-                mdm = fetch_mdm_log()
-                if not mdm.empty:
-                    if e_class == "CLASS PP":
-                        mdm_present = mdm[(mdm['Date'] == e_date) & (mdm['Class'].isin(["CLASS PP", "CLASS LPP"])) & (mdm['Section'] == e_sec)]
-                    else:
-                        mdm_present = mdm[(mdm['Date'] == e_date) & (mdm['Class'] == e_class) & (mdm['Section'] == e_sec)]
-                else:
-                    mdm_present = pd.DataFrame()
+                mdm_present = fetch_mdm_present(e_date, e_class, e_sec)
                     
                 if mdm_present.empty:
                     st.error(f"🚨 **No Students Found!** The MDM attendance log for **{e_class}-{e_sec}** on **{e_date}** is empty. You must complete MDM entry for this day before you can enter marks.")
@@ -899,8 +839,7 @@ elif st.session_state.user_role == "teacher":
                         roster['Thumb_URL'] = ""
                         
                     with st.spinner("Loading profiles..."):
-                        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as exe:
-                            roster['Photo'] = list(exe.map(get_secure_photo_uri, roster['Thumb_URL'].tolist()))
+                        roster['Photo'] = photo_store.get_photo_uris(roster['Thumb_URL'].tolist())
 
                     live_totals = []
                     for idx, r in roster.iterrows():
@@ -1021,7 +960,6 @@ elif st.session_state.user_role == "teacher":
                         st.error("🚨 Cannot save. One or more students have a Total Mark exceeding the Full Mark (" + str(e_fm) + "). Please fix the errors highlighted in red above.")
                     else:
                         if st.button("💾 Save Exam Marks", type="primary"):
-                            all_marks = fetch_exam_marks() 
                             new_records = []
                             
                             for idx, r in roster.iterrows():
@@ -1050,22 +988,7 @@ elif st.session_state.user_role == "teacher":
                                         "Graded_By": st.session_state.user_name
                                     })
                                     
-                            new_marks_df = pd.DataFrame(new_records)
-                            
-                            if not all_marks.empty:
-                                all_marks_purged = all_marks[all_marks['Exam_ID'] != exam_id]
-                                if 'Marks_Obtained' in all_marks_purged.columns:
-                                    all_marks_purged = all_marks_purged.drop(columns=['Marks_Obtained'])
-                                final_marks = pd.concat([all_marks_purged, new_marks_df], ignore_index=True)
-                            else:
-                                final_marks = new_marks_df
-                                
-                            overwrite_sheet(
-                                init_exam_sheet(), 
-                                "marks", 
-                                final_marks, 
-                                ["Exam_ID", "Date", "Class", "Section", "Subject", "Roll", "Name", "Actual_Marks", "Extra_Marks", "Total_Marks", "Full_Marks", "Percentage", "Graded_By"]
-                            )
+                            replace_exam_rows("marks", {"Exam_ID": exam_id}, new_records, ["Exam_ID", "Date", "Class", "Section", "Subject", "Roll", "Name", "Actual_Marks", "Extra_Marks", "Total_Marks", "Full_Marks", "Percentage", "Graded_By"])
                             
                             log_action("Grade Entry", "Saved marks for " + str(len(new_records)) + " students in " + str(e_sub) + " (" + str(e_class) + "-" + str(e_sec) + ")")
                             st.success(f"🎉 Marks saved successfully for {len(new_records)} students! Totals and Percentages have been locked in.")
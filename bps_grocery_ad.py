@@ -1,9 +1,8 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
 import pytz
+import sheets_store
 
 # Set Timezone for Haldia, West Bengal
 IST = pytz.timezone('Asia/Kolkata')
@@ -18,18 +17,16 @@ if 'cart' not in st.session_state: st.session_state.cart = []
 # ==========================================
 # DATABASE CONNECTION & CACHING
 # ==========================================
-@st.cache_resource
-def get_gspread_client():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scope)
-    return gspread.authorize(creds)
+GROCERY_BOOK = "BPS_Grocery_DB"
 
-client = get_gspread_client()
+def grocery_sheet(worksheet_name):
+    # Opened by key on the shared client; the handle is cached, so writes skip the title search.
+    return sheets_store.worksheet_handle(GROCERY_BOOK, worksheet_name)
 
 @st.cache_data(ttl=30, show_spinner=False)
 def load_sheet_data(worksheet_name):
     try:
-        sheet = client.open("BPS_Grocery_DB").worksheet(worksheet_name)
+        sheet = grocery_sheet(worksheet_name)
         records = sheet.get_all_records()
         return pd.DataFrame(records) if records else pd.DataFrame()
     except Exception as e:
@@ -37,14 +34,14 @@ def load_sheet_data(worksheet_name):
         return pd.DataFrame()
 
 def append_to_sheet(worksheet_name, data_dict):
-    sheet = client.open("BPS_Grocery_DB").worksheet(worksheet_name)
+    sheet = grocery_sheet(worksheet_name)
     headers = sheet.row_values(1)
     row_to_insert = [str(data_dict.get(header, "")) for header in headers]
     sheet.append_row(row_to_insert)
     load_sheet_data.clear()
 
 def bulk_update_sheet(worksheet_name, df):
-    sheet = client.open("BPS_Grocery_DB").worksheet(worksheet_name)
+    sheet = grocery_sheet(worksheet_name)
     df = df.astype(str) # Convert everything to string to prevent JSON errors
     data = [df.columns.values.tolist()] + df.values.tolist()
     sheet.clear()
@@ -219,7 +216,7 @@ elif menu_choice == "💳 Payments & Dues":
                     
                     if st.button(f"Mark as Paid ##{row['Order_ID']}", key=row['Order_ID']):
                         with st.spinner("Logging payment..."):
-                            sheet = client.open("BPS_Grocery_DB").worksheet("Orders")
+                            sheet = grocery_sheet("Orders")
                             # +2 because Google Sheets is 1-indexed and has a header row
                             sheet.update_cell(idx + 2, 5, 'Paid') 
                             load_sheet_data.clear()
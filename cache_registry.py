@@ -0,0 +1,77 @@
+import streamlit as st
+import functools
+import threading
+import sheets_store, api_metrics
+
+# ==========================================
+# NAMED CACHE NAMESPACES
+# ==========================================
+# st.cache_data.clear() empties every cached function of every page for
+# every user. Instead, page loaders are registered under the worksheets they
+# read, as (spreadsheet, worksheet) namespaces, and a write invalidates only
+# those: the registered functions are cleared and the matching sheets_store
+# tables are marked for reload. Everything else stays warm.
+
+@st.cache_resource
+def _registry():
+    # (spreadsheet, worksheet) -> {(source file, qualname): cached function}
+    return {}, threading.Lock()
+
+def register(fn, *namespaces):
+    """Files a cached function under namespaces, each a spreadsheet title or a (spreadsheet, worksheet) pair."""
+    entries, lock = _registry()
+    # A page script redefines its functions on every rerun; keep only the latest wrapper per function.
+    # Pages all run as __main__, so the source file tells same-named loaders of different pages apart.
+    code = getattr(getattr(fn, "__wrapped__", fn), "__code__", None)
+    name = (getattr(code, "co_filename", getattr(fn, "__module__", "")), getattr(fn, "__qualname__", repr(fn)))
+    with lock:
+        for ns in namespaces:
+            key = ns if isinstance(ns, tuple) else (ns, None)
+            entries.setdefault(key, {})[name] = fn
+    return fn
+
+def _label(func):
+    # Same naming as api_metrics uses for calls: page functions by name, module functions as module.name.
+    module = func.__globals__.get("__name__", "")
+    return func.__qualname__ if module == "__main__" else f"{module}.{func.__qualname__}"
+
+def cached(*namespaces, **cache_args):
+    """st.cache_data(**cache_args) that also registers the function under namespaces and reports hits and misses to api_metrics."""
+    def wrap(func):
+        label, ran = _label(func), threading.local()
+
+        @functools.wraps(func)
+        def load(*args, **kwargs):
+            ran.flag = True
+            return func(*args, **kwargs)
+        cached_load = st.cache_data(**cache_args)(load)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            outer, ran.flag = getattr(ran, "flag", False), False
+            try: return cached_load(*args, **kwargs)
+            finally:
+                api_metrics.record_cache(label, not ran.flag)
+                ran.flag = outer
+        call.clear = cached_load.clear
+        return register(call, *namespaces)
+    return wrap
+
+def invalidate(spreadsheet, worksheet=None, reload=True):
+    """Clears the loaders registered for one worksheet (or every worksheet of spreadsheet when worksheet is None).
+
+    The shared sheets_store tables are fully reloaded on next read, or with reload=False only tail-synced.
+    """
+    entries, lock = _registry()
+    with lock:
+        fns = {name: fn for (s, w), found in entries.items() if s == spreadsheet and (worksheet is None or w is None or w == worksheet) for name, fn in found.items()}
+    for fn in fns.values():
+        try: fn.clear()
+        except Exception: pass
+    if reload: sheets_store.invalidate(spreadsheet, worksheet)
+    else: sheets_store.mark_stale(spreadsheet, worksheet)
+
+def namespaces():
+    """Registered namespaces and the functions in each, for admin views."""
+    entries, lock = _registry()
+    with lock: return {key: sorted(q for _, q in found) for key, found in entries.items()}
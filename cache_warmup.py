@@ -0,0 +1,135 @@
+import streamlit as st
+import pandas as pd
+import os
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+import sheets_store, mdm_index, journey_state, photo_store
+
+# ==========================================
+# SERVER-SIDE CACHE WARM-UP
+# ==========================================
+# The first teacher after a restart (or after the caches went stale) used to
+# pay for every cold load while everyone else queued behind the same table
+# locks. A background thread instead syncs the shared sheets_store tables,
+# builds the MDM index and the journey state, and queues every student photo
+# for download: once when the server starts and again at each WARMUP_TIMES
+# (IST) on school days, i.e. not on Sundays or dates in holidays.csv.
+# Page-level st.cache_data loaders are thin wrappers over these tables, so
+# their first call after a warm-up costs no Google request.
+#
+# Pages read these tables with ttl=600, so a warm-up only helps if it runs
+# less than ten minutes before the load it is meant for: 11:12 keeps them
+# fresh from the 11:15 MDM submissions until 11:22.
+#
+# The times can be changed without a deploy in secrets.toml:
+#   [warmup]
+#   times = ["07:30", "11:12"]
+#   on_start = true
+
+WARMUP_TIMES = ("11:12",)
+HOLIDAYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "holidays.csv")
+IST = timezone(timedelta(hours=5, minutes=30))
+WARM_SHEETS = {
+    "BPS_Database": ["students_master", "mdm_log", "student_attendance_master", "teacher_leave", "settings", "TEACHERS_DETAIL"],
+    "bps_routine": ["Sheet1", "daily_override"],
+    "BPS EXAM": ["schedules"],
+    "SCH_Exam_Fees": ["Sheet1", "Britti_List", "Investigation_List"],
+    "MY ROUTINE 2026": ["activity_log"],
+}
+
+def _config():
+    try: cfg = dict(st.secrets.get("warmup", {}))
+    except Exception: cfg = {}
+    times = [str(t) for t in cfg.get("times", WARMUP_TIMES)]
+    return [datetime.strptime(t, "%H:%M").time() for t in times], bool(cfg.get("on_start", True))
+
+def holidays():
+    """Dates (dd-mm-YYYY strings) listed in holidays.csv."""
+    try: return set(pd.read_csv(HOLIDAYS_FILE)["Date"].astype(str).str.strip())
+    except Exception: return set()
+
+def is_school_day(day):
+    return day.strftime("%A") != "Sunday" and day.strftime("%d-%m-%Y") not in holidays()
+
+def next_run(now=None):
+    """The next scheduled warm-up (IST datetime) after now, on a school day; None if no times are configured."""
+    now = now or datetime.now(IST)
+    times, _ = _config()
+    if not times: return None
+    for offset in range(370):
+        day = (now + timedelta(days=offset)).date()
+        if not is_school_day(day): continue
+        for t in sorted(times):
+            at = datetime.combine(day, t, tzinfo=IST)
+            if at > now: return at
+    return None
+
+@st.cache_resource(show_spinner=False)
+def _status():
+    return {"running": False, "last_start": None, "last_seconds": None, "last_error": None, "steps": {}, "next": None}, threading.Lock()
+
+def warm_up():
+    """Syncs every WARM_SHEETS table, the MDM index and journey state, and queues all student photos. Returns {step: seconds}."""
+    status, lock = _status()
+    with lock:
+        if status["running"]: return dict(status["steps"])
+        status.update(running=True, last_start=datetime.now(IST), last_error=None, steps={})
+    steps, errors, started = {}, [], time.time()
+
+    def step(name, fn):
+        t = time.time()
+        try: fn()
+        except Exception as e: errors.append(f"{name}: {e}")
+        steps[name] = round(time.time() - t, 2)
+
+    # ttl=0 pulls whatever was appended since the last sync (or loads the sheet the first time).
+    step("sheets", lambda: sheets_store.read_sheets(WARM_SHEETS, ttl=0))
+    def index():
+        sm = sheets_store.read_sheet("BPS_Database", "students_master")
+        for tc, ts in sm[["Class", "Section"]].astype(str).drop_duplicates().itertuples(index=False): mdm_index.day_counts(tc, ts)
+    step("mdm index", index)
+    step("journey state", lambda: journey_state.saved_state(ttl=0))
+    def photos():
+        sm = sheets_store.read_sheet("BPS_Database", "students_master")
+        if "Thumb_URL" in sm.columns: photo_store.prefetch(sm["Thumb_URL"].tolist())
+    step("photos queued", photos)
+
+    with lock:
+        status.update(running=False, last_seconds=round(time.time() - started, 1), steps=steps, last_error="; ".join(errors) or None)
+    return steps
+
+@st.cache_resource(show_spinner=False)
+def _scheduler():
+    status, lock = _status()
+    def run():
+        _, on_start = _config()
+        if on_start: warm_up()
+        while True:
+            at = next_run()
+            with lock: status["next"] = at
+            if at is None: return
+            # Short sleeps, so a clock change or a suspended host delays a run by a minute at most.
+            while datetime.now(IST) < at: time.sleep(min(60, max(1, (at - datetime.now(IST)).total_seconds())))
+            warm_up()
+    thread = threading.Thread(target=run, name="cache-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def start():
+    """Starts the warm-up thread once per server process; safe to call on every rerun."""
+    _scheduler()
+
+def render_status():
+    """Admin view: last and next warm-up, time per step, and a manual trigger."""
+    status, lock = _status()
+    with lock: s = dict(status)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Last warm-up", s["last_start"].strftime("%d-%m %H:%M") if s["last_start"] else "—", f"{s['last_seconds']} s" if s["last_seconds"] is not None else None, delta_color="off")
+    c2.metric("Next warm-up (IST)", s["next"].strftime("%a %d-%m %H:%M") if s["next"] else "—")
+    c3.metric("State", "Running" if s["running"] else "Idle")
+    if s["steps"]: st.caption(" · ".join(f"{k}: {v} s" for k, v in s["steps"].items()))
+    if s["last_error"]: st.warning(f"⚠️ Last warm-up had errors: {s['last_error']}")
+    if st.button("🔥 Warm caches now", use_container_width=True, disabled=s["running"]):
+        threading.Thread(target=warm_up, name="cache-warmup-manual", daemon=True).start()
+        st.toast("Warm-up started in the background.")
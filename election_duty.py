@@ -11,6 +11,9 @@ from datetime import datetime, date, timedelta
 import os
 import tempfile
 from fpdf import FPDF  # New import for PDF generation
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import numericise_all
+import cache_registry, write_queue
 
 # --- Helper Function for Indian Standard Time (IST) ---
 def get_ist_now():
@@ -28,11 +31,24 @@ st.set_page_config(page_title="Election Duty 2026 - Party 116", page_icon="🗳
 SHEET_URL = "https://docs.google.com/spreadsheets/d/YOUR_ACTUAL_SHEET_ID_HERE/edit"
 
 # --- Google Sheets Authentication & Caching (OPTIMIZED) ---
+ELECTION_BOOK = "Election_Duty_Log"
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive"
 ]
 
+# key -> (tab title, header row for a new tab or None if it must exist, rows, cols)
+ELECTION_TABS = {
+    'log': ("Election_Duty_Log", None, 0, 0),
+    'team': ("Team_Data", None, 0, 0),
+    'calls': ("Call_Logs", None, 0, 0),
+    'booth': ("Booth_Data", ["AC_Name", "PS_No", "PS_Name", "Total", "Male", "Female", "TG", "EDC", "ASD", "Proxy", "PB"], 10, 15),
+    '17c': ("Form_17C", ["Total_Assigned", "Form_17A", "Rule_49O", "Rule_49M", "Test_Votes", "EVM_Total", "Tendered"], 10, 10),
+    'turnout': ("Turnout_Data", ["Time_Block", "Timestamp", "Male", "Female", "TG", "Total_Cast", "EDC", "ASD", "Proxy", "PB"], 100, 10),
+    'memory': ("Memory_Log", ["Timestamp", "Test Type", "Your Answer", "Result"], 100, 4),
+}
+FETCHED_TABS = ['log', 'team', 'booth', '17c', 'turnout', 'memory']
+
 @st.cache_resource
 def get_google_sheets():
     creds = Credentials.from_service_account_info(
@@ -40,32 +56,17 @@ def get_google_sheets():
         scopes=SCOPES
     )
     client = gspread.authorize(creds)
-    spreadsheet = client.open("Election_Duty_Log")
+    spreadsheet = client.open(ELECTION_BOOK)
     
+    # One fetch_sheet_metadata call resolves every tab; only missing tabs cost extra requests.
+    existing = {ws.title: ws for ws in spreadsheet.worksheets()}
     sheets = {}
-    sheets['log'] = spreadsheet.worksheet("Election_Duty_Log")
-    sheets['team'] = spreadsheet.worksheet("Team_Data")
-    sheets['calls'] = spreadsheet.worksheet("Call_Logs")
-    
-    try: sheets['booth'] = spreadsheet.worksheet("Booth_Data")
-    except: 
-        sheets['booth'] = spreadsheet.add_worksheet(title="Booth_Data", rows="10", cols="15")
-        sheets['booth'].append_row(["AC_Name", "PS_No", "PS_Name", "Total", "Male", "Female", "TG", "EDC", "ASD", "Proxy", "PB"])
-        
-    try: sheets['17c'] = spreadsheet.worksheet("Form_17C")
-    except: 
-        sheets['17c'] = spreadsheet.add_worksheet(title="Form_17C", rows="10", cols="10")
-        sheets['17c'].append_row(["Total_Assigned", "Form_17A", "Rule_49O", "Rule_49M", "Test_Votes", "EVM_Total", "Tendered"])
-        
-    try: sheets['turnout'] = spreadsheet.worksheet("Turnout_Data")
-    except: 
-        sheets['turnout'] = spreadsheet.add_worksheet(title="Turnout_Data", rows="100", cols="10")
-        sheets['turnout'].append_row(["Time_Block", "Timestamp", "Male", "Female", "TG", "Total_Cast", "EDC", "ASD", "Proxy", "PB"])
-        
-    try: sheets['memory'] = spreadsheet.worksheet("Memory_Log")
-    except: 
-        sheets['memory'] = spreadsheet.add_worksheet(title="Memory_Log", rows="100", cols="4")
-        sheets['memory'].append_row(["Timestamp", "Test Type", "Your Answer", "Result"])
+    for key, (title, headers, rows, cols) in ELECTION_TABS.items():
+        if title in existing: sheets[key] = existing[title]
+        elif headers is None: raise WorksheetNotFound(title)
+        else:
+            sheets[key] = spreadsheet.add_worksheet(title=title, rows=str(rows), cols=str(cols))
+            sheets[key].append_row(headers)
         
     return sheets
 
@@ -83,41 +84,41 @@ except Exception as e:
     st.stop()
 
 # --- Data Fetching Logic ---
-@st.cache_data(ttl=300) 
-def fetch_logs():
-    try: return sheet_log.get_all_records()
-    except: return []
+def _records(values):
+    # Same shape as get_all_records(): header row as keys, numbers numericised, short rows padded.
+    if not values: return []
+    header = values[0]
+    return [dict(zip(header, numericise_all(row + [""] * (len(header) - len(row))))) for row in values[1:]]
+
+@cache_registry.cached(ELECTION_BOOK, ttl=300)
+def fetch_all_tabs():
+    """Every tab the page shows, fetched together in one values:batchGet."""
+    try:
+        ranges = ["'" + sheets[k].title.replace("'", "''") + "'" for k in FETCHED_TABS]
+        resp = sheet_log.spreadsheet.values_batch_get(ranges)
+        return {k: vr.get("values", []) for k, vr in zip(FETCHED_TABS, resp.get("valueRanges", []))}
+    except: return {}
 
-@st.cache_data(ttl=300)
-def fetch_team():
-    try: return sheet_team.get_all_records()
-    except: return []
+def _tab_records(key):
+    # Rows still in the offline write queue are shown as if they had already reached the sheet.
+    values = fetch_all_tabs().get(key, [])
+    return write_queue.pending_records(_records(values), values[0] if values else [], ELECTION_BOOK, ELECTION_TABS[key][0])
+
+def fetch_logs(): return _tab_records('log')
+
+def fetch_team(): return _tab_records('team')
 
-@st.cache_data(ttl=300)
 def fetch_booth_data():
-    try: 
-        records = sheet_booth.get_all_records()
-        if records: return records[0]
-        return {}
-    except: return {}
+    records = _records(fetch_all_tabs().get('booth', []))
+    return records[0] if records else {}
 
-@st.cache_data(ttl=300)
 def fetch_17c_data():
-    try: 
-        records = sheet_17c.get_all_records()
-        if records: return records[0]
-        return {}
-    except: return {}
+    records = _records(fetch_all_tabs().get('17c', []))
+    return records[0] if records else {}
 
-@st.cache_data(ttl=300)
-def fetch_turnout_records():
-    try: return sheet_turnout.get_all_records()
-    except: return []
+def fetch_turnout_records(): return _tab_records('turnout')
 
-@st.cache_data(ttl=300)
-def fetch_memory_logs():
-    try: return sheet_memory.get_all_records()
-    except: return []
+def fetch_memory_logs(): return _tab_records('memory')
 
 records = fetch_logs()
 team_records = fetch_team()
@@ -157,6 +158,7 @@ with header_col2:
         st.caption("⚠️ **Please enter your Booth Data in the Dashboard tab below.**")
 
 st.divider()
+write_queue.render_pending(ELECTION_BOOK)
 
 # --- App Layout: Tabs ---
 tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10, tab11, tab12 = st.tabs([
@@ -234,7 +236,7 @@ with tab1:
                         sheet_booth.append_row([ac, ps_no, ps_name, total, male, female, tg, edc, asd, proxy, pb])
                         st.session_state.edit_booth = False
                         st.success("Booth Data Saved Successfully!")
-                        fetch_booth_data.clear() 
+                        fetch_all_tabs.clear() 
                         st.rerun()
                     except Exception as e: st.error(f"Error saving data: {e}")
 
@@ -261,12 +263,13 @@ with tab2:
                 duration_formatted = f"{total_minutes // 60:02d}h {total_minutes % 60:02d}m"
                 with st.spinner("Updating Google Sheet..."):
                     try:
+                        write_queue.drain(ELECTION_BOOK, "Election_Duty_Log")
                         sheet_log.update_cell(selected_session['sheet_row'], 2, start_time.strftime("%I:%M %p"))
                         sheet_log.update_cell(selected_session['sheet_row'], 3, end_time.strftime("%I:%M %p"))
                         sheet_log.update_cell(selected_session['sheet_row'], 5, duration_formatted)
                         sheet_log.update_cell(selected_session['sheet_row'], 6, updated_notes)
                         st.success("Logged successfully!")
-                        fetch_logs.clear() 
+                        fetch_all_tabs.clear() 
                         st.rerun() 
                     except Exception as e: st.error(f"Error: {e}")
 
@@ -287,9 +290,9 @@ with tab2:
             duration_formatted = f"{total_minutes // 60:02d}h {total_minutes % 60:02d}m"
             with st.spinner("Saving..."):
                 try:
-                    sheet_log.append_row([log_date.strftime("%d-%m-%Y"), start_time.strftime("%I:%M %p"), end_time.strftime("%I:%M %p"), final_activity, duration_formatted, notes])
+                    write_queue.append_row(ELECTION_BOOK, "Election_Duty_Log", [log_date.strftime("%d-%m-%Y"), start_time.strftime("%I:%M %p"), end_time.strftime("%I:%M %p"), final_activity, duration_formatted, notes])
                     st.success("✅ Logged successfully!")
-                    fetch_logs.clear() 
+                    fetch_all_tabs.clear() 
                 except Exception as e: st.error(f"Error: {e}")
 
 with tab3:
@@ -302,9 +305,9 @@ with tab3:
         final_sched_activity = sched_custom_activity.strip() if sched_custom_activity else sched_activity_selection
         with st.spinner("Scheduling..."):
             try:
-                sheet_log.append_row([future_date.strftime("%d-%m-%Y"), "Pending", "Pending", final_sched_activity, "Pending", sched_notes])
+                write_queue.append_row(ELECTION_BOOK, "Election_Duty_Log", [future_date.strftime("%d-%m-%Y"), "Pending", "Pending", final_sched_activity, "Pending", sched_notes])
                 st.success("✅ Scheduled!")
-                fetch_logs.clear() 
+                fetch_all_tabs.clear() 
             except Exception as e: st.error(f"Error: {e}")
 
 with tab4:
@@ -325,12 +328,15 @@ with tab4:
                     call_notes = st.text_input("Call Notes", key=f"note_{idx}")
                     if st.button("Save Call Record", key=f"btn_{idx}"):
                         ist_time = get_ist_now()
-                        sheet_calls.append_row([ist_time.strftime("%d-%m-%Y"), ist_time.strftime("%I:%M %p"), officer.get('Name'), call_dir, call_notes])
+                        write_queue.append_row(ELECTION_BOOK, "Call_Logs", [ist_time.strftime("%d-%m-%Y"), ist_time.strftime("%I:%M %p"), officer.get('Name'), call_dir, call_notes])
                         st.success("✅ Call logged!")
                 if st.button("Toggle Status", key=f"tog_{idx}"):
-                    sheet_team.update_cell(row_num, 6, "Inactive" if status == "Active" else "Active")
-                    fetch_team.clear() 
-                    st.rerun()
+                    try:
+                        write_queue.drain(ELECTION_BOOK, "Team_Data")
+                        sheet_team.update_cell(row_num, 6, "Inactive" if status == "Active" else "Active")
+                        fetch_all_tabs.clear() 
+                        st.rerun()
+                    except Exception as e: st.error(f"⚠️ Could not update status: {e}")
     st.divider()
     with st.expander("➕ Add New Team Member"):
         with st.form("add_officer_form"):
@@ -341,15 +347,15 @@ with tab4:
             t_mobile = st.text_input("Mobile Number")
             if st.form_submit_button("Save Officer Data"):
                 if t_name and t_mobile:
-                    sheet_team.append_row([t_name, t_desig, t_rank, t_address, t_mobile, "Active"])
+                    write_queue.append_row(ELECTION_BOOK, "Team_Data", [t_name, t_desig, t_rank, t_address, t_mobile, "Active"])
                     st.success("Added!")
-                    fetch_team.clear() 
+                    fetch_all_tabs.clear() 
                     st.rerun()
 
 with tab5:
     st.subheader("Your Study History")
     if st.button("🔄 Refresh Data"): 
-        st.cache_data.clear()
+        cache_registry.invalidate(ELECTION_BOOK)
         st.rerun()
     df = pd.DataFrame(records)
     if not df.empty:
@@ -408,9 +414,9 @@ with tab7:
                     try:
                         total_cast = t_male + t_female + t_tg
                         exact_timestamp = get_ist_now().strftime("%I:%M %p")
-                        sheet_turnout.append_row([time_block, exact_timestamp, t_male, t_female, t_tg, total_cast, t_edc, t_asd, t_proxy, t_pb])
+                        write_queue.append_row(ELECTION_BOOK, "Turnout_Data", [time_block, exact_timestamp, t_male, t_female, t_tg, total_cast, t_edc, t_asd, t_proxy, t_pb])
                         st.success(f"Turnout for {time_block} Recorded Successfully!")
-                        fetch_turnout_records.clear() 
+                        fetch_all_tabs.clear() 
                         st.rerun()
                     except Exception as e: st.error(f"Error saving: {e}")
         
@@ -418,7 +424,7 @@ with tab7:
         col_r1, col_r2, col_r3 = st.columns([1, 2, 1])
         with col_r2:
             if st.button("🔄 Refresh & Sync Data", use_container_width=True):
-                fetch_turnout_records.clear()
+                fetch_all_tabs.clear()
                 st.rerun()
         st.write("") 
                     
@@ -460,10 +466,11 @@ with tab7:
             
             if st.button("🗑️ Delete Last Entry (From Sheet)"):
                 try:
+                    write_queue.drain(ELECTION_BOOK, "Turnout_Data")
                     last_row_index = len(turnout_records) + 1 
                     sheet_turnout.delete_rows(last_row_index)
                     st.success("Last entry deleted.")
-                    fetch_turnout_records.clear() 
+                    fetch_all_tabs.clear() 
                     st.rerun()
                 except Exception as e: st.error("Failed to delete.")
 
@@ -556,7 +563,7 @@ with tab8:
                         sheet_17c.append_row([total_assigned, form_17a_total, rule_49o, rule_49m, test_votes, actual_evm_total, tendered_issued])
                         st.session_state.edit_17c = False
                         st.success("Form 17C Data Saved Successfully!")
-                        fetch_17c_data.clear() 
+                        fetch_all_tabs.clear() 
                         st.rerun()
                     except Exception as e: st.error(f"Error saving data: {e}")
 
@@ -602,8 +609,8 @@ with tab11:
                 st.error(f"Incorrect. The correct answer was **{correct_answer}**. Try again!")
             with st.spinner("Logging test result..."):
                 try:
-                    sheet_memory.append_row([get_ist_now().strftime("%d-%m-%Y %I:%M %p"), test_type, user_guess.strip(), "Passed" if user_guess.strip().lower() == correct_answer.strip().lower() else "Failed"])
-                    fetch_memory_logs.clear() 
+                    write_queue.append_row(ELECTION_BOOK, "Memory_Log", [get_ist_now().strftime("%d-%m-%Y %I:%M %p"), test_type, user_guess.strip(), "Passed" if user_guess.strip().lower() == correct_answer.strip().lower() else "Failed"])
+                    fetch_all_tabs.clear() 
                 except Exception as e: pass
         st.divider()
         try:
@@ -617,7 +624,7 @@ with tab12:
     st.markdown("A consolidated overview of all your recorded data.")
     
     if st.button("🔄 Refresh All Data", use_container_width=True):
-        st.cache_data.clear()
+        cache_registry.invalidate(ELECTION_BOOK)
         st.rerun()
         
     st.divider()
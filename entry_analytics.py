@@ -0,0 +1,81 @@
+import pandas as pd
+import numpy as np
+
+# ==========================================
+# DATA-ENTRY SPEED ANALYTICS
+# ==========================================
+# Turns a sheet of saved records with an "Updated_At" stamp into entry
+# sessions (a new session starts after SESSION_GAP_SECONDS of inactivity)
+# and per-teacher throughput. Everything is column-wise pandas, so the cost
+# grows with the number of sessions, not with Python work per record.
+
+TIMESTAMP_FORMATS = ("%d-%m-%Y %I:%M %p", "%d-%m-%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S")
+SESSION_GAP_SECONDS = 300.0
+MIN_SECONDS_PER_ENTRY = 30.0
+
+def parse_timestamps(values, formats=TIMESTAMP_FORMATS):
+    """Datetimes for a Series of strings, trying each format in turn on what is still unparsed; NaT if none fits."""
+    text = pd.Series(values).astype(str).str.strip()
+    out = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    for fmt in formats:
+        todo = out.isna()
+        if not todo.any(): break
+        out[todo] = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+    return out
+
+def entry_events(df, class_col="Previous_Class_2025_26", section_col="Previous_Section_2025_26", user_col="Updated_By"):
+    """Timestamp, Class, Section and Updated_By of every record whose Updated_At parses, in time order."""
+    if df.empty or "Updated_At" not in df.columns: return pd.DataFrame()
+    def col(name, default): return df[name].astype(str) if name in df.columns else pd.Series(default, index=df.index)
+    events = pd.DataFrame({
+        "Timestamp": parse_timestamps(df["Updated_At"]),
+        "Class": col(class_col, ""),
+        "Section": col(section_col, "A"),
+        "Updated_By": col(user_col, "Teacher"),
+    }).dropna(subset=["Timestamp"])
+    return events.sort_values("Timestamp", kind="stable").reset_index(drop=True)
+
+def entry_sessions(df, by=None, gap_seconds=SESSION_GAP_SECONDS):
+    """One row per entry session; with by="Updated_By" each teacher's entries are clustered separately."""
+    events = entry_events(df)
+    if events.empty: return pd.DataFrame()
+    if by: events = events.sort_values([by, "Timestamp"], kind="stable").reset_index(drop=True)
+
+    gap = (events.groupby(by)["Timestamp"].diff() if by else events["Timestamp"].diff()).dt.total_seconds()
+    events["Session"] = (gap.isna() | (gap > gap_seconds)).cumsum()
+
+    sessions = events.groupby("Session").agg(
+        Start_TS=("Timestamp", "first"), End_TS=("Timestamp", "last"),
+        Students_Entered=("Timestamp", "size"), Operator=("Updated_By", "first"))
+
+    # Most frequent non-empty class per session (first seen wins a tie).
+    named = events[events["Class"] != ""]
+    counts = named.groupby(["Session", "Class"], sort=False).size().reset_index(name="n")
+    top = counts.sort_values("n", ascending=False, kind="stable").drop_duplicates("Session").set_index("Session")["Class"]
+    sessions["Class_Group"] = top.reindex(sessions.index).fillna("General")
+
+    if by: sessions = sessions.sort_values("Start_TS", kind="stable")
+    sessions = sessions.reset_index(drop=True)
+
+    cnt = sessions["Students_Entered"]
+    duration_sec = np.maximum((sessions["End_TS"] - sessions["Start_TS"]).dt.total_seconds(), MIN_SECONDS_PER_ENTRY * cnt)
+    sessions["Session_ID"] = [f"Session #{i:02d}" for i in range(1, len(sessions) + 1)]
+    sessions["Date"] = sessions["Start_TS"].dt.strftime("%d-%m-%Y")
+    sessions["Start_Time"] = sessions["Start_TS"].dt.strftime("%I:%M %p")
+    sessions["End_Time"] = sessions["End_TS"].dt.strftime("%I:%M %p")
+    sessions["Duration_Minutes"] = (duration_sec / 60.0).round(2)
+    sessions["Avg_Seconds_Per_Student"] = (duration_sec / cnt).round(1)
+    sessions["Entries_Per_Hour"] = (cnt / duration_sec * 3600.0).round(1)
+    return sessions[["Session_ID", "Date", "Class_Group", "Start_Time", "End_Time", "Start_TS", "End_TS", "Students_Entered",
+                     "Duration_Minutes", "Avg_Seconds_Per_Student", "Entries_Per_Hour", "Operator"]]
+
+def teacher_throughput(df, gap_seconds=SESSION_GAP_SECONDS):
+    """Per teacher: sessions, records entered, active minutes and records per minute, fastest first."""
+    sessions = entry_sessions(df, by="Updated_By", gap_seconds=gap_seconds)
+    if sessions.empty: return pd.DataFrame()
+    out = sessions.groupby("Operator").agg(
+        Sessions=("Session_ID", "size"), Records=("Students_Entered", "sum"),
+        Active_Minutes=("Duration_Minutes", "sum"), Last_Entry=("End_TS", "max"))
+    out["Records_Per_Minute"] = (out["Records"] / out["Active_Minutes"]).round(2)
+    out["Active_Minutes"] = out["Active_Minutes"].round(1)
+    return out.sort_values("Records_Per_Minute", ascending=False).reset_index().rename(columns={"Operator": "Teacher"})
@@ -5,6 +5,7 @@ import os
 import gspread
 from google.oauth2.service_account import Credentials
 from fpdf import FPDF
+import sheets_store
 
 # --- 1. CONFIGURATION & STYLING (MUST BE FIRST) ---
 st.set_page_config(page_title="BPS Form Manager", page_icon="📝", layout="wide")
@@ -49,37 +50,28 @@ def init_gsheets():
 
 sh = init_gsheets()
 
-@st.cache_data(ttl=5)
 def fetch_sheet_data(sheet_name):
     try:
-        ws = sh.worksheet(sheet_name)
-        df = pd.DataFrame(ws.get_all_records())
-        return df
+        return sheets_store.read_sheet("BPS_Database", sheet_name, ttl=5)
     except:
         return pd.DataFrame()
 
-def clear_cache():
-    fetch_sheet_data.clear()
-
 def overwrite_sheet_df(sheet_name, df):
-    try: ws = sh.worksheet(sheet_name)
+    try: ws = sheets_store.get_table("BPS_Database", sheet_name).handle()
     except: ws = sh.add_worksheet(title=sheet_name, rows=1000, cols=20)
-    ws.clear()
     df = df.fillna("").astype(str)
+    sheets_store.overwrite("BPS_Database", sheet_name, [df.columns.values.tolist()] + df.values.tolist() if not df.empty else [])
     if not df.empty:
-        ws.update(values=[df.columns.values.tolist()] + df.values.tolist(), range_name='A1')
         ws.freeze(rows=1) 
-    clear_cache()
 
 def append_sheet_df(sheet_name, df):
     if df.empty: return
-    try: ws = sh.worksheet(sheet_name)
+    try: sheets_store.get_table("BPS_Database", sheet_name).handle()
     except:
         ws = sh.add_worksheet(title=sheet_name, rows=1000, cols=20)
         ws.append_row(list(df.columns))
     df = df.fillna("").astype(str)
-    ws.append_rows(df.values.tolist())
-    clear_cache()
+    sheets_store.append_rows("BPS_Database", sheet_name, df.values.tolist())
 
 # --- 4. PDF GENERATOR CLASS ---
 class BPS_Survey(FPDF):
@@ -11,6 +11,7 @@ import pandas as pd
 from datetime import datetime, timedelta
 import pytz
 import time
+import write_queue
 
 # --- Master Google Sheets Formula for Duration ---
 GS_FORMULA = '=IF(INDIRECT("C"&ROW())="RUNNING", "RUNNING", IFERROR(TEXT(MOD(INDIRECT("C"&ROW())-INDIRECT("B"&ROW()), 1), "h:mm"), ""))'
@@ -87,19 +88,27 @@ def get_health_spreadsheet():
     return client.open("Health_log")
 
 def smart_append_row(sheet, row_data):
-    """Safely appends a row by finding the true end of Column A, avoiding formatting bugs."""
-    col_a = sheet.col_values(1)
-    next_row = len(col_a) + 1
+    """Queues a row for the true end of Column A (avoiding formatting bugs); the write queue sends it paced."""
+    write_queue.append_row(sheet.spreadsheet.title, sheet.title, row_data, user_entered=True, below_column_a=True)
+
+def with_queued(data, spreadsheet, worksheet):
+    """get_all_values() result with the rows still waiting in the write queue in the sheet rows they will take."""
+    return write_queue.below_column_a(data, spreadsheet, worksheet)
+
+def drain_log():
+    """Sends queued activity_log rows before a row is edited in place; False if Google can't be reached."""
     try:
-        sheet.update(range_name=f"A{next_row}", values=[row_data], value_input_option="USER_ENTERED")
-    except TypeError:
-        sheet.update(f"A{next_row}", [row_data], value_input_option="USER_ENTERED")
+        write_queue.drain("MY ROUTINE 2026", "activity_log")
+        return True
+    except Exception:
+        st.error("⚠️ Queued entries could not be synced yet. Try again in a moment.")
+        return False
 
 @st.cache_data(ttl=300)
 def get_activity_log():
     ss = get_main_spreadsheet()
     sheet = ss.worksheet("activity_log")
-    data = sheet.get_all_values()
+    data = with_queued(sheet.get_all_values(), "MY ROUTINE 2026", "activity_log")
     if len(data) <= 1:
         return pd.DataFrame(columns=["Date", "Start_Time", "End_Time", "Duration", "Activity", "Sub_Activities", "check_list", "Notes"])
     df = pd.DataFrame(data[1:], columns=data[0])
@@ -136,7 +145,7 @@ def get_health_category_data(category_name):
     try:
         ss = get_health_spreadsheet()
         sheet = ss.worksheet(category_name)
-        data = sheet.get_all_values()
+        data = with_queued(sheet.get_all_values(), "Health_log", category_name)
         if len(data) <= 1:
             return pd.DataFrame()
         df = pd.DataFrame(data[1:], columns=data[0])
@@ -318,7 +327,7 @@ try:
                         has_missing = any(v == "-- Select --" for v in param_values.values())
                         if has_missing:
                             st.error("⚠️ Please select valid options for all dropdowns!")
-                        else:
+                        elif drain_log():
                             end_time_log = now.time()
                             main_ss = get_main_spreadsheet()
                             log_sheet = main_ss.worksheet("activity_log")
@@ -347,7 +356,7 @@ try:
                                 st.error(f"Failed to log details: {e}")
 
                 with col_cancel:
-                    if st.button("❌ CANCEL", key=f"cancel_{sheet_row}", use_container_width=True):
+                    if st.button("❌ CANCEL", key=f"cancel_{sheet_row}", use_container_width=True) and drain_log():
                         main_ss = get_main_spreadsheet()
                         log_sheet = main_ss.worksheet("activity_log")
                         log_sheet.delete_rows(sheet_row)
@@ -562,7 +571,7 @@ try:
                                     
                                     try:
                                         new_sheet = health_ss.add_worksheet(title=new_cat_name.strip(), rows="1000", cols=str(max(len(headers), 5)))
-                                        smart_append_row(new_sheet, headers)
+                                        new_sheet.append_row(headers, value_input_option="USER_ENTERED")
                                         get_health_categories.clear()
                                         get_health_category_headers.clear()
                                         st.success(f"Created!")
@@ -672,7 +681,7 @@ try:
                                 
                                 try:
                                     new_sheet = health_ss.add_worksheet(title=new_cat_name.strip(), rows="1000", cols=str(max(len(headers), 5)))
-                                    smart_append_row(new_sheet, headers)
+                                    new_sheet.append_row(headers, value_input_option="USER_ENTERED")
                                     get_health_categories.clear()
                                     get_health_category_headers.clear()
                                     st.success(f"Success!")
@@ -5,18 +5,17 @@ if st.button("⬅️ Back to BPS Home", type="secondary"):
 st.write("---") 
 # -------------------
 import pandas as pd
-import qrcode
 import os
 import math
 from fpdf import FPDF
-import tempfile
+import io
 from datetime import datetime
 
 # --- IMPORTS FOR GOOGLE SHEETS & DRIVE API ---
 import gspread
 from google.oauth2.service_account import Credentials
 from gspread.exceptions import WorksheetNotFound
-from google.auth.transport.requests import AuthorizedSession
+import sheets_store, photo_store, pdf_engine
 
 # --- IMPORT THE SCANNER ---
 try:
@@ -56,30 +55,15 @@ def init_gsheets():
 sh = init_gsheets()
 
 # --- 3. HELPER FUNCTIONS ---
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_secure_image_bytes(file_id):
-    try:
-        creds = get_google_credentials()
-        authed_session = AuthorizedSession(creds)
-        url = f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media"
-        response = authed_session.get(url)
-        return response.content if response.status_code == 200 else None
-    except:
-        return None
-
 def extract_drive_id(url):
     if pd.isna(url) or not isinstance(url, str) or "drive.google.com" not in url: return None
     if "/d/" in url:
         return url.split("/d/")[1].split("/")[0]
     return None
 
-@st.cache_data(ttl=60) 
 def fetch_sheet_data(sheet_name):
     try:
-        ws = sh.worksheet(sheet_name)
-        df = pd.DataFrame(ws.get_all_records())
-        df.replace({'TRUE': True, 'FALSE': False, 'True': True, 'False': False}, inplace=True)
-        return df
+        return sheets_store.read_sheet("BPS_Database", sheet_name, ttl=60)
     except:
         return pd.DataFrame()
 
@@ -118,28 +102,27 @@ def fetch_class_photo_status():
     return list(taken_keys)
 
 def clear_sheet_cache():
-    fetch_sheet_data.clear()
+    sheets_store.invalidate("BPS_Database")
     fetch_class_photo_status.clear()
 
 def append_sheet_df(sheet_name, df):
     if df.empty: return
     try: 
-        ws = sh.worksheet(sheet_name)
+        sheets_store.get_table("BPS_Database", sheet_name).handle()
     except WorksheetNotFound:
         ws = sh.add_worksheet(title=sheet_name, rows=1000, cols=20)
         ws.append_row(list(df.columns))
     
     df = df.fillna("").astype(str)
     try:
-        ws.append_rows(df.values.tolist())
-        clear_sheet_cache()
+        sheets_store.append_rows("BPS_Database", sheet_name, df.values.tolist())
     except Exception as e:
         st.error(f"⚠️ Cloud sync error: {e}")
 
 def batch_log_action(sheet_name, df, action):
     if df.empty: return
     try:
-        log_ws = sh.worksheet(sheet_name)
+        sheets_store.get_table("BPS_Database", sheet_name).handle()
     except WorksheetNotFound:
         log_ws = sh.add_worksheet(title=sheet_name, rows=1000, cols=5)
         log_ws.append_row(["Date", "Class", "Roll", "Name", "Action"])
@@ -151,8 +134,7 @@ def batch_log_action(sheet_name, df, action):
         rows.append([now_str, str(r.get('Class', '')), str(r.get('Roll', '')), name_val, action])
     
     if rows:
-        log_ws.append_rows(rows)
-        clear_sheet_cache()
+        sheets_store.append_rows("BPS_Database", sheet_name, rows)
 
 def reset_generated_status():
     """Removes all 'Generated' logs from the id_card_log Google Sheet"""
@@ -190,41 +172,57 @@ def parse_qr_data(qr_string):
 
 # --- 4. PDF GENERATORS ---
 
+CARD_W, CARD_H, CARD_GAP = 86, 54, 8
+PHOTO_W, PHOTO_H = 18, 22
+
+def card_template():
+    """Background, header band and logo flattened once into a single card image."""
+    bg_img = next((f for f in ['background.jpg', 'background.jpeg', 'background.png'] if os.path.exists(f)), None)
+    return pdf_engine.compose_template((CARD_W, CARD_H), (
+        (bg_img, (0, 0, CARD_W, CARD_H)),
+        ((0, 51, 153), (0, 0, CARD_W, 11)),
+        ('logo.png', (68.5, 1, 16, 16)),
+    ))
+
+def card_overlay(path):
+    """path if it exists. The footer and signature are painted over the QR code and watermark, so they stay out of the template; fpdf embeds each file once per PDF."""
+    return path if os.path.exists(path) else None
+
+def card_qr_payload(student):
+    return f"Name:{student.get('Name', '')}|Roll:{student.get('Roll', '')}|Mob:{student.get('Mobile', '')}"
+
 def generate_pdf(students_list, photo_dict, progress_bar=None):
     """Generates the Landscape Student ID Cards"""
+    total_cards = len(students_list)
+    def report(done, total):
+        if progress_bar: progress_bar.progress(0.5 + (done / max(total, 1)) * 0.3, text=f"Preparing images {done} of {total}...")
+
+    photo_px = (pdf_engine.mm_to_px(PHOTO_W), pdf_engine.mm_to_px(PHOTO_H))
+    qrs, photos = pdf_engine.prepare_images(
+        [card_qr_payload(s) for s in students_list],
+        {sid: (raw, photo_px) for sid, raw in photo_dict.items() if raw},
+        progress=report
+    )
+    template = card_template()
+    footer_img, signature_img = card_overlay('image_2.png'), card_overlay('signature.png')
+
     pdf = FPDF(orientation='P', unit='mm', format='A4')
     pdf.set_auto_page_break(auto=True, margin=10)
     pdf.add_page()
     
-    x_start, y_start, card_w, card_h, gap = 10, 10, 86, 54, 8
+    x_start, y_start = 10, 10
     col, row = 0, 0
-    total_cards = len(students_list)
-    
-    bg_img = None
-    for ext in ['background.jpg', 'background.jpeg', 'background.png']:
-        if os.path.exists(ext):
-            bg_img = ext
-            break
             
     for idx, student in enumerate(students_list):
-        if progress_bar:
-            progress_bar.progress(0.5 + (idx / total_cards) * 0.5, text=f"Drawing Card {idx + 1} of {total_cards}...")
+        if progress_bar and (idx % 10 == 0 or idx == total_cards - 1):
+            progress_bar.progress(0.8 + (idx / total_cards) * 0.2, text=f"Drawing Card {idx + 1} of {total_cards}...")
 
-        x = x_start + (col * (card_w + gap))
-        y = y_start + (row * (card_h + gap))
-        
-        # Background
-        if bg_img:
-            try: pdf.image(bg_img, x=x, y=y, w=card_w, h=card_h)
-            except: pass 
-
-        # Border & Blue Header
-        pdf.set_draw_color(0, 0, 0); pdf.set_line_width(0.3); pdf.rect(x, y, card_w, card_h)
-        pdf.set_fill_color(0, 51, 153); pdf.rect(x, y, card_w, 11, 'F')
+        x = x_start + (col * (CARD_W + CARD_GAP))
+        y = y_start + (row * (CARD_H + CARD_GAP))
         
-        # Logo
-        if os.path.exists('logo.png'): 
-            pdf.image('logo.png', x=x+68.5, y=y+1, w=16, h=16)
+        # Template (background, header band, logo) & Border
+        pdf.image(io.BytesIO(template), x=x, y=y, w=CARD_W, h=CARD_H)
+        pdf.set_draw_color(0, 0, 0); pdf.set_line_width(0.3); pdf.rect(x, y, CARD_W, CARD_H)
             
         pdf.set_font("Arial", 'B', 8.5); pdf.set_text_color(255, 255, 255)
         pdf.set_xy(x+2, y+1.5); pdf.cell(66, 5, "BHAGYABANTAPUR PRIMARY SCHOOL", 0, 1, 'C')
@@ -232,20 +230,16 @@ def generate_pdf(students_list, photo_dict, progress_bar=None):
         pdf.set_xy(x+2, y+6.5); pdf.cell(66, 3, "Mob: 7908390822  |  ID CARD - SESSION 2026", 0, 1, 'C')
         
         # Photo
-        photo_x, photo_y, photo_w, photo_h = x+3, y+14, 18, 22
+        photo_x, photo_y = x+3, y+14
         student_id = str(student.get('Sl', 0)) + "_" + str(student.get('Roll', '0'))
         
-        if student_id in photo_dict and photo_dict[student_id] is not None:
-            temp_path = tempfile.mktemp(suffix=".jpg")
-            with open(temp_path, "wb") as f: f.write(photo_dict[student_id])
-            try:
-                pdf.image(temp_path, x=photo_x, y=photo_y, w=photo_w, h=photo_h)
-                pdf.set_draw_color(0, 0, 0); pdf.rect(photo_x, photo_y, photo_w, photo_h)
-            except: pass
+        if photos.get(student_id):
+            pdf.image(io.BytesIO(photos[student_id]), x=photo_x, y=photo_y, w=PHOTO_W, h=PHOTO_H)
+            pdf.set_draw_color(0, 0, 0); pdf.rect(photo_x, photo_y, PHOTO_W, PHOTO_H)
         else:
-            pdf.set_draw_color(200); pdf.rect(photo_x, photo_y, photo_w, photo_h) 
+            pdf.set_draw_color(200); pdf.rect(photo_x, photo_y, PHOTO_W, PHOTO_H) 
             pdf.set_text_color(150); pdf.set_font("Arial", '', 5)
-            pdf.set_xy(photo_x, y+20); pdf.cell(photo_w, 5, "NO PHOTO", 0, 0, 'C')
+            pdf.set_xy(photo_x, y+20); pdf.cell(PHOTO_W, 5, "NO PHOTO", 0, 0, 'C')
         
         # Details
         pdf.set_text_color(0); detail_x, curr_y, line_h = x+24, y+14, 4
@@ -265,13 +259,11 @@ def generate_pdf(students_list, photo_dict, progress_bar=None):
         pdf.cell(44, line_h, f"Mob: {student.get('Mobile', '')}", 0, 1)
 
         # QR Code
-        qr_data = f"Name:{student.get('Name', '')}|Roll:{student.get('Roll', '')}|Mob:{student.get('Mobile', '')}"
-        qr = qrcode.make(qr_data); qr_path = tempfile.mktemp(suffix=".png"); qr.save(qr_path)
-        pdf.image(qr_path, x=x+4.5, y=y+37, w=15, h=15)
+        pdf.image(io.BytesIO(qrs[card_qr_payload(student)]), x=x+4.5, y=y+37, w=15, h=15)
         
         # Footer Image
-        if os.path.exists('image_2.png'):
-            try: pdf.image('image_2.png', x=x, y=y+44, w=card_w, h=10)
+        if footer_img:
+            try: pdf.image(footer_img, x=x, y=y+44, w=CARD_W, h=10)
             except: pass
 
         # Watermark
@@ -282,12 +274,12 @@ def generate_pdf(students_list, photo_dict, progress_bar=None):
         pdf.set_text_color(210, 235, 255); pdf.set_font("Arial", 'B', 6); pdf.set_xy(wm_x, wm_y + 1); pdf.cell(27, 4, "BPS DIGITAL", 0, 0, 'C')
 
         # Signature
-        if os.path.exists('signature.png'): 
-            try: pdf.image('signature.png', x=x+58, y=y+40, w=22, h=8)
+        if signature_img:
+            try: pdf.image(signature_img, x=x+58, y=y+40, w=22, h=8)
             except: pass
         
-        pdf.set_text_color(0); pdf.set_font("Arial", 'I', 6); pdf.set_xy(x, y+49); pdf.cell(card_w-5, 3, "Sukhamay Kisku", 0, 1, 'R')
-        pdf.set_font("Arial", '', 5); pdf.set_xy(x, y+51); pdf.cell(card_w-5, 2, "Head Teacher", 0, 0, 'R')
+        pdf.set_text_color(0); pdf.set_font("Arial", 'I', 6); pdf.set_xy(x, y+49); pdf.cell(CARD_W-5, 3, "Sukhamay Kisku", 0, 1, 'R')
+        pdf.set_font("Arial", '', 5); pdf.set_xy(x, y+51); pdf.cell(CARD_W-5, 2, "Head Teacher", 0, 0, 'R')
         
         # 10 Cards Per Page Logic
         col += 1
@@ -442,17 +434,13 @@ with tabs[0]:
                         photo_dict = {}
                         my_bar = st.progress(0, text="Starting secure fetch...")
                         
-                        for idx, (index, student) in enumerate(selected_students.iterrows()):
-                            sid = str(student.get('Sl', index)) + "_" + str(student.get('Roll', '0'))
-                            photo_url = str(student.get('Photo_URL', ''))
-                            
-                            drive_id = extract_drive_id(photo_url)
-                            if drive_id:
-                                img_bytes = fetch_secure_image_bytes(drive_id)
-                                if img_bytes:
-                                    photo_dict[sid] = img_bytes
-                                    
-                            my_bar.progress((idx + 1) / num_students * 0.5, text=f"Fetching photo {idx + 1} of {num_students}...")
+                        sids = [str(student.get('Sl', index)) + "_" + str(student.get('Roll', '0')) for index, student in selected_students.iterrows()]
+                        photo_urls = [str(u) if extract_drive_id(str(u)) else "" for u in selected_students.get('Photo_URL', pd.Series([""] * num_students))]
+                        my_bar.progress(0.05, text=f"Fetching {num_students} photos...")
+                        for sid, img_bytes in zip(sids, photo_store.get_photo_bytes_many(photo_urls, 300)):
+                            if img_bytes:
+                                photo_dict[sid] = img_bytes
+                        my_bar.progress(0.5, text="Photos ready.")
                         
                         pdf_bytes = generate_pdf(selected_students.to_dict('records'), photo_dict, progress_bar=my_bar)
                         batch_log_action("id_card_log", selected_students, "Generated")
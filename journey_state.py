@@ -0,0 +1,94 @@
+import streamlit as st
+import json
+import threading
+import sheets_store, cache_registry, write_queue
+
+# ==========================================
+# CACHED JOURNEY STATE
+# ==========================================
+# The location pages only need a handful of facts about LOCATION_DATA: the
+# last record, the last real move, the last route started and who was at
+# HOME. Instead of scanning the whole history backwards, those facts are
+# folded row by row into one small record on top of the shared sheets_store
+# table, which tail-syncs the sheet and reloads it when rows were deleted or
+# edited. The record remembers how many table rows it covers and the table
+# generation it was built from: new rows are folded in, and a new generation
+# (reload or keyed write) rebuilds it from the cached rows. Rows still
+# waiting in the write queue are folded on top for display only.
+
+BOOK = "sk_money_location"
+SHEET = "LOCATION_DATA"
+COLUMNS = ("Date", "Time", "Move", "Place", "People", "Remark")
+STATIONARY = ("", "- Stationary -", "nan")
+CHECK_SECONDS = 60
+
+def is_moving(move): return str(move).strip() not in STATIONARY
+
+def route_of(remark):
+    """Route name of a "Started Route: <route> towards <stop>" remark, else None."""
+    remark = str(remark)
+    return remark.split("Started Route:")[-1].split("towards")[0].strip() if "Started Route:" in remark else None
+
+def empty_state():
+    return {"counted": 0, "generation": None, "header": [], "last": {},
+            "last_move": None, "last_route": None, "home_people": None, "home_next_people": None}
+
+def advance(state, header, row):
+    """Folds one sheet row (a list in sheet column order) into state, in place."""
+    rec = {c: str(row[i]).strip() if i < len(row) else "" for i, c in enumerate(header) if c in COLUMNS}
+    was_home = state["last"].get("Place") == "HOME" and state["last"].get("Move") == "- Stationary -"
+    if is_moving(rec.get("Move", "")): state["last_move"] = rec["Move"]
+    route = route_of(rec.get("Remark", ""))
+    if route is not None: state["last_route"] = route
+    if rec.get("Place") == "HOME" and rec.get("Move") == "- Stationary -":
+        state["home_people"], state["home_next_people"] = rec.get("People", ""), None
+    elif was_home: state["home_next_people"] = rec.get("People", "")
+    state["last"] = rec
+    state["counted"] += 1
+    return state
+
+def build(values):
+    """Journey state of a whole sheet (header row first), as get_all_values() returns it."""
+    state = empty_state()
+    if not values: return state
+    state["header"] = [str(h).strip() for h in values[0]]
+    for row in values[1:]: advance(state, state["header"], row)
+    return state
+
+def _caught_up(state, table):
+    """state brought up to date with the cached table: new rows folded in, rebuilt if the table was reloaded. Caller holds table.lock."""
+    if state is None or state["generation"] != table.generation or state["counted"] > table.row_count:
+        state = build([table.header])
+        state["generation"] = table.generation
+    for row in table.rows[state["counted"]:]: advance(state, state["header"], row)
+    return state
+
+@st.cache_resource
+def _store():
+    return {"state": None}, threading.Lock()
+
+def _forget():
+    sheets_store.mark_stale(BOOK, SHEET)
+
+def saved_state(ttl=CHECK_SECONDS):
+    """Journey state of the rows already on the sheet, which is re-checked at most every ttl seconds."""
+    store, lock = _store()
+    with lock:
+        try:
+            table = sheets_store.synced_table(BOOK, SHEET, ttl)
+            with table.lock: store["state"] = _caught_up(store["state"], table)
+        except Exception:
+            # Offline before the sheet was ever loaded: nothing to show yet.
+            if store["state"] is None: store["state"] = empty_state()
+        return json.loads(json.dumps(store["state"]))
+
+def current(ttl=CHECK_SECONDS):
+    """Journey state including rows still waiting in the write queue."""
+    state = saved_state(ttl)
+    if state["header"]:
+        for row in write_queue.pending_rows(BOOK, SHEET): advance(state, state["header"], row)
+    return state
+
+current.clear = _forget
+# The write queue clears this namespace once it has sent LOCATION_DATA rows.
+cache_registry.register(current, (BOOK, SHEET))
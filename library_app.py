@@ -1,17 +1,14 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
-import qrcode
 import math
 from datetime import datetime, timedelta
 import pytz
 from streamlit_qrcode_scanner import qrcode_scanner
 from fpdf import FPDF
-import tempfile
-import os
+import io
 import requests
 import base64
+import sheets_store, pdf_engine
 
 # Set Timezone for Haldia, West Bengal
 IST = pytz.timezone('Asia/Kolkata')
@@ -31,53 +28,103 @@ if 'ret_scanned_book_id' not in st.session_state: st.session_state.ret_scanned_b
 # ==========================================
 # 1. DATABASE CONNECTION & CACHING
 # ==========================================
-@st.cache_resource
-def get_gspread_client():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scope)
-    return gspread.authorize(creds)
-
-client = get_gspread_client()
-
 @st.cache_data(ttl=60)
 def load_students():
     try:
-        sheet = client.open("BPS_Database").worksheet("students_master")
+        sheet = sheets_store.worksheet_handle("BPS_Database", "students_master")
         df = pd.DataFrame(sheet.get_all_records())
         df.columns = [str(c).strip().title() for c in df.columns]
         return df
     except Exception:
         return pd.DataFrame(columns=["Class", "Section", "Name", "Roll"])
 
-@st.cache_data(ttl=60, show_spinner=False)
+LIBRARY = "Library_Database"
+
 def load_sheet_data(worksheet_name):
     try:
-        sheet = client.open("Library_Database").worksheet(worksheet_name)
-        records = sheet.get_all_records()
-        return pd.DataFrame(records) if records else pd.DataFrame()
+        return sheets_store.read_sheet(LIBRARY, worksheet_name, ttl=60)
     except Exception as e:
         st.error(f"Error loading {worksheet_name}: {e}")
         return pd.DataFrame()
 
 def append_to_sheet(worksheet_name, data_dict):
-    sheet = client.open("Library_Database").worksheet(worksheet_name)
-    headers = sheet.row_values(1)
+    # The header comes from the cached copy of the sheet, so an issue is just the one append.
+    headers = sheets_store.synced_table(LIBRARY, worksheet_name, ttl=60).header
     row_to_insert = [str(data_dict.get(header, "")) for header in headers]
-    sheet.append_row(row_to_insert)
-    load_sheet_data.clear()
+    sheets_store.append_rows(LIBRARY, worksheet_name, [row_to_insert])
+
+# ==========================================
+# QR LABEL SHEETS
+# ==========================================
+LABELS_PER_PAGE = 24  # 4 columns x 6 rows on A4
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def build_label_pdf(book_ids):
+    """A4 sticker sheet for the given Book_IDs. QR images come from pdf_engine's cache, so only new IDs are drawn."""
+    qrs, _ = pdf_engine.prepare_images(book_ids)
+    
+    pdf = FPDF(orientation='P', unit='mm', format='A4')
+    pdf.set_auto_page_break(auto=False)
+    pdf.set_font("helvetica", size=8)
+    
+    col_width = 45
+    row_height = 48
+    margin_x = 15
+    margin_y = 15
+    
+    for i, book_id in enumerate(book_ids):
+        if i % LABELS_PER_PAGE == 0: pdf.add_page()
+        slot = i % LABELS_PER_PAGE
+        x, y = margin_x + (slot % 4) * col_width, margin_y + (slot // 4) * row_height
+        pdf.image(io.BytesIO(qrs[book_id]), x=x, y=y, w=40, h=40)
+        pdf.set_xy(x, y + 40)
+        pdf.cell(40, 5, txt=book_id, align='C')
+    
+    return bytes(pdf.output())
+
+# ==========================================
+# ISSUE / RETURN LEDGER
+# ==========================================
+# (Book_ID, Student_Name, Status) -> positions of the matching Logs rows,
+# built from the cached Logs sheet and extended as rows are appended, so
+# finding the open issue for a scanned book never touches Google.
+
+@st.cache_resource
+def _ledger():
+    return {"generation": None, "counted": 0, "rows": {}}
+
+def _ledger_caught_up(table):
+    # Caller holds table.lock.
+    led = _ledger()
+    if led["generation"] != table.generation or led["counted"] > table.row_count:
+        led.update(generation=table.generation, counted=0, rows={})
+    keys = ("Book_ID", "Student_Name", "Status")
+    if led["counted"] < table.row_count and all(k in table.header for k in keys):
+        cols = [table.header.index(k) for k in keys]
+        for pos, r in enumerate(table.rows[led["counted"]:], start=led["counted"]):
+            led["rows"].setdefault(tuple(str(r[c]).strip() for c in cols), []).append(pos)
+    led["counted"] = table.row_count
+    return led
 
 def update_log_status(book_id, student_name):
-    sheet = client.open("Library_Database").worksheet("Logs")
-    records = sheet.get_all_records()
+    table = sheets_store.synced_table(LIBRARY, "Logs", ttl=60)
     today_str = datetime.now(IST).strftime("%Y-%m-%d")
     
-    for idx, row in enumerate(records):
-        if str(row["Book_ID"]) == str(book_id) and row["Student_Name"] == student_name and row["Status"] == "Issued":
-            sheet.update_cell(idx + 2, 7, today_str) 
-            sheet.update_cell(idx + 2, 8, "Returned") 
-            break
-            
-    load_sheet_data.clear()
+    with table.lock:
+        book, student = str(book_id).strip(), str(student_name).strip()
+        # update_cells syncs first and refuses a row that no longer holds this loan; then
+        # the sheet is reloaded, which rebuilds the ledger, and the lookup runs once more.
+        for attempt in range(2):
+            led = _ledger_caught_up(table)
+            open_rows = led["rows"].get((book, student, "Issued"))
+            if not open_rows: return
+            # Both cells go in one request; the cached copy is patched in place.
+            if sheets_store.update_cells(LIBRARY, "Logs", open_rows[0], {"Return_Date": today_str, "Status": "Returned"},
+                                         expect={"Book_ID": book, "Student_Name": student, "Status": "Issued"}): break
+            if attempt: return
+            table.full_load()
+        led["rows"].setdefault((book, student, "Returned"), []).append(open_rows.pop(0))
+        led["generation"] = table.generation
 
 st.title("📚 BPS Library Manager")
 
@@ -169,56 +216,19 @@ if menu_choice == "Add Books & QR":
     st.subheader("Generate & Print QR Codes")
     
     if not df_books.empty:
-        total_books = len(df_books)
-        qrs_per_page = 24
-        total_pages = math.ceil(total_books / qrs_per_page)
+        all_ids = [str(b) for b in df_books['Book_ID'].tolist()]
+        
+        # New stickers can be printed on their own instead of reprinting the whole catalogue.
+        start_no = st.number_input("Start from book number", min_value=1, max_value=len(all_ids), value=1, step=1)
+        print_ids = tuple(all_ids[start_no - 1:])
+        total_books = len(print_ids)
+        total_pages = math.ceil(total_books / LABELS_PER_PAGE)
         
-        st.info(f"🖨️ **Printing Details:** You have {total_books} books. This will require **{total_pages}** A4 page(s) to print (24 stickers per page).")
+        st.info(f"🖨️ **Printing Details:** You have selected {total_books} books. This will require **{total_pages}** A4 page(s) to print (24 stickers per page).")
         
         if st.button("Generate A4 PDF for Printing"):
             with st.spinner("Generating PDF layout..."):
-                pdf = FPDF(orientation='P', unit='mm', format='A4')
-                pdf.set_auto_page_break(auto=False)
-                pdf.add_page()
-                pdf.set_font("helvetica", size=8)
-                
-                col_width = 45
-                row_height = 48
-                margin_x = 15
-                margin_y = 15
-                x, y = margin_x, margin_y
-                col_count = 0
-                row_count = 0
-                
-                for idx, row in df_books.iterrows():
-                    qr_data = str(row['Book_ID'])
-                    qr = qrcode.make(qr_data)
-                    
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-                        qr.save(tmp.name)
-                        pdf.image(tmp.name, x=x, y=y, w=40, h=40)
-                        pdf.set_xy(x, y + 40)
-                        pdf.cell(40, 5, txt=str(row['Book_ID']), align='C')
-                        
-                    os.unlink(tmp.name)
-                    
-                    col_count += 1
-                    x += col_width
-                    
-                    if col_count >= 4:
-                        col_count = 0
-                        x = margin_x
-                        row_count += 1
-                        y += row_height
-                        
-                    if row_count >= 6:
-                        pdf.add_page()
-                        row_count = 0
-                        col_count = 0
-                        x = margin_x
-                        y = margin_y
-                
-                pdf_bytes = bytes(pdf.output())
+                pdf_bytes = build_label_pdf(print_ids)
                 st.success("✅ PDF Generated Successfully!")
                 st.download_button(
                     label="📥 Download PDF to Print",
@@ -551,14 +561,14 @@ elif menu_choice == "Book Details & Admin":
                     if st.form_submit_button("Save Changes"):
                         with st.spinner("Updating database..."):
                             try:
-                                sheet = client.open("Library_Database").worksheet("Books")
+                                sheet = sheets_store.worksheet_handle(LIBRARY, "Books")
                                 book_ids = sheet.col_values(1)
                                 row_idx = book_ids.index(selected_id) + 1
                                 
                                 sheet.update_cell(row_idx, 2, new_title)
                                 sheet.update_cell(row_idx, 3, new_author)
                                 
-                                load_sheet_data.clear()
+                                sheets_store.invalidate(LIBRARY, "Books")
                                 st.success("Book details updated successfully!")
                                 st.rerun()
                             except Exception as e:
@@ -583,12 +593,12 @@ elif menu_choice == "Book Details & Admin":
                             if response.status_code == 200:
                                 new_image_url = response.json()["data"]["url"]
                                 
-                                sheet = client.open("Library_Database").worksheet("Books")
+                                sheet = sheets_store.worksheet_handle(LIBRARY, "Books")
                                 book_ids = sheet.col_values(1)
                                 row_idx = book_ids.index(selected_id) + 1
                                 sheet.update_cell(row_idx, 7, new_image_url)
                                 
-                                load_sheet_data.clear()
+                                sheets_store.invalidate(LIBRARY, "Books")
                                 st.success("Cover photo updated successfully!")
                                 st.rerun()
                             else:
@@ -607,7 +617,7 @@ elif menu_choice == "Book Details & Admin":
                     if st.button("Yes, Permanently Delete Book", type="primary"):
                         with st.spinner("Deleting record from database..."):
                             try:
-                                sheet = client.open("Library_Database").worksheet("Books")
+                                sheet = sheets_store.worksheet_handle(LIBRARY, "Books")
                                 book_ids = sheet.col_values(1)
                                 row_idx = book_ids.index(selected_id) + 1
                                 
@@ -616,7 +626,7 @@ elif menu_choice == "Book Details & Admin":
                                 except AttributeError:
                                     sheet.delete_row(row_idx) 
                                 
-                                load_sheet_data.clear()
+                                sheets_store.invalidate(LIBRARY, "Books")
                                 st.success(f"{book_details['Title']} has been deleted.")
                                 st.rerun()
                             except Exception as e:
@@ -8,6 +8,7 @@ import pandas as pd
 from datetime import datetime, timedelta, timezone
 import gspread
 from google.oauth2.service_account import Credentials
+import sheets_store, cache_registry, write_queue, journey_state
 
 # ==========================================
 # 1. SETUP & HELPER FUNCTIONS
@@ -35,13 +36,15 @@ if 'current_move' not in st.session_state: st.session_state.current_move = "BIKE
 if 'last_used_route' not in st.session_state: st.session_state.last_used_route = None
 if 'target_destination' not in st.session_state: st.session_state.target_destination = ""
 
+MONEY_BOOK = "sk_money_location"
+
 @st.cache_resource
 def init_connection():
     scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
     creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scopes)
     client = gspread.authorize(creds)
     # ONLY CONNECTING TO LOCATION SHEET FOR MAXIMUM SPEED
-    return client.open("sk_money_location")
+    return client.open(MONEY_BOOK)
 
 try:
     sh = init_connection()
@@ -55,12 +58,15 @@ def load_config():
     try: return pd.DataFrame(sh.worksheet("CONFIG").get_all_records())
     except: return pd.DataFrame()
 
-@st.cache_data(ttl=60)
+@write_queue.overlay(MONEY_BOOK, "LOCATION_DATA")
+@cache_registry.cached((MONEY_BOOK, "LOCATION_DATA"), ttl=60)
 def load_location_data():
-    try: return pd.DataFrame(sh.worksheet("LOCATION_DATA").get_all_records())
+    # The same tail-synced table journey_state folds, so the page reads LOCATION_DATA from Google once.
+    try: return sheets_store.read_sheet(MONEY_BOOK, "LOCATION_DATA", ttl=60)
     except: return pd.DataFrame()
 
-@st.cache_data(ttl=60)
+@write_queue.overlay(MONEY_BOOK, "MONEY_DATA")
+@cache_registry.cached((MONEY_BOOK, "MONEY_DATA"), ttl=60)
 def load_money_data(): 
     try: return pd.DataFrame(sh.worksheet("MONEY_DATA").get_all_records())
     except: return pd.DataFrame()
@@ -116,9 +122,9 @@ def get_transit_rules():
     return rules
 
 def get_current_location_details():
-    df_loc = load_location_data()
-    if not df_loc.empty:
-        last_record = df_loc.iloc[-1].to_dict()
+    journey = journey_state.current()
+    if journey['counted']:
+        last_record = journey['last']
         move_val = str(last_record.get('Move', '')).strip()
         if move_val in ["", "- Stationary -", "nan"]:
             loc = str(last_record.get('Place', '')).strip()
@@ -139,21 +145,19 @@ def get_current_location_details():
 
 def get_home_occupants(arriving_people_str):
     if get_ist_now().hour >= 14: return "I Baso, Suborno, Mother"
-    df_loc = load_location_data()
+    journey = journey_state.current()
     safe_arr = arriving_people_str.replace('I Baso', 'I, Baso')
     arr_set = set([p.strip() for p in safe_arr.split(',') if p.strip()])
     order = ["I", "Baso", "Suborno", "Mother"]
     
-    if df_loc.empty:
+    if not journey['counted']:
         now_h = arr_set.union({"Baso", "Suborno", "Mother"})
         return ", ".join([p for p in order if p in now_h] + [p for p in now_h if p not in order]).replace("I, Baso", "I Baso")
 
-    last_h_idx = next((i for i in range(len(df_loc)-1, -1, -1) if str(df_loc.iloc[i].get('Place','')).strip() == 'HOME' and str(df_loc.iloc[i].get('Move','')).strip() == '- Stationary -'), -1)
-
-    if last_h_idx != -1:
-        past_h_set = set([p.strip() for p in str(df_loc.iloc[last_h_idx].get('People','')).replace('I Baso', 'I, Baso').split(',') if p.strip()])
-        if last_h_idx < len(df_loc) - 1:
-            dep_set = set([p.strip() for p in str(df_loc.iloc[last_h_idx + 1].get('People','')).replace('I Baso', 'I, Baso').split(',') if p.strip()])
+    if journey['home_people'] is not None:
+        past_h_set = set([p.strip() for p in journey['home_people'].replace('I Baso', 'I, Baso').split(',') if p.strip()])
+        if journey['home_next_people'] is not None:
+            dep_set = set([p.strip() for p in journey['home_next_people'].replace('I Baso', 'I, Baso').split(',') if p.strip()])
             now_h = (past_h_set - dep_set).union(arr_set)
         else: now_h = past_h_set.union(arr_set)
     else: now_h = arr_set.union({"Baso", "Suborno", "Mother"})
@@ -162,19 +166,12 @@ def get_home_occupants(arriving_people_str):
 
 def sync_journey_state():
     if 'state_synced' not in st.session_state:
-        df_loc = load_location_data()
-        if not df_loc.empty:
-            st.session_state.current_move = next((str(df_loc.iloc[i].get('Move','')).strip() for i in range(len(df_loc)-1,-1,-1) if str(df_loc.iloc[i].get('Move','')).strip() not in ["","- Stationary -","nan"]), "BIKE")
-            
-            recent_route = None
-            if 'Remark' in df_loc.columns:
-                for rem in reversed(df_loc['Remark'].tolist()):
-                    if "Started Route:" in str(rem):
-                        recent_route = str(rem).split("Started Route:")[-1].split("towards")[0].strip()
-                        break
-            st.session_state.last_used_route = recent_route
-
-            last_record = df_loc.iloc[-1].to_dict()
+        journey = journey_state.current()
+        if journey['counted']:
+            st.session_state.current_move = journey['last_move'] or "BIKE"
+            st.session_state.last_used_route = journey['last_route']
+
+            last_record = journey['last']
             move_val = str(last_record.get('Move','')).strip()
             place_val = str(last_record.get('Place','')).strip().upper()
             
@@ -206,6 +203,7 @@ sync_journey_state()
 # APP LAYOUT 
 # ==========================================
 st.title("📍 SK Location Tracker")
+write_queue.render_pending(MONEY_BOOK)
 
 # --- LOCATION STATUS & SYNC BUTTON ---
 col_stat, col_sync = st.columns([3, 1])
@@ -219,6 +217,7 @@ with col_stat:
 with col_sync:
     if st.button("🔄 Sync", use_container_width=True):
         load_location_data.clear()
+        journey_state.current.clear()
         if 'state_synced' in st.session_state:
             del st.session_state.state_synced
         st.rerun()
@@ -340,11 +339,11 @@ with st.expander("🗺️ Dynamic Area Route", expanded=False):
                         time_now = get_ist_now()
                         loc_date_str, money_date_str, time_str = time_now.strftime("%d.%m.%y"), time_now.strftime("%d-%m-%Y"), time_now.strftime("%H:%M")
                         
-                        sh.worksheet("LOCATION_DATA").append_row([loc_date_str, time_str, dyn_move, "", dyn_people, f"Started Route: {selected_route} towards {dyn_next_stop}"])
+                        write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [loc_date_str, time_str, dyn_move, "", dyn_people, f"Started Route: {selected_route} towards {dyn_next_stop}"])
                         
                         if fare_amt > 0:
                             start_p = current_loc if current_loc else "Unknown"
-                            sh.worksheet("MONEY_DATA").append_row([money_date_str, time_str, "", fare_amt, fare_acc, "Salary", "PERS", "VISIT", selected_route, f"{dyn_move} ({start_p} - {dyn_next_stop})", start_p, start_p, f"with {dyn_people}" if dyn_people != "I" else ""])
+                            write_queue.append_row(MONEY_BOOK, "MONEY_DATA", [money_date_str, time_str, "", fare_amt, fare_acc, "Salary", "PERS", "VISIT", selected_route, f"{dyn_move} ({start_p} - {dyn_next_stop})", start_p, start_p, f"with {dyn_people}" if dyn_people != "I" else ""])
                             load_money_data.clear()
                         
                         load_location_data.clear()
@@ -362,11 +361,11 @@ with st.expander("🗺️ Dynamic Area Route", expanded=False):
                         time_now = get_ist_now()
                         loc_date_str, money_date_str, time_str = time_now.strftime("%d.%m.%y"), time_now.strftime("%d-%m-%Y"), time_now.strftime("%H:%M")
                         
-                        sh.worksheet("LOCATION_DATA").append_row([loc_date_str, time_str, dyn_move, selected_route, dyn_people, f"Started Route: {selected_route} towards {dyn_next_stop}"])
+                        write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [loc_date_str, time_str, dyn_move, selected_route, dyn_people, f"Started Route: {selected_route} towards {dyn_next_stop}"])
                         
                         if fare_amt > 0:
                             start_p = current_loc if current_loc else "Unknown"
-                            sh.worksheet("MONEY_DATA").append_row([money_date_str, time_str, "", fare_amt, fare_acc, "Salary", "PERS", "VISIT", selected_route, f"{dyn_move} ({start_p} - {dyn_next_stop})", start_p, start_p, f"with {dyn_people}" if dyn_people != "I" else ""])
+                            write_queue.append_row(MONEY_BOOK, "MONEY_DATA", [money_date_str, time_str, "", fare_amt, fare_acc, "Salary", "PERS", "VISIT", selected_route, f"{dyn_move} ({start_p} - {dyn_next_stop})", start_p, start_p, f"with {dyn_people}" if dyn_people != "I" else ""])
                             load_money_data.clear()
                         
                         load_location_data.clear()
@@ -400,7 +399,7 @@ with st.expander("🗺️ Dynamic Area Route", expanded=False):
                         final_arr_people = get_home_occupants(active_p)
                         st.session_state.current_people = "I"
                         
-                    sh.worksheet("LOCATION_DATA").append_row([time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), "- Stationary -", dyn_place, final_arr_people, arr_remark])
+                    write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), "- Stationary -", dyn_place, final_arr_people, arr_remark])
                     load_location_data.clear()
                     st.session_state.update(route_active=False, route_type=None, target_destination="")
                     st.rerun()
@@ -423,7 +422,7 @@ st.markdown("""
 def cb_board_bus():
     try:
         time_now = get_ist_now()
-        sh.worksheet("LOCATION_DATA").append_row([time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), "- Stationary -", "Girishmore Bus Stop", "I", "Suborno boarded bus to school"])
+        write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), "- Stationary -", "Girishmore Bus Stop", "I", "Suborno boarded bus to school"])
         st.session_state.update(current_people="I")
         load_location_data.clear()
     except Exception as e: st.session_state.quick_err = str(e)
@@ -432,7 +431,7 @@ def cb_receive_suborno():
     try:
         time_now = get_ist_now()
         new_people = st.session_state.current_people + ", Suborno" if st.session_state.current_people else "I, Suborno"
-        sh.worksheet("LOCATION_DATA").append_row([time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), "- Stationary -", "Girishmore Bus Stop", new_people, "Received Suborno from school bus"])
+        write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), "- Stationary -", "Girishmore Bus Stop", new_people, "Received Suborno from school bus"])
         st.session_state.update(current_people=new_people)
         load_location_data.clear()
     except Exception as e: st.session_state.quick_err = str(e)
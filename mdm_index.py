@@ -0,0 +1,103 @@
+import streamlit as st
+import pandas as pd
+from collections import Counter, defaultdict
+from datetime import datetime
+import sheets_store
+
+# ==========================================
+# MDM DAY-COUNT INDEX
+# ==========================================
+# Aggregates over BPS_Database/mdm_log, kept next to the cached sheet in
+# sheets_store: MDM days per student, the rows logged on each date (overall
+# and per class) and the latest MDM date per class. Rows appended since the
+# last look are folded in one by one; only a reload or keyed rewrite of the
+# sheet (a new table generation) rebuilds it from scratch.
+
+SPREADSHEET, WORKSHEET = "BPS_Database", "mdm_log"
+PP_CLASSES = ['CLASS PP', 'CLASS LPP']
+
+def parse_date(value):
+    try: return datetime.strptime(value, "%d-%m-%Y").date()
+    except ValueError:
+        d = pd.to_datetime(value, errors='coerce', dayfirst=True)
+        return None if pd.isna(d) else d.date()
+
+class MdmIndex:
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, generation):
+        self.generation = generation
+        self.counted = 0
+        self.student_days = defaultdict(Counter)   # (Class, Section) -> Roll -> rows logged
+        self.on_date = defaultdict(list)           # Date -> row positions
+        self.class_on_date = defaultdict(list)     # (Date, Class, Section) -> row positions
+        self.class_dates = defaultdict(dict)       # (Class, Section) -> parsed date -> Date string
+        self.dates = {}                            # Date string -> parsed date
+
+    def add(self, header, rows):
+        cols = [header.index(c) if c in header else None for c in ('Date', 'Class', 'Section', 'Roll')]
+        if None in cols:
+            self.counted += len(rows)
+            return
+        for pos, r in enumerate(rows, start=self.counted):
+            d, c, s, roll = (str(r[i]).strip() for i in cols)
+            self.student_days[(c, s)][roll] += 1
+            self.on_date[d].append(pos)
+            self.class_on_date[(d, c, s)].append(pos)
+            if d not in self.dates: self.dates[d] = parse_date(d)
+            seen = self.class_dates[(c, s)]
+            if self.dates[d]: seen[self.dates[d]] = d
+        self.counted += len(rows)
+
+@st.cache_resource
+def _index():
+    return MdmIndex()
+
+def _caught_up(table):
+    # Caller holds table.lock.
+    idx = _index()
+    if idx.generation != table.generation or idx.counted > table.row_count: idx.reset(table.generation)
+    if idx.counted < table.row_count: idx.add(table.header, table.rows[idx.counted:])
+    return idx
+
+def _classes(tc): return PP_CLASSES if tc == 'CLASS PP' else [tc]
+
+def _frame(table, positions):
+    return table.df.iloc[sorted(positions)].copy() if positions else table.df.iloc[0:0].copy()
+
+def day_counts(tc, ts, ttl=600):
+    """Roll -> number of MDM days logged for one class (CLASS PP includes CLASS LPP)."""
+    table = sheets_store.synced_table(SPREADSHEET, WORKSHEET, ttl)
+    with table.lock:
+        idx = _caught_up(table)
+        out = Counter()
+        for c in _classes(tc): out.update(idx.student_days.get((c, ts), {}))
+        return dict(out)
+
+def _keys(idx, tc, ts):
+    # (Class, Section) pairs seen for a class; ts=None means every section.
+    return [k for k in idx.class_dates if k[0] in _classes(tc) and (ts is None or k[1] == ts)]
+
+def rows_on(date_str, tc=None, ts=None, ttl=600):
+    """mdm_log rows for one date, optionally only one class (and section)."""
+    table = sheets_store.synced_table(SPREADSHEET, WORKSHEET, ttl)
+    with table.lock:
+        idx = _caught_up(table)
+        if tc is None: return _frame(table, idx.on_date.get(date_str, []))
+        return _frame(table, [p for c, s in _keys(idx, tc, ts) for p in idx.class_on_date.get((date_str, c, s), [])])
+
+def rows_between(start, end, ttl=600):
+    """mdm_log rows dated from start to end (datetime.date, inclusive)."""
+    table = sheets_store.synced_table(SPREADSHEET, WORKSHEET, ttl)
+    with table.lock:
+        idx = _caught_up(table)
+        return _frame(table, [p for d, parsed in idx.dates.items() if parsed and start <= parsed <= end for p in idx.on_date[d]])
+
+def latest_date(tc, ts=None, before=None, ttl=600):
+    """Date string of the class's most recent MDM entry (strictly before the date `before`, if given), or None."""
+    table = sheets_store.synced_table(SPREADSHEET, WORKSHEET, ttl)
+    with table.lock:
+        idx = _caught_up(table)
+        found = {d: ds for k in _keys(idx, tc, ts) for d, ds in idx.class_dates[k].items() if before is None or d < before}
+        return found[max(found)] if found else None
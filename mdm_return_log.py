@@ -6,6 +6,7 @@ import pandas as pd
 from datetime import datetime
 import pytz
 import time
+import write_queue
 
 # --- Master Google Sheets Formulas for Duration ---
 GS_FORMULA = '=IF(INDIRECT("C"&ROW())="RUNNING", "RUNNING", IFERROR(TEXT(MOD(INDIRECT("C"&ROW())-INDIRECT("B"&ROW()), 1), "h:mm"), ""))'
@@ -76,18 +77,29 @@ def get_mdm_spreadsheet():
     return client.open("MDM RETURN LOG")
 
 def smart_append_row(sheet, row_data):
-    col_a = sheet.col_values(1)
-    next_row = len(col_a) + 1
+    """Queues a row for the true end of Column A (avoiding formatting bugs); the write queue sends it paced."""
+    write_queue.append_row(sheet.spreadsheet.title, sheet.title, row_data, user_entered=True, below_column_a=True)
+
+def with_queued(data, spreadsheet, worksheet):
+    """get_all_values() result with the rows still waiting in the write queue in the sheet rows they will take."""
+    return write_queue.below_column_a(data, spreadsheet, worksheet)
+
+def drain_logs():
+    """Sends queued activity_log and MDM log rows before a running task is closed in place; False if Google can't be reached."""
     try:
-        sheet.update(range_name=f"A{next_row}", values=[row_data], value_input_option="USER_ENTERED")
-    except TypeError:
-        sheet.update(f"A{next_row}", [row_data], value_input_option="USER_ENTERED")
+        write_queue.drain("MY ROUTINE 2026", "activity_log")
+        mdm_ss = get_mdm_spreadsheet()
+        write_queue.drain(mdm_ss.title, mdm_ss.get_worksheet(0).title)
+        return True
+    except Exception:
+        st.error("⚠️ Queued entries could not be synced yet. Try again in a moment.")
+        return False
 
 @st.cache_data(ttl=300)
 def get_activity_log():
     ss = get_main_spreadsheet()
     sheet = ss.worksheet("activity_log")
-    data = sheet.get_all_values()
+    data = with_queued(sheet.get_all_values(), "MY ROUTINE 2026", "activity_log")
     if len(data) <= 1:
         return pd.DataFrame(columns=["Date", "Start_Time", "End_Time", "Duration", "Activity", "Sub_Activities", "check_list", "Notes"])
     df = pd.DataFrame(data[1:], columns=data[0])
@@ -102,7 +114,8 @@ def fetch_mdm_raw_data():
     try:
         ss = get_mdm_spreadsheet()
         config_data = ss.worksheet("CONFIG").get_all_records()
-        log_data = ss.get_worksheet(0).get_all_values()
+        logs_ws = ss.get_worksheet(0)
+        log_data = with_queued(logs_ws.get_all_values(), ss.title, logs_ws.title)
         data_tab_data = ss.worksheet("Data").get_all_records()
         return config_data, log_data, data_tab_data
     except Exception as e:
@@ -232,7 +245,7 @@ try:
                 st.markdown(f"<div style='background-color: #f8f9fa; border-left: 5px solid #0068c9; padding: 12px;'>⏳ <b>{display_name}</b></div>", unsafe_allow_html=True)
                 
                 task_status = st.selectbox("Update Status:", ["In Progress", "Completed"], key=f"status_{sheet_row}")
-                if st.button("🛑 STOP & LOG", key=f"save_{sheet_row}", type="primary"):
+                if st.button("🛑 STOP & LOG", key=f"save_{sheet_row}", type="primary") and drain_logs():
                     end_time = now.strftime('%H:%M')
                     
                     main_ss = get_main_spreadsheet()
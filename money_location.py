@@ -8,6 +8,7 @@ import pandas as pd
 from datetime import datetime, timedelta, timezone, date
 import gspread
 from google.oauth2.service_account import Credentials
+import sheets_store, cache_registry, write_queue, journey_state
 
 # ==========================================
 # 1. SETUP & HELPER FUNCTIONS
@@ -43,12 +44,14 @@ if 'target_destination' not in st.session_state: st.session_state.target_destina
 if 'stop_active' not in st.session_state: st.session_state.stop_active = False
 if 'stop_start_time' not in st.session_state: st.session_state.stop_start_time = None
 
+MONEY_BOOK, PEOPLE_BOOK = "sk_money_location", "PEOPLE"
+
 @st.cache_resource
 def init_connection():
     scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
     creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scopes)
     client = gspread.authorize(creds)
-    return client.open("sk_money_location"), client.open("PEOPLE")
+    return client.open(MONEY_BOOK), client.open(PEOPLE_BOOK)
 
 try:
     sh, sh_people = init_connection()
@@ -62,12 +65,15 @@ def load_config():
     try: return pd.DataFrame(sh.worksheet("CONFIG").get_all_records())
     except: return pd.DataFrame()
 
-@st.cache_data(ttl=60)
+@write_queue.overlay(MONEY_BOOK, "LOCATION_DATA")
+@cache_registry.cached((MONEY_BOOK, "LOCATION_DATA"), ttl=60)
 def load_location_data():
-    try: return pd.DataFrame(sh.worksheet("LOCATION_DATA").get_all_records())
+    # The same tail-synced table journey_state folds, so the page reads LOCATION_DATA from Google once.
+    try: return sheets_store.read_sheet(MONEY_BOOK, "LOCATION_DATA", ttl=60)
     except: return pd.DataFrame()
 
-@st.cache_data(ttl=60)
+@write_queue.overlay(MONEY_BOOK, "MONEY_DATA")
+@cache_registry.cached((MONEY_BOOK, "MONEY_DATA"), ttl=60)
 def load_money_data():
     try: return pd.DataFrame(sh.worksheet("MONEY_DATA").get_all_records())
     except: return pd.DataFrame()
@@ -77,7 +83,8 @@ def load_shopping_data():
     try: return pd.DataFrame(sh.worksheet("SHOPPING_LIST").get_all_records())
     except: return pd.DataFrame()
 
-@st.cache_data(ttl=60)
+@write_queue.overlay(MONEY_BOOK, "BIKE_LOG")
+@cache_registry.cached((MONEY_BOOK, "BIKE_LOG"), ttl=60)
 def load_bike_data():
     try: return pd.DataFrame(sh.worksheet("BIKE_LOG").get_all_records())
     except: return pd.DataFrame()
@@ -92,7 +99,8 @@ def load_people_names():
     try: return pd.DataFrame(sh_people.worksheet("People").get_all_records())
     except: return pd.DataFrame()
 
-@st.cache_data(ttl=60)
+@write_queue.overlay(PEOPLE_BOOK, "People Interaction")
+@cache_registry.cached((PEOPLE_BOOK, "People Interaction"), ttl=60)
 def load_interactions():
     try: return pd.DataFrame(sh_people.worksheet("People Interaction").get_all_records())
     except: return pd.DataFrame()
@@ -153,9 +161,9 @@ def get_transit_rules():
     return rules
 
 def get_current_location_details():
-    df_loc = load_location_data()
-    if not df_loc.empty:
-        last_record = df_loc.iloc[-1].to_dict()
+    journey = journey_state.current()
+    if journey['counted']:
+        last_record = journey['last']
         move_val = str(last_record.get('Move', '')).strip()
         if move_val in ["", "- Stationary -", "nan"]:
             loc = str(last_record.get('Place', '')).strip()
@@ -212,29 +220,23 @@ def get_home_occupants(arriving_people_str):
     if time_now.hour >= 14:
         return "I Baso, Suborno, Mother"
         
-    df_loc = load_location_data()
+    journey = journey_state.current()
     safe_arriving_str = arriving_people_str.replace('I Baso', 'I, Baso')
     arriving_people = set([p.strip() for p in safe_arriving_str.split(',') if p.strip()])
     order = ["I", "Baso", "Suborno", "Mother"]
     
-    if df_loc.empty:
+    if not journey['counted']:
         now_home = arriving_people.union({"Baso", "Suborno", "Mother"})
         ordered_home = [p for p in order if p in now_home] + [p for p in now_home if p not in order]
         return ", ".join(ordered_home).replace("I, Baso", "I Baso")
 
-    last_home_idx = -1
-    for i in range(len(df_loc)-1, -1, -1):
-        if str(df_loc.iloc[i].get('Place', '')).strip() == 'HOME' and str(df_loc.iloc[i].get('Move', '')).strip() == '- Stationary -':
-            last_home_idx = i
-            break
-
-    if last_home_idx != -1:
-        past_home_str = str(df_loc.iloc[last_home_idx].get('People', ''))
+    if journey['home_people'] is not None:
+        past_home_str = journey['home_people']
         safe_past_str = past_home_str.replace('I Baso', 'I, Baso')
         past_home_people = set([p.strip() for p in safe_past_str.split(',') if p.strip()])
 
-        if last_home_idx < len(df_loc) - 1:
-            depart_str = str(df_loc.iloc[last_home_idx + 1].get('People', ''))
+        if journey['home_next_people'] is not None:
+            depart_str = journey['home_next_people']
             safe_depart_str = depart_str.replace('I Baso', 'I, Baso')
             depart_people = set([p.strip() for p in safe_depart_str.split(',') if p.strip()])
             
@@ -250,27 +252,12 @@ def get_home_occupants(arriving_people_str):
 
 def sync_journey_state():
     if 'state_synced' not in st.session_state:
-        df_loc = load_location_data()
-        if not df_loc.empty:
-            last_move_val = "BIKE"
-            for i in range(len(df_loc)-1, -1, -1):
-                m = str(df_loc.iloc[i].get('Move', '')).strip()
-                if m not in ["", "- Stationary -", "nan"]:
-                    last_move_val = m
-                    break
-            st.session_state.current_move = last_move_val
-
-            recent_route = None
-            if 'Remark' in df_loc.columns:
-                for remark in reversed(df_loc['Remark'].tolist()):
-                    rem_str = str(remark)
-                    if "Started Route:" in rem_str:
-                        route_part = rem_str.split("Started Route:")[-1].split("towards")[0].strip()
-                        recent_route = route_part
-                        break
-            st.session_state.last_used_route = recent_route
-
-            last_record = df_loc.iloc[-1].to_dict()
+        journey = journey_state.current()
+        if journey['counted']:
+            st.session_state.current_move = journey['last_move'] or "BIKE"
+            st.session_state.last_used_route = journey['last_route']
+
+            last_record = journey['last']
             move_val = str(last_record.get('Move', '')).strip()
             place_val = str(last_record.get('Place', '')).strip().upper()
             
@@ -302,6 +289,8 @@ sync_journey_state()
 # APP LAYOUT & TABS
 # ==========================================
 st.title("📱 SK Ecosystem - Core")
+write_queue.render_pending(MONEY_BOOK)
+write_queue.render_pending(PEOPLE_BOOK)
 
 # --- UPDATED TABS ---
 tab_location, tab_money, tab_config = st.tabs(["📍 Location", "💰 Money", "⚙️ Data Config"])
@@ -467,7 +456,7 @@ with tab_location:
                             money_date_str = time_now.strftime("%d-%m-%Y")
                             time_str = time_now.strftime("%H:%M")
                             
-                            sh.worksheet("LOCATION_DATA").append_row([
+                            write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [
                                 loc_date_str, time_str, dyn_move, "", dyn_people, f"Started Route: {selected_route} towards {dyn_next_stop}"
                             ])
                             
@@ -476,7 +465,7 @@ with tab_location:
                                 part_str = f"{dyn_move} ({start_point} - {dyn_next_stop})"
                                 remark_str = f"with {dyn_people}" if dyn_people != "I" else ""
                                 money_row = [money_date_str, time_str, "", fare_amt, fare_acc, "Salary", "PERS", "VISIT", selected_route, part_str, start_point, start_point, remark_str]
-                                sh.worksheet("MONEY_DATA").append_row(money_row)
+                                write_queue.append_row(MONEY_BOOK, "MONEY_DATA", money_row)
                                 load_money_data.clear()
                             
                             load_location_data.clear()
@@ -502,7 +491,7 @@ with tab_location:
                             money_date_str = time_now.strftime("%d-%m-%Y")
                             time_str = time_now.strftime("%H:%M")
                             
-                            sh.worksheet("LOCATION_DATA").append_row([
+                            write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [
                                 loc_date_str, time_str, dyn_move, selected_route, dyn_people, f"Started Route: {selected_route} towards {dyn_next_stop}"
                             ])
                             
@@ -511,7 +500,7 @@ with tab_location:
                                 part_str = f"{dyn_move} ({start_point} - {dyn_next_stop})"
                                 remark_str = f"with {dyn_people}" if dyn_people != "I" else ""
                                 money_row = [money_date_str, time_str, "", fare_amt, fare_acc, "Salary", "PERS", "VISIT", selected_route, part_str, start_point, start_point, remark_str]
-                                sh.worksheet("MONEY_DATA").append_row(money_row)
+                                write_queue.append_row(MONEY_BOOK, "MONEY_DATA", money_row)
                                 load_money_data.clear()
                             
                             load_location_data.clear()
@@ -557,7 +546,7 @@ with tab_location:
                             final_arr_people = get_home_occupants(active_p)
                             st.session_state.current_people = "I" # Reset companions for next trip
                             
-                        sh.worksheet("LOCATION_DATA").append_row([
+                        write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [
                             time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), "- Stationary -", dyn_place, final_arr_people, arr_remark
                         ])
                         load_location_data.clear()
@@ -621,19 +610,19 @@ with tab_location:
                             loc = f"On the way ({active_r})"
                             
                         # Log to Location App
-                        sh.worksheet("LOCATION_DATA").append_row([
+                        write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [
                             today_str, start_t.strftime("%H:%M"), "- Stationary -", loc, st.session_state.current_people, stop_desc
                         ])
                         
                         # Resume journey if active
                         if st.session_state.route_active:
-                            sh.worksheet("LOCATION_DATA").append_row([
+                            write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [
                                 today_str, time_now_stop.strftime("%H:%M"), active_m, "", active_p, f"Resumed Route: {active_r} towards {target_dest}"
                             ])
                             
                         # Log to PEOPLE Sheet if applicable
                         if contact_name and stop_task in ["Call receive", "Call", "Meet"]:
-                            sh_people.worksheet("People Interaction").append_row([
+                            write_queue.append_row(PEOPLE_BOOK, "People Interaction", [
                                 contact_name, stop_task, today_people_str, start_t.strftime("%H:%M"), time_now_stop.strftime("%H:%M"), duration_str_hhmmss, "⚠️ INCOMPLETE"
                             ])
                             load_interactions.clear()
@@ -678,6 +667,7 @@ with tab_location:
                             if st.button("Save", key=f"save_topic_{idx}", type="primary"):
                                 if new_topic.strip():
                                     try:
+                                        write_queue.drain(PEOPLE_BOOK, "People Interaction")
                                         headers = int_ws.row_values(1)
                                         col_idx = headers.index('Purpose / Topic') + 1
                                         int_ws.update_cell(sheet_row, col_idx, new_topic)
@@ -709,7 +699,7 @@ with tab_location:
                 if st.button("🟢 Start Express Journey", use_container_width=True):
                     try:
                         time_now = get_ist_now()
-                        sh.worksheet("LOCATION_DATA").append_row([time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), express_move, "", express_people, "Started Express Route"])
+                        write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), express_move, "", express_people, "Started Express Route"])
                         load_location_data.clear()
                         st.session_state.route_active = True
                         st.session_state.route_type = "Express"
@@ -741,18 +731,18 @@ with tab_location:
                         
                         if forgot_keys_fwd and express_place == "Bhagyabantapur Primary School":
                             m_time_str = missed_time_fwd.strftime("%H:%M")
-                            sh.worksheet("LOCATION_DATA").append_row([today_str, m_time_str, "- Stationary -", "Karim Da's House (Keys)", arrival_people, "Retroactive arrival"])
-                            sh.worksheet("LOCATION_DATA").append_row([today_str, m_time_str, travel_mode, "", arrival_people, "Retroactive transit"])
+                            write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [today_str, m_time_str, "- Stationary -", "Karim Da's House (Keys)", arrival_people, "Retroactive arrival"])
+                            write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [today_str, m_time_str, travel_mode, "", arrival_people, "Retroactive transit"])
                         if express_place == "HOME":
                             if forgot_keys_ret:
                                 m_time_k = missed_time_keys.strftime("%H:%M")
-                                sh.worksheet("LOCATION_DATA").append_row([today_str, m_time_k, "- Stationary -", "Karim Da's House (Keys)", arrival_people, "Retroactive arrival"])
-                                sh.worksheet("LOCATION_DATA").append_row([today_str, m_time_k, travel_mode, "", arrival_people, "Retroactive transit"])
+                                write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [today_str, m_time_k, "- Stationary -", "Karim Da's House (Keys)", arrival_people, "Retroactive arrival"])
+                                write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [today_str, m_time_k, travel_mode, "", arrival_people, "Retroactive transit"])
                             if forgot_bus:
                                 m_time_b = missed_time_bus.strftime("%H:%M")
-                                sh.worksheet("LOCATION_DATA").append_row([today_str, m_time_b, "- Stationary -", "Girishmore Bus Stop", arrival_people, "Retroactive arrival"])
+                                write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [today_str, m_time_b, "- Stationary -", "Girishmore Bus Stop", arrival_people, "Retroactive arrival"])
                                 arrival_people = "I"
-                                sh.worksheet("LOCATION_DATA").append_row([today_str, m_time_b, travel_mode, "", arrival_people, "Retroactive transit"])
+                                write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [today_str, m_time_b, travel_mode, "", arrival_people, "Retroactive transit"])
                         
                         arr_remark_exp = ""
                         final_arr_people = arrival_people
@@ -763,7 +753,7 @@ with tab_location:
                             final_arr_people = get_home_occupants(arrival_people)
                             st.session_state.current_people = "I" # Reset companions for next trip
                             
-                        sh.worksheet("LOCATION_DATA").append_row([today_str, time_now.strftime("%H:%M"), "- Stationary -", express_place, final_arr_people, arr_remark_exp])
+                        write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [today_str, time_now.strftime("%H:%M"), "- Stationary -", express_place, final_arr_people, arr_remark_exp])
                         load_location_data.clear()
                         st.session_state.route_active = False
                         st.session_state.route_type = None
@@ -787,7 +777,7 @@ with tab_location:
             time_now = get_ist_now()
             today_str = time_now.strftime("%d.%m.%y")
             time_str = time_now.strftime("%H:%M")
-            sh.worksheet("LOCATION_DATA").append_row([
+            write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [
                 today_str, time_str, "- Stationary -", "Girishmore Bus Stop", "I", "Suborno boarded bus to school"
             ])
             st.session_state.current_people = "I"
@@ -805,7 +795,7 @@ with tab_location:
             current_p = st.session_state.current_people
             new_people = current_p + ", Suborno" if current_p else "I, Suborno"
             
-            sh.worksheet("LOCATION_DATA").append_row([
+            write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [
                 today_str, time_str, "- Stationary -", "Girishmore Bus Stop", new_people, "Received Suborno from school bus"
             ])
             st.session_state.current_people = new_people
@@ -866,7 +856,7 @@ with tab_location:
                     st.stop()
                 formatted_date = loc_date.strftime("%d.%m.%y")
                 final_move = "" if move == "- Stationary -" else move
-                sh.worksheet("LOCATION_DATA").append_row([formatted_date, formatted_time, final_move, specific_place, people, loc_remark])
+                write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [formatted_date, formatted_time, final_move, specific_place, people, loc_remark])
                 load_location_data.clear()
                 
                 # Reset if manual entry was arriving HOME
@@ -899,6 +889,7 @@ with tab_money:
         if st.button("🔄 Sync Loc", use_container_width=True):
             # FULL SYSTEM CACHE WIPE
             load_location_data.clear()
+            journey_state.current.clear()
             load_config.clear()
             load_shopping_data.clear()
             st.rerun()
@@ -933,13 +924,13 @@ with tab_money:
                     in_val = b_paid if "IN" in b_type else ""
                     out_val = b_paid if "OUT" in b_type else ""
                     final_acc = "MB" if chk_mb else ""
-                    sh.worksheet("MONEY_DATA").append_row([today_str, time_str, in_val, out_val, final_acc, "", final_entity, "", "", "", final_tf, current_loc or "", "⚠️ INCOMPLETE"])
+                    write_queue.append_row(MONEY_BOOK, "MONEY_DATA", [today_str, time_str, in_val, out_val, final_acc, "", final_entity, "", "", "", final_tf, current_loc or "", "⚠️ INCOMPLETE"])
                 
                 # 2. Log the Due amount (if any)
                 if b_due > 0:
                     in_val_due = b_due if "IN" in b_type else ""
                     out_val_due = b_due if "OUT" in b_type else ""
-                    sh.worksheet("MONEY_DATA").append_row([today_str, time_str, in_val_due, out_val_due, "UNPAID", "", final_entity, "", "", "", final_tf, current_loc or "", "⚠️ INCOMPLETE"])
+                    write_queue.append_row(MONEY_BOOK, "MONEY_DATA", [today_str, time_str, in_val_due, out_val_due, "UNPAID", "", final_entity, "", "", "", final_tf, current_loc or "", "⚠️ INCOMPLETE"])
                     
                 load_money_data.clear()
                 st.success(f"Fast saved! Paid: ₹{b_paid}, Due: ₹{b_due}.")
@@ -992,9 +983,9 @@ with tab_money:
                         date_str = time_now.strftime("%d-%m-%Y")
                         time_str = time_now.strftime("%H:%M")
                         
-                        sh.worksheet("BIKE_LOG").append_row([date_str, time_str, b_odo, b_litres, b_cost])
+                        write_queue.append_row(MONEY_BOOK, "BIKE_LOG", [date_str, time_str, b_odo, b_litres, b_cost])
                         tf_val = current_loc if should_inject_tofrom(current_loc) else "Petrol Pump"
-                        sh.worksheet("MONEY_DATA").append_row([
+                        write_queue.append_row(MONEY_BOOK, "MONEY_DATA", [
                             date_str, time_str, "", b_cost, b_acc, "Salary", "PERS", "NEEDS", 
                             "Transport", "Petrol", tf_val, current_loc or "", f"Odo: {b_odo}"
                         ])
@@ -1115,6 +1106,7 @@ with tab_money:
                                     final_cat, final_sub, final_part, 
                                     final_tf, row.get('Location', ''), i_rem
                                 ]
+                                write_queue.drain(MONEY_BOOK, "MONEY_DATA")
                                 cells = money_ws.range(f"A{sheet_row}:M{sheet_row}")
                                 for i, val in enumerate(row_data): cells[i].value = str(val)
                                 money_ws.update_cells(cells)
@@ -1191,7 +1183,7 @@ with tab_money:
                                     final_tf = current_loc if should_inject_tofrom(current_loc) else ""
                                     
                                     money_row = [today_str, time_str, "", final_cost, str(row.get(acc_col, '')), str(row.get(fund_col, '')), ent, cat, subcat, part_name, final_tf, current_loc, rem]
-                                    sh.worksheet("MONEY_DATA").append_row(money_row)
+                                    write_queue.append_row(MONEY_BOOK, "MONEY_DATA", money_row)
                                     
                                     # Safely write to Shopping list exactly where it needs to
                                     if s_idx is not None: shop_ws.update_cell(sheet_row, s_idx + 1, 'Bought')
@@ -1296,7 +1288,7 @@ with tab_money:
                     
                 formatted_date = entry_date.strftime("%d-%m-%Y")
                 row_data = [formatted_date, formatted_time, amount_in if amount_in > 0 else "", amount_out if amount_out > 0 else "", account, fund, entity, category, sub_cat, particulars, to_from, current_loc or "", remark]
-                sh.worksheet("MONEY_DATA").append_row(row_data)
+                write_queue.append_row(MONEY_BOOK, "MONEY_DATA", row_data)
                 load_money_data.clear() 
                 st.success(f"Saved: ₹{amount_in if amount_in > 0 else amount_out} logged!")
                 st.session_state.locked_date = get_ist_now().date() 
@@ -1329,7 +1321,7 @@ with tab_config:
             if ld_place and ld_final_remark:
                 try:
                     time_now = get_ist_now()
-                    sh.worksheet("LOCATION_DATA").append_row([
+                    write_queue.append_row(MONEY_BOOK, "LOCATION_DATA", [
                         time_now.strftime("%d.%m.%y"), time_now.strftime("%H:%M"), 
                         "- Stationary -", ld_place, st.session_state.current_people, ld_final_remark
                     ])
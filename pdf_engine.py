@@ -0,0 +1,135 @@
+import streamlit as st
+import os
+import io
+import threading
+import multiprocessing
+import concurrent.futures
+import qrcode
+from PIL import Image, ImageOps
+
+# ==========================================
+# SHARED PDF IMAGE ENGINE
+# ==========================================
+# The CPU-heavy part of the printable PDFs (ID cards, QR labels): QR codes
+# are made once per payload and kept for the life of the server, photos are
+# shrunk to the pixel size they are printed at, and the static artwork of a
+# card is flattened into one template image. Large runs are split into
+# batches for a small process pool. Everything is handed to fpdf as
+# in-memory buffers, so no temp files are written.
+
+PRINT_DPI = 300
+POOL_MIN_JOBS = 40   # below this, pool start-up and IPC cost more than they save
+BATCH_SIZE = 25
+QR_CACHE_LIMIT = 5000
+
+def mm_to_px(mm): return max(1, round(mm / 25.4 * PRINT_DPI))
+
+def make_qr_png(payload):
+    buf = io.BytesIO()
+    qrcode.make(payload).save(buf)
+    return buf.getvalue()
+
+def fit_photo(raw, size_px):
+    """JPEG of raw resized to size_px (w, h), or None if raw is not a readable image."""
+    try:
+        img = ImageOps.exif_transpose(Image.open(io.BytesIO(raw))).convert("RGB")
+        buf = io.BytesIO()
+        img.resize(size_px, Image.LANCZOS).save(buf, "JPEG", quality=88)
+        return buf.getvalue()
+    except Exception:
+        return None
+
+def _run_batch(jobs):
+    # Pool worker entry point; jobs are (kind, key, arg) tuples.
+    return [(kind, key, make_qr_png(arg) if kind == "qr" else fit_photo(*arg)) for kind, key, arg in jobs]
+
+@st.cache_resource
+def _pool():
+    # spawn rather than fork: the Streamlit server process is multi-threaded.
+    workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+@st.cache_resource
+def _qr_cache():
+    return {}, threading.Lock()
+
+def _remember_qr(payload, png):
+    cache, lock = _qr_cache()
+    with lock:
+        if len(cache) >= QR_CACHE_LIMIT: cache.clear()
+        cache[payload] = png
+
+def qr_png(payload):
+    """PNG bytes of the QR code for payload, made at most once per server process."""
+    cache, lock = _qr_cache()
+    with lock: png = cache.get(payload)
+    if png is None:
+        png = make_qr_png(payload)
+        _remember_qr(payload, png)
+    return png
+
+def prepare_images(qr_payloads=(), photos=None, progress=None):
+    """Images for one print run. photos maps key -> (raw bytes, (w_px, h_px)).
+
+    Returns ({payload: QR PNG}, {key: fitted JPEG}); progress(done, total) is called as batches finish.
+    """
+    cache, lock = _qr_cache()
+    payloads = set(qr_payloads)
+    with lock: qrs = {p: cache[p] for p in payloads if p in cache}
+    jobs = [("qr", p, p) for p in payloads if p not in qrs]
+    jobs += [("photo", k, v) for k, v in (photos or {}).items() if v and v[0]]
+    fitted, total = {}, len(jobs)
+
+    def collect(results):
+        for kind, key, data in results:
+            if kind == "qr":
+                qrs[key] = data
+                _remember_qr(key, data)
+            else: fitted[key] = data
+
+    done = 0
+    if total >= POOL_MIN_JOBS:
+        try:
+            futures = [_pool().submit(_run_batch, jobs[i:i + BATCH_SIZE]) for i in range(0, total, BATCH_SIZE)]
+            for fut in concurrent.futures.as_completed(futures):
+                res = fut.result()
+                collect(res)
+                done += len(res)
+                if progress: progress(done, total)
+            return qrs, fitted
+        except Exception:
+            # A dead pool is rebuilt next time; finish this run in-process.
+            _pool.clear()
+            jobs = [j for j in jobs if j[1] not in (qrs if j[0] == "qr" else fitted)]
+            done = total - len(jobs)
+
+    for i in range(0, len(jobs), BATCH_SIZE):
+        res = _run_batch(jobs[i:i + BATCH_SIZE])
+        collect(res)
+        done += len(res)
+        if progress: progress(done, total)
+    return qrs, fitted
+
+@st.cache_data(show_spinner=False)
+def _compose(size_mm, layers, stamps):
+    w, h = mm_to_px(size_mm[0]), mm_to_px(size_mm[1])
+    canvas = Image.new("RGBA", (w, h), (255, 255, 255, 255))
+    for source, (x, y, lw, lh) in layers:
+        box = (mm_to_px(x), mm_to_px(y), mm_to_px(lw), mm_to_px(lh))
+        if isinstance(source, tuple):
+            canvas.alpha_composite(Image.new("RGBA", box[2:], source + (255,)), box[:2])
+        elif source and os.path.exists(source):
+            try: canvas.alpha_composite(Image.open(source).convert("RGBA").resize(box[2:], Image.LANCZOS), box[:2])
+            except Exception: pass
+    buf = io.BytesIO()
+    canvas.convert("RGB").save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+def compose_template(size_mm, layers):
+    """Flattens the static artwork of a card into one JPEG, to be placed once per card.
+
+    layers are (source, (x, y, w, h) in mm) in paint order; source is an image path or an RGB tuple for a filled box.
+    Missing files are skipped, and the result is rebuilt whenever one of them changes.
+    """
+    stamps = tuple(os.path.getmtime(s) if isinstance(s, str) and os.path.exists(s) else None for s, _ in layers)
+    return _compose(tuple(size_mm), tuple(layers), stamps)
@@ -0,0 +1,186 @@
+import streamlit as st
+import pandas as pd
+import os
+import re
+import io
+import time
+import base64
+import threading
+import functools
+import concurrent.futures
+from PIL import Image, ImageOps
+from google.auth.transport.requests import AuthorizedSession
+from streamlit import runtime
+import sheets_store, api_metrics
+
+# ==========================================
+# SHARED STUDENT PHOTO STORE
+# ==========================================
+# Drive photos are downloaded once, shrunk to the sizes the pages actually
+# show and kept on local disk as PHOTO_DIR/<size>/<file_id>@<modifiedTime>.jpg,
+# so they survive restarts. Renders only ever read from disk; a file whose
+# copy is older than REVALIDATE_SECONDS is re-checked against Drive's
+# modifiedTime in the background and re-downloaded only if it changed.
+#
+# Pages get a photo as a Streamlit media file URL (/media/<content hash>.jpg)
+# rather than inlining it as base64 in every rerun. A media file exists only
+# while a session's current run refers to it, so a photo reaches the browser
+# only through a page the user is logged in to, and the same URL comes back
+# on each rerun, so the browser keeps its copy. Outside a running server
+# (bare scripts) the data URI is used instead. A file name never changes
+# content, so the bytes of the last IMAGE_CACHE_FILES thumbnails are kept in
+# memory.
+
+PHOTO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".photo_cache")
+IMAGE_CACHE_FILES = 4096
+SIZES = (85, 300)
+PIXEL_SCALE = 2  # rendered at 2x so roster thumbnails stay sharp on phone screens
+REVALIDATE_SECONDS = 6 * 3600
+RETRY_FAILED_SECONDS = 600
+FALLBACK_URL = "https://www.w3schools.com/howto/img_avatar.png"
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files/"
+
+@st.cache_resource
+def get_drive_session():
+    return api_metrics.instrument_session(AuthorizedSession(sheets_store.get_google_credentials()), "drive")
+
+@st.cache_resource
+def _index():
+    """file_id -> modifiedTime tag of the thumbnails on disk (rebuilt from PHOTO_DIR at startup), plus recent failures."""
+    index = {}
+    for size in SIZES:
+        folder = os.path.join(PHOTO_DIR, str(size))
+        os.makedirs(folder, exist_ok=True)
+        for name in os.listdir(folder):
+            if name.endswith(".jpg") and "@" in name:
+                file_id, tag = name[:-4].split("@", 1)
+                index[file_id] = tag
+    return index, {}, threading.Lock()
+
+@st.cache_resource
+def _background():
+    return concurrent.futures.ThreadPoolExecutor(max_workers=4), set(), threading.Lock()
+
+def extract_file_id(url):
+    if not isinstance(url, str) or pd.isna(url): return None
+    match = re.search(r"(?:id=|/d/)([\w-]+)", url)
+    return match.group(1) if match else None
+
+def _path(file_id, tag, size):
+    return os.path.join(PHOTO_DIR, str(size), f"{file_id}@{tag}.jpg")
+
+def _write_thumbnails(file_id, tag, raw):
+    img = ImageOps.exif_transpose(Image.open(io.BytesIO(raw))).convert("RGB")
+    for size in SIZES:
+        thumb = img.copy()
+        thumb.thumbnail((size * PIXEL_SCALE, size * PIXEL_SCALE))
+        tmp = _path(file_id, tag, size) + ".tmp"
+        thumb.save(tmp, "JPEG", quality=82, optimize=True)
+        os.replace(tmp, _path(file_id, tag, size))
+
+def _refresh(session, index, file_id):
+    """Brings the thumbnails of one Drive file up to date. Returns its tag (None if it was never fetched)."""
+    files, failed, lock = index
+    known = files.get(file_id)
+    # Broken links / missing permissions are not retried on every rerun.
+    if time.time() - failed.get(file_id, 0) < RETRY_FAILED_SECONDS: return known
+    try:
+        r = session.get(DRIVE_FILES_URL + file_id, params={"fields": "modifiedTime"})
+        r.raise_for_status()
+        tag = re.sub(r"\D", "", r.json().get("modifiedTime", "")) or "0"
+        if tag == known and all(os.path.exists(_path(file_id, tag, s)) for s in SIZES):
+            for s in SIZES: os.utime(_path(file_id, tag, s))
+            return tag
+        r = session.get(DRIVE_FILES_URL + file_id, params={"alt": "media"})
+        r.raise_for_status()
+        _write_thumbnails(file_id, tag, r.content)
+    except Exception:
+        with lock: failed[file_id] = time.time()
+        return known
+    with lock:
+        files[file_id] = tag
+        failed.pop(file_id, None)
+    if known and known != tag:
+        for s in SIZES:
+            try: os.remove(_path(file_id, known, s))
+            except OSError: pass
+    return tag
+
+def prefetch(urls):
+    """Queues every photo in urls (e.g. a whole class) for download/revalidation on a background worker."""
+    session, index = get_drive_session(), _index()
+    pool, in_flight, lock = _background()
+    for file_id in {f for f in map(extract_file_id, urls) if f}:
+        with lock:
+            if file_id in in_flight: continue
+            in_flight.add(file_id)
+        def job(fid=file_id):
+            try: _refresh(session, index, fid)
+            finally:
+                with lock: in_flight.discard(fid)
+        pool.submit(job)
+
+def _cached_path(file_id, size):
+    tag = _index()[0].get(file_id)
+    path = _path(file_id, tag, size) if tag else None
+    return path if path and os.path.exists(path) else None
+
+def _fresh_path(url, file_id, size):
+    path = _cached_path(file_id, size)
+    if path and time.time() - os.path.getmtime(path) > REVALIDATE_SECONDS: prefetch([url])
+    return path
+
+@functools.lru_cache(maxsize=IMAGE_CACHE_FILES)
+def _jpeg(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def _media_url(path):
+    """The session's media file URL for a cached thumbnail; None outside a running Streamlit server."""
+    try:
+        if not runtime.exists(): return None
+        url = runtime.get_instance().media_file_mgr.add(_jpeg(path), "image/jpeg", f"photo_store.{os.path.basename(path)}")
+    except Exception: return None
+    # Relative, so it resolves under a baseUrlPath or a hosting proxy prefix like st.image's URLs do.
+    return url.lstrip("/")
+
+def _as_uri(url, path):
+    if path: return _media_url(path) or f"data:image/jpeg;base64,{base64.b64encode(_jpeg(path)).decode()}"
+    if not isinstance(url, str) or pd.isna(url) or url == "": return FALLBACK_URL
+    return url if url.startswith("http") else FALLBACK_URL
+
+def _ensure(url, size):
+    file_id = extract_file_id(url)
+    if not file_id: return None
+    if _cached_path(file_id, size) is None: _refresh(get_drive_session(), _index(), file_id)
+    return _fresh_path(url, file_id, size)
+
+def _read(path):
+    if path is None: return None
+    with open(path, "rb") as f:
+        return f.read()
+
+def _ensure_many(urls, size):
+    ids = [extract_file_id(u) for u in urls]
+    missing = {f for f in ids if f and _cached_path(f, size) is None}
+    if missing:
+        session, index = get_drive_session(), _index()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as exe:
+            list(exe.map(lambda f: _refresh(session, index, f), missing))
+    return [_fresh_path(u, f, size) if f else None for u, f in zip(urls, ids)]
+
+def get_photo_bytes(url, size=85):
+    """JPEG thumbnail bytes for a Drive photo URL, or None. Downloads on first use, then serves from disk."""
+    return _read(_ensure(url, size))
+
+def get_photo_bytes_many(urls, size=85):
+    """get_photo_bytes() for a whole print run; only photos missing from disk are downloaded, in parallel."""
+    return [_read(p) for p in _ensure_many(urls, size)]
+
+def get_photo_uri(url, size=85):
+    """Drop-in for the old get_secure_photo_uri(): a media file URL for Drive photos, else the URL or the avatar."""
+    return _as_uri(url, _ensure(url, size))
+
+def get_photo_uris(urls, size=85):
+    """get_photo_uri() for a whole roster; only photos missing from disk are downloaded, in parallel."""
+    return [_as_uri(u, p) for u, p in zip(urls, _ensure_many(urls, size))]
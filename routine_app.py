@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 import pytz
 import time
 from streamlit_autorefresh import st_autorefresh
+import sheets_store, cache_registry, write_queue
 
 GS_FORMULA = '=IF(INDIRECT("C"&ROW())="RUNNING", "RUNNING", IFERROR(TEXT(MOD(INDIRECT("C"&ROW())-INDIRECT("B"&ROW()), 1), "h:mm"), ""))'
 
@@ -75,19 +76,40 @@ def init_connection():
 
 @st.cache_resource
 def get_cached_sheet(sheet_name):
-    return init_connection().open(sheet_name)
+    return sheets_store.open_spreadsheet(sheet_name)
 
-def smart_append_row(sheet, row_data):
-    sheet.append_row(row_data, value_input_option="USER_ENTERED")
+# activity_log and LOCATION_DATA only ever grow, so they are kept in the shared
+# sheets_store tables: each refresh downloads just the rows past the last one
+# seen (A{n+1}:L), and the whole sheet only when it shrank or was edited.
+ROUTINE_BOOK = "MY ROUTINE 2026"
+MONEY_BOOK = "sk_money_location"
 
-def smart_append_multiple(sheet, rows_data):
-    if not rows_data: return
-    sheet.append_rows(rows_data, value_input_option="USER_ENTERED")
+def refresh_ecosystem(log_edited=False):
+    """Drops the cached ecosystem; log_edited=True also forces a full re-read of activity_log (rows changed in place)."""
+    if log_edited: sheets_store.invalidate(ROUTINE_BOOK, "activity_log")
+    get_all_ecosystem_data.clear()
 
-@st.cache_data(ttl=300, show_spinner="⚡ Booting up ecosystem (Ultra-Fast)...") 
+# Appends go through the write queue: saved locally at once, then sent paced and
+# merged with any other queued rows of the same worksheet.
+def smart_append_row(worksheet, row_data):
+    write_queue.append_row(ROUTINE_BOOK, worksheet, row_data, user_entered=True)
+
+def smart_append_multiple(worksheet, rows_data):
+    for row in rows_data: write_queue.append_row(ROUTINE_BOOK, worksheet, row, user_entered=True)
+
+def drain_routine_queue():
+    """Sends queued activity_log / future_tasks rows before a row is edited in place; False if Google can't be reached."""
+    try:
+        for ws in ("activity_log", "future_tasks"): write_queue.drain(ROUTINE_BOOK, ws)
+        return True
+    except Exception:
+        st.error("⚠️ Queued entries could not be synced yet. Try again in a moment.")
+        return False
+
+@cache_registry.cached(ROUTINE_BOOK, ttl=300, show_spinner="⚡ Booting up ecosystem (Ultra-Fast)...") 
 def get_all_ecosystem_data():
-    main_ss = get_cached_sheet("MY ROUTINE 2026")
-    money_ss = get_cached_sheet("sk_money_location")
+    main_ss = get_cached_sheet(ROUTINE_BOOK)
+    money_ss = get_cached_sheet(MONEY_BOOK)
     dash_ss = get_cached_sheet("Personal_Dashboard_Data")
     
     def process_raw(data, expected_cols, column_names):
@@ -100,18 +122,16 @@ def get_all_ecosystem_data():
         return pd.DataFrame(records, columns=column_names)
 
     try:
-        main_ranges = ['routine_master', 'activity_log', 'future_tasks', 'holidays', 'must_do', 'PRE', 'prep_checklists']
+        main_ranges = ['routine_master', 'future_tasks', 'holidays', 'must_do', 'PRE', 'prep_checklists']
         main_res = main_ss.values_batch_get(main_ranges).get('valueRanges', [])
         rm_data = main_res[0].get('values', [])
-        al_data = main_res[1].get('values', [])
-        ft_data = main_res[2].get('values', [])
-        hol_data = main_res[3].get('values', [])
-        md_data = main_res[4].get('values', [])
-        pre_data = main_res[5].get('values', [])
-        prep_data = main_res[6].get('values', [])
+        ft_data = main_res[1].get('values', [])
+        hol_data = main_res[2].get('values', [])
+        md_data = main_res[3].get('values', [])
+        pre_data = main_res[4].get('values', [])
+        prep_data = main_res[5].get('values', [])
     except Exception:
         rm_data = main_ss.worksheet("routine_master").get_all_values()
-        al_data = main_ss.worksheet("activity_log").get_all_values()
         try: ft_data = main_ss.worksheet("future_tasks").get_all_values()
         except: ft_data = []
         try: hol_data = main_ss.worksheet("holidays").get_all_values()
@@ -123,6 +143,12 @@ def get_all_ecosystem_data():
         try: prep_data = main_ss.worksheet("prep_checklists").get_all_values()
         except: prep_data = []
 
+    try: al_data = sheets_store.read_values(ROUTINE_BOOK, "activity_log", ttl=0)
+    except Exception: al_data = main_ss.worksheet("activity_log").get_all_values()
+    # Rows still in the write queue show up straight away, at the row numbers they will get.
+    if al_data: al_data = al_data + write_queue.pending_values(ROUTINE_BOOK, "activity_log")
+    if ft_data: ft_data = ft_data + write_queue.pending_values(ROUTINE_BOOK, "future_tasks")
+
     df = process_raw(rm_data, 12, ["Day", "Start_Time", "End_Time", "Duration", "Activity", "Sub_Activities", "check_list", "App", "Role", "Urgent", "Important", "Energy_Level"])
     df = df[df["Day"].astype(str).str.strip() != ""]
     df["Activity"] = df["Activity"].astype(str).str.strip().str.upper()
@@ -148,12 +174,12 @@ def get_all_ecosystem_data():
     prep_chk_df = prep_chk_df[prep_chk_df["Type"].astype(str).str.strip() != ""]
 
     try:
-        money_res = money_ss.values_batch_get(['PAYMENT_CHECKLIST', 'LOCATION_DATA']).get('valueRanges', [])
-        pay_data = money_res[0].get('values', [])
-        loc_data_vals = money_res[1].get('values', [])
+        pay_data = money_ss.values_batch_get(['PAYMENT_CHECKLIST']).get('valueRanges', [])[0].get('values', [])
     except:
         try: pay_data = money_ss.worksheet("PAYMENT_CHECKLIST").get_all_values()
         except: pay_data = []
+    try: loc_data_vals = sheets_store.read_values(MONEY_BOOK, "LOCATION_DATA", ttl=0)
+    except:
         try: loc_data_vals = money_ss.worksheet("LOCATION_DATA").get_all_values()
         except: loc_data_vals = []
 
@@ -164,7 +190,7 @@ def get_all_ecosystem_data():
     if loc_data_vals and len(loc_data_vals) > 1:
         headers = loc_data_vals[0]
         max_len = len(headers)
-        recs = [r + [""] * (max_len - len(r)) for r in loc_data_vals[1:] if r]
+        recs = [r + [""] * (max_len - len(r)) for r in loc_data_vals[1:] if any(r)]
         loc_df = pd.DataFrame([r[:max_len] for r in recs], columns=headers)
     else:
         loc_df = pd.DataFrame()
@@ -251,7 +277,8 @@ try:
     col1, col2 = st.columns([8, 2])
     with col2:
         if st.button("🔄 Sync", use_container_width=True):
-            get_all_ecosystem_data.clear()
+            sheets_store.invalidate(MONEY_BOOK, "LOCATION_DATA")
+            refresh_ecosystem(log_edited=True)
             st.toast("✅ Force Synced with Google Sheets!")
             time.sleep(1.0)
             st.rerun()
@@ -444,7 +471,7 @@ try:
                         with col_run:
                             if st.button("▶️ Run Task", key=f"run_sp_{r['row_index']}", use_container_width=True):
                                 main_ss = get_cached_sheet("MY ROUTINE 2026")
-                                smart_append_row(main_ss.worksheet("activity_log"), [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, str(r['Activity']).upper(), str(r['Task_Name']).strip(), "", "Started from Special Tasks"])
+                                smart_append_row("activity_log", [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, str(r['Activity']).upper(), str(r['Task_Name']).strip(), "", "Started from Special Tasks"])
                                 get_all_ecosystem_data.clear() 
                                 st.rerun()
                         with col_manage:
@@ -462,26 +489,28 @@ try:
                                     with col_t: new_time = st.selectbox("Time", options=time_opts, index=time_opts.index(curr_time_str), key=f"nt_{r['row_index']}")
                                         
                                     if st.button("Save", key=f"rs_btn_{r['row_index']}", type="primary", use_container_width=True):
+                                        if not drain_routine_queue(): st.stop()
                                         main_ss = get_cached_sheet("MY ROUTINE 2026")
                                         fsheet = main_ss.worksheet("future_tasks")
                                         
                                         try: fsheet.update(range_name=f"A{int(r['row_index'])}:B{int(r['row_index'])}", values=[[new_date.strftime('%Y-%m-%d'), new_time]], value_input_option="USER_ENTERED")
                                         except TypeError: fsheet.update(f"A{int(r['row_index'])}:B{int(r['row_index'])}", [[new_date.strftime('%Y-%m-%d'), new_time]], value_input_option="USER_ENTERED")
                                         
-                                        smart_append_row(main_ss.worksheet("activity_log"), [today_str, now.strftime('%H:%M'), now.strftime('%H:%M'), GS_FORMULA, str(r['Activity']).upper(), "", f"{r['Task_Name']} [RESCHEDULED]", f"Moved to {new_date.strftime('%Y-%m-%d')} {new_time}"])
+                                        smart_append_row("activity_log", [today_str, now.strftime('%H:%M'), now.strftime('%H:%M'), GS_FORMULA, str(r['Activity']).upper(), "", f"{r['Task_Name']} [RESCHEDULED]", f"Moved to {new_date.strftime('%Y-%m-%d')} {new_time}"])
                                         get_all_ecosystem_data.clear() 
                                         st.rerun()
                                 with tab_cancel:
                                     cancel_reason = st.text_input("Reason", placeholder="Why cancel?", key=f"rsn_{r['row_index']}", label_visibility="collapsed")
                                     if st.button("Confirm", key=f"cnf_{r['row_index']}", type="primary", use_container_width=True):
                                         if cancel_reason.strip():
+                                            if not drain_routine_queue(): st.stop()
                                             main_ss = get_cached_sheet("MY ROUTINE 2026")
                                             fsheet = main_ss.worksheet("future_tasks")
                                             
                                             try: fsheet.update(range_name=f"G{int(r['row_index'])}:H{int(r['row_index'])}", values=[["Canceled", cancel_reason]], value_input_option="USER_ENTERED")
                                             except TypeError: fsheet.update(f"G{int(r['row_index'])}:H{int(r['row_index'])}", [["Canceled", cancel_reason]], value_input_option="USER_ENTERED")
                                             
-                                            smart_append_row(main_ss.worksheet("activity_log"), [today_str, now.strftime('%H:%M'), now.strftime('%H:%M'), GS_FORMULA, str(r['Activity']).upper(), "", f"{r['Task_Name']} [CANCELED]", f"Cancel Reason: {cancel_reason}"])
+                                            smart_append_row("activity_log", [today_str, now.strftime('%H:%M'), now.strftime('%H:%M'), GS_FORMULA, str(r['Activity']).upper(), "", f"{r['Task_Name']} [CANCELED]", f"Cancel Reason: {cancel_reason}"])
                                             get_all_ecosystem_data.clear() 
                                             st.rerun()
                         
@@ -537,7 +566,7 @@ try:
                                     st.button(f"⏳ {p_task}{dur_str}", key=f"pre_run_{idx}", disabled=True, use_container_width=True)
                                 elif st.button(f"▶️ {p_task}{dur_str}", key=f"pre_btn_{idx}", use_container_width=True):
                                     main_ss = get_cached_sheet("MY ROUTINE 2026")
-                                    smart_append_row(main_ss.worksheet("activity_log"), [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, p_cat, p_task, "", "PRE Task"])
+                                    smart_append_row("activity_log", [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, p_cat, p_task, "", "PRE Task"])
                                     get_all_ecosystem_data.clear()
                                     st.rerun()
 
@@ -594,7 +623,7 @@ try:
                                     st.button(f"⏳ {md_task}{dur_str}", key=f"md_run_{idx}", disabled=True, use_container_width=True)
                                 elif st.button(f"▶️ {md_task}{dur_str}", key=f"md_btn_{idx}", use_container_width=True):
                                     main_ss = get_cached_sheet("MY ROUTINE 2026")
-                                    smart_append_row(main_ss.worksheet("activity_log"), [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, md_cat, md_task, "", "Must Do Task"])
+                                    smart_append_row("activity_log", [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, md_cat, md_task, "", "Must Do Task"])
                                     get_all_ecosystem_data.clear()
                                     st.rerun()
 
@@ -614,8 +643,8 @@ try:
                         if checked and not is_done:
                             log_act = current_activity
                             main_ss = get_cached_sheet("MY ROUTINE 2026")
-                            smart_append_row(main_ss.worksheet("activity_log"), [today_str, now.strftime('%H:%M'), now.strftime('%H:%M'), GS_FORMULA, log_act, "", task, "Checked off"])
-                            if "[Due:" in task:
+                            smart_append_row("activity_log", [today_str, now.strftime('%H:%M'), now.strftime('%H:%M'), GS_FORMULA, log_act, "", task, "Checked off"])
+                            if "[Due:" in task and drain_routine_queue():
                                 matches = future_df[(future_df['Task_Name'].str.strip() == task.split(" [Due:")[0].strip()) & (future_df['Type'] == 'Checklist')]
                                 if not matches.empty:
                                     main_ss.worksheet("future_tasks").update_cell(int(matches.iloc[0]['row_index']), 7, "Completed") 
@@ -663,6 +692,7 @@ try:
                     col_stop, col_cancel = st.columns(2)
                     with col_stop:
                         if st.button("🛑 SAVE", key=f"save_{sheet_row}", use_container_width=True, type="primary"):
+                            if not drain_routine_queue(): st.stop()
                             main_ss = get_cached_sheet("MY ROUTINE 2026")
                             log_sheet = main_ss.worksheet("activity_log")
                             
@@ -677,14 +707,15 @@ try:
                                 matches = future_df[(future_df['Task_Name'].str.strip() == str(active_row['Sub_Activities']).split(" [Due:")[0].strip()) & (future_df['Type'] == 'Sub-Activity')]
                                 if not matches.empty:
                                     main_ss.worksheet("future_tasks").update_cell(int(matches.iloc[0]['row_index']), 7, "Completed") 
-                            get_all_ecosystem_data.clear() 
+                            refresh_ecosystem(log_edited=True)
                             st.rerun()
 
                     with col_cancel:
                         if st.button("❌ CANCEL", key=f"cancel_{sheet_row}", use_container_width=True):
+                            if not drain_routine_queue(): st.stop()
                             main_ss = get_cached_sheet("MY ROUTINE 2026")
                             main_ss.worksheet("activity_log").delete_rows(sheet_row)
-                            get_all_ecosystem_data.clear() 
+                            refresh_ecosystem(log_edited=True)
                             st.rerun()
             
             avail_subs = [t for t in sub_list if t not in running_tasks['Sub_Activities'].tolist()]
@@ -699,7 +730,7 @@ try:
                             with cols[j]:
                                 if st.button(f"▶️ {task}" + ("" if "[Due:" in task else f"\n(Last: {get_last_done_str(task, log_df, now, col_name='Sub_Activities')})"), key=f"btn_{i+j}_{task}", use_container_width=True):
                                     main_ss = get_cached_sheet("MY ROUTINE 2026")
-                                    smart_append_row(main_ss.worksheet("activity_log"), [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, current_activity, task, "", "Auto-logged via Timer"])
+                                    smart_append_row("activity_log", [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, current_activity, task, "", "Auto-logged via Timer"])
                                     get_all_ecosystem_data.clear() 
                                     st.rerun()
 
@@ -721,7 +752,7 @@ try:
 
             if st.form_submit_button("⚡ Quick Start (Update Details Later)", use_container_width=True):
                 main_ss = get_cached_sheet("MY ROUTINE 2026")
-                smart_append_row(main_ss.worksheet("activity_log"), [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, "PEOPLE", "VISITOR", "", "Update details later"])
+                smart_append_row("activity_log", [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, "PEOPLE", "VISITOR", "", "Update details later"])
                 get_all_ecosystem_data.clear() 
                 st.rerun()
 
@@ -738,7 +769,7 @@ try:
                 
                 if st.form_submit_button("▶️ Start with Details", type="primary", use_container_width=True):
                     main_ss = get_cached_sheet("MY ROUTINE 2026")
-                    smart_append_row(main_ss.worksheet("activity_log"), [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, "PEOPLE", f"{interaction_type} - {(person_name.strip() if person_name else 'Unknown')}".upper(), "", f"Topic: {topic_talk} | Purpose: {purpose_visit}"])
+                    smart_append_row("activity_log", [today_str, now.strftime('%H:%M'), "RUNNING", GS_FORMULA, "PEOPLE", f"{interaction_type} - {(person_name.strip() if person_name else 'Unknown')}".upper(), "", f"Topic: {topic_talk} | Purpose: {purpose_visit}"])
                     get_all_ecosystem_data.clear() 
                     st.rerun()
 
@@ -771,7 +802,7 @@ try:
                     if f_name:
                         main_ss = get_cached_sheet("MY ROUTINE 2026")
                         
-                        smart_append_row(main_ss.worksheet("future_tasks"), [
+                        smart_append_row("future_tasks", [
                             f_date.strftime('%Y-%m-%d'), 
                             f_time.strftime('%H:%M'), 
                             final_act, 
@@ -845,7 +876,7 @@ try:
             if st.button("💾 Save to Activity Log", use_container_width=True, type="primary"):
                 if log_activity:
                     main_ss = get_cached_sheet("MY ROUTINE 2026")
-                    smart_append_row(main_ss.worksheet("activity_log"), [
+                    smart_append_row("activity_log", [
                         log_date.strftime('%Y-%m-%d'), f"{s_hour}:{s_min}", f"{e_hour}:{e_min}", GS_FORMULA, 
                         log_activity.upper().strip(), log_sub_activity.title().strip(), log_chk.strip(), log_notes,
                         log_role, str(log_urg), str(log_imp), log_energy
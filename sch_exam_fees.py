@@ -1,14 +1,11 @@
 import streamlit as st
-import gspread
 import pandas as pd
 from datetime import datetime, timedelta
 import pytz
 import plotly.express as px
-import re
-import base64
 from google.oauth2.service_account import Credentials
-from google.auth.transport.requests import AuthorizedSession
 from gspread.exceptions import WorksheetNotFound
+import sheets_store, photo_store, mdm_index
 
 # --- GATEKEEPER SECURITY CHECK ---
 if 'authenticated' not in st.session_state or not st.session_state.authenticated:
@@ -36,7 +33,7 @@ def ensure_worksheet(sh, title, headers):
         ws.append_row(headers)
     return ws
 
-# --- AUTHENTICATION & SECURE IMAGE FETCHING ---
+# --- AUTHENTICATION ---
 @st.cache_resource
 def get_google_credentials(): 
     return Credentials.from_service_account_info(
@@ -45,27 +42,7 @@ def get_google_credentials():
     )
 
 def get_gspread_client():
-    return gspread.authorize(get_google_credentials())
-
-@st.cache_resource
-def get_drive_session(): 
-    return AuthorizedSession(get_google_credentials())
-
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_secure_image_bytes(file_id):
-    try:
-        r = get_drive_session().get(f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media")
-        return r.content if r.status_code == 200 else None
-    except: return None
-
-def get_secure_photo_uri(url):
-    fb = "https://www.w3schools.com/howto/img_avatar.png"
-    if pd.isna(url) or url == "" or not isinstance(url, str): return fb
-    match = re.search(r"(?:id=|/d/)([\w-]+)", url)
-    if match:
-        b = fetch_secure_image_bytes(match.group(1))
-        if b: return f"data:image/jpeg;base64,{base64.b64encode(b).decode()}"
-    return url if url.startswith("http") else fb
+    return sheets_store.get_client()
 
 try:
     _test_gc = get_gspread_client()
@@ -74,30 +51,36 @@ except Exception as e:
     st.stop()
 
 # --- DATA LOADING ---
-@st.cache_data(ttl=600)
-def load_data():
-    gc = get_gspread_client()
-    
-    bps_sheet = gc.open("BPS_Database")
-    ws_students = bps_sheet.worksheet("students_master")
-    ws_teachers = bps_sheet.worksheet("TEACHERS_DETAIL")
-    ws_mdm = bps_sheet.worksheet("mdm_log")
-    
-    df_students = pd.DataFrame(ws_students.get_all_records())
-    df_teachers = pd.DataFrame(ws_teachers.get_all_records())
-    df_mdm = pd.DataFrame(ws_mdm.get_all_records())
-    
-    fees_sheet = gc.open("SCH_Exam_Fees")
-    ws_fees = ensure_worksheet(fees_sheet, "Sheet1", ["Date", "Name", "Class", "Section", "Roll", "Amount", "Payer_Type", "Teacher_Involved", "Collection Type", "Handover_Status"])
-    df_fees = pd.DataFrame(ws_fees.get_all_records())
-    
-    # Load Britti Eligibility List
-    ws_britti = ensure_worksheet(fees_sheet, "Britti_List", ["Class", "Section", "Roll", "Name"])
-    df_britti = pd.DataFrame(ws_britti.get_all_records())
+FEES_SHEETS = {
+    "Sheet1": ["Date", "Name", "Class", "Section", "Roll", "Amount", "Payer_Type", "Teacher_Involved", "Collection Type", "Handover_Status"],
+    "Britti_List": ["Class", "Section", "Roll", "Name"],
+    "Investigation_List": ["Class", "Section", "Roll", "Name", "Collection Type", "Date_Flagged", "Status"],
+}
+
+def clear_data_cache():
+    sheets_store.invalidate("SCH_Exam_Fees")
 
-    # Load Investigation List
-    ws_investigate = ensure_worksheet(fees_sheet, "Investigation_List", ["Class", "Section", "Roll", "Name", "Collection Type", "Date_Flagged", "Status"])
-    df_investigate = pd.DataFrame(ws_investigate.get_all_records())
+def fetch_mdm_rows(start, end=None):
+    """mdm_log rows for one date string, or for a (start, end) range of dates."""
+    try: return mdm_index.rows_on(start) if end is None else mdm_index.rows_between(start, end)
+    except Exception: return pd.DataFrame()
+
+def load_data():
+    # One batched fetch per spreadsheet, both spreadsheets at once.
+    frames, timings = sheets_store.read_sheets({
+        "BPS_Database": ["students_master", "TEACHERS_DETAIL"],
+        "SCH_Exam_Fees": list(FEES_SHEETS),
+    }, ttl=600)
+    st.session_state.fees_load_timings = timings
+
+    missing = [t for t in FEES_SHEETS if ("SCH_Exam_Fees", t) not in frames]
+    if missing:
+        sh = sheets_store.open_spreadsheet("SCH_Exam_Fees")
+        for title in missing: ensure_worksheet(sh, title, FEES_SHEETS[title])
+
+    df_students = frames.get(("BPS_Database", "students_master"), pd.DataFrame())
+    df_teachers = frames.get(("BPS_Database", "TEACHERS_DETAIL"), pd.DataFrame())
+    df_fees, df_britti, df_investigate = (frames.get(("SCH_Exam_Fees", t), pd.DataFrame(columns=h)) for t, h in FEES_SHEETS.items())
     
     if not df_fees.empty:
         df_fees['_Row_Num'] = range(2, len(df_fees) + 2)
@@ -106,15 +89,18 @@ def load_data():
             if 'Teacher_Involved' in df_fees.columns:
                 df_fees.loc[df_fees['Teacher_Involved'] == 'SUKHAMAY KISKU', 'Handover_Status'] = 'Settled'
     
-    return df_students, df_teachers, df_fees, df_mdm, df_britti, df_investigate
+    return df_students, df_teachers, df_fees, df_britti, df_investigate
 
 try:
     with st.spinner("Connecting to BPS Database..."):
-        df_students, df_teachers, df_fees, df_mdm, df_britti, df_investigate = load_data()
+        df_students, df_teachers, df_fees, df_britti, df_investigate = load_data()
 except Exception as e:
     st.error(f"Error loading data. Ensure the sheets are named correctly. Details: {e}")
     st.stop()
 
+if st.session_state.user_role == "admin" and st.session_state.get("fees_load_timings"):
+    st.caption("⏱️ Sheet sync: " + " · ".join(f"{name} {secs:.2f}s" for name, secs in st.session_state.fees_load_timings.items()))
+
 # --- APP LAYOUT (Tabs Dynamic Routing) ---
 if st.session_state.user_role == "admin":
     tab_pending, tab1, tab2, tab_britti, tab3 = st.tabs(["⚠️ Pending Fees", "📝 Record Funds", "📊 Dashboard", "🏆 Britti Selection", "🤝 Handover Manager"])
@@ -130,7 +116,8 @@ with tab_pending:
         st.subheader("⚠️ Pending Fees Tracker")
     with col_btn:
         if st.button("🔄 Refresh List", use_container_width=True):
-            load_data.clear()
+            sheets_store.invalidate("BPS_Database")
+            clear_data_cache()
             st.rerun()
             
     c_type, c_tog = st.columns(2)
@@ -172,27 +159,22 @@ with tab_pending:
 
         # 2. Filter by MDM if toggle is ON
         if filter_mdm:
-            if df_mdm.empty or 'Date' not in df_mdm.columns:
-                st.info("🌸 **Gentle Reminder:** No attendance (MDM) records found. Please complete attendance first.")
+            today_mdm = fetch_mdm_rows(today_str)
+            if not today_mdm.empty and st.session_state.user_role == "teacher":
+                today_mdm = today_mdm[today_mdm['Teacher'].astype(str).str.strip() == st.session_state.user_name]
+                
+            if today_mdm.empty:
+                st.info("🌸 **Gentle Reminder:** You haven't taken today's attendance (MDM Entry) yet, or no students are marked present.")
                 can_proceed = False
             else:
-                today_mdm = df_mdm[df_mdm['Date'].astype(str).str.strip() == today_str].copy()
+                today_mdm['Match_Key'] = today_mdm.apply(lambda r: safe_key(r.get('Class',''), r.get('Roll',''), r.get('Name','')), axis=1)
+                present_keys = today_mdm['Match_Key'].tolist()
                 
-                if st.session_state.user_role == "teacher":
-                    today_mdm = today_mdm[today_mdm['Teacher'].astype(str).str.strip() == st.session_state.user_name]
-                    
-                if today_mdm.empty:
-                    st.info("🌸 **Gentle Reminder:** You haven't taken today's attendance (MDM Entry) yet, or no students are marked present.")
+                final_target = base_target[base_target['Match_Key'].isin(present_keys)].copy()
+                
+                if final_target.empty:
+                    st.success(f"No {pending_fee_type} students from your list are present today.")
                     can_proceed = False
-                else:
-                    today_mdm['Match_Key'] = today_mdm.apply(lambda r: safe_key(r.get('Class',''), r.get('Roll',''), r.get('Name','')), axis=1)
-                    present_keys = today_mdm['Match_Key'].tolist()
-                    
-                    final_target = base_target[base_target['Match_Key'].isin(present_keys)].copy()
-                    
-                    if final_target.empty:
-                        st.success(f"No {pending_fee_type} students from your list are present today.")
-                        can_proceed = False
         else:
             # MDM off: Show all in base target
             final_target = base_target.copy()
@@ -267,8 +249,7 @@ with tab_pending:
                     new_flags = combined_edits[combined_edits['Investigate 🔍'] == True]
                     
                     if not new_flags.empty:
-                        gc_write = get_gspread_client()
-                        ws_invest = gc_write.open("SCH_Exam_Fees").worksheet("Investigation_List")
+                        ws_invest = sheets_store.worksheet_handle("SCH_Exam_Fees", "Investigation_List")
                         
                         for _, r in new_flags.iterrows():
                             ws_invest.append_row([
@@ -276,7 +257,7 @@ with tab_pending:
                                 pending_fee_type, today_str, 'Investigating'
                             ])
                             
-                        load_data.clear()
+                        clear_data_cache()
                         st.success(f"Successfully moved {len(new_flags)} student(s) to the Investigation List!")
                         st.rerun()
                     else:
@@ -309,9 +290,7 @@ with tab_pending:
                     new_inv_df = df_investigate[~df_investigate.apply(lambda r: safe_key(r.get('Class',''), r.get('Roll',''), r.get('Name','')), axis=1).isin(resolved_keys)]
                     
                     # Rewrite the sheet
-                    gc_write = get_gspread_client()
-                    sh = gc_write.open("SCH_Exam_Fees")
-                    ws_invest = sh.worksheet("Investigation_List")
+                    ws_invest = sheets_store.worksheet_handle("SCH_Exam_Fees", "Investigation_List")
                     ws_invest.clear()
                     
                     if not new_inv_df.empty:
@@ -319,7 +298,7 @@ with tab_pending:
                     else:
                         ws_invest.append_row(["Class", "Section", "Roll", "Name", "Collection Type", "Date_Flagged", "Status"])
                     
-                    load_data.clear()
+                    clear_data_cache()
                     st.success(f"Resolved {len(resolved_rows)} investigation(s)!")
                     st.rerun()
 
@@ -401,10 +380,8 @@ with tab1:
         filtered_students['Roll_Numeric'] = pd.to_numeric(filtered_students['Roll'], errors='coerce').fillna(999)
         filtered_students = filtered_students.sort_values('Roll_Numeric')
         
-        if not df_mdm.empty and 'Date' in df_mdm.columns:
-            df_mdm['Parsed_Date'] = pd.to_datetime(df_mdm['Date'], errors='coerce', dayfirst=True).dt.date
-            ten_days_ago = receipt_date - timedelta(days=10)
-            recent_mdm = df_mdm[(df_mdm['Parsed_Date'] >= ten_days_ago) & (df_mdm['Parsed_Date'] <= receipt_date)]
+        recent_mdm = fetch_mdm_rows(receipt_date - timedelta(days=10), receipt_date)
+        if not recent_mdm.empty:
             present_keys = set(zip(
                 recent_mdm['Class'].astype(str), 
                 recent_mdm['Section'].astype(str), 
@@ -453,7 +430,7 @@ with tab1:
         col_profile, col_action = st.columns([1, 4])
         
         with col_profile:
-            secure_uri = get_secure_photo_uri(raw_thumb_url)
+            secure_uri = photo_store.get_photo_uri(raw_thumb_url)
             st.image(secure_uri, width=85)
 
         with col_action:
@@ -531,11 +508,10 @@ with tab1:
                         handover_status 
                     ]
                     
-                    gc_write = get_gspread_client()
-                    ws_fees_write = gc_write.open("SCH_Exam_Fees").worksheet("Sheet1")
+                    ws_fees_write = sheets_store.worksheet_handle("SCH_Exam_Fees", "Sheet1")
                     ws_fees_write.append_row(new_row)
                     
-                    load_data.clear()
+                    clear_data_cache()
                     
                     action_word = "collected from" if final_amount > 0 else "returned to"
                     st.success(f"✅ Successfully {action_word} {pure_name} (₹{abs(final_amount)} for {collection_type})!")
@@ -551,7 +527,7 @@ with tab2:
     st.subheader("Collection Overview")
     
     if st.button("🔄 Refresh Dashboard Data"):
-        load_data.clear()
+        clear_data_cache()
         st.rerun()
         
     dash_df = df_fees.copy()
@@ -745,8 +721,7 @@ if st.session_state.user_role == "admin":
                     
                 final_britti = pd.concat([other_classes_britti, pd.DataFrame(new_append)], ignore_index=True)
                 
-                gc_write = get_gspread_client()
-                sh = gc_write.open("SCH_Exam_Fees")
+                sh = sheets_store.open_spreadsheet("SCH_Exam_Fees")
                 ws = ensure_worksheet(sh, "Britti_List", ["Class", "Section", "Roll", "Name"])
                 ws.clear()
                 
@@ -755,7 +730,7 @@ if st.session_state.user_role == "admin":
                 else:
                     ws.append_row(["Class", "Section", "Roll", "Name"])
                     
-                load_data.clear()
+                clear_data_cache()
                 st.success(f"Successfully saved {len(new_append)} Britti students for {b_class}!")
                 st.rerun()
 
@@ -798,11 +773,10 @@ if st.session_state.user_role == "admin":
                     if st.button("✅ Confirm Receipt of Cash", type="primary"):
                         with st.spinner(f"Verifying receipt of cash from {selected_teacher}..."):
                             try:
-                                gc_write = get_gspread_client()
-                                ws_fees_write = gc_write.open("SCH_Exam_Fees").worksheet("Sheet1")
+                                ws_fees_write = sheets_store.worksheet_handle("SCH_Exam_Fees", "Sheet1")
                                 for r_num in selected_rows['_Row_Num']:
                                     ws_fees_write.update_cell(r_num, handover_col_idx, 'Handed Over')
-                                load_data.clear()
+                                clear_data_cache()
                                 st.success("Cash securely reconciled and recorded!")
                                 st.rerun()
                             except Exception as e:
@@ -5,15 +5,13 @@ if st.button("⬅️ Back to BPS Home", type="secondary"):
 st.write("---") 
 # -------------------
 import pandas as pd
-import base64
-import re
 import os
 import gspread
 from gspread.exceptions import WorksheetNotFound, APIError
 from google.oauth2.service_account import Credentials
-from google.auth.transport.requests import AuthorizedSession
 import datetime
 from fpdf import FPDF
+import sheets_store, photo_store
 
 # --- 1. SECURE GOOGLE CONNECTION ---
 @st.cache_resource
@@ -28,65 +26,25 @@ def init_gsheets():
     gc = gspread.authorize(creds)
     return gc.open("BPS_Database")
 
-@st.cache_resource
-def get_drive_session():
-    creds = get_google_credentials()
-    return AuthorizedSession(creds)
-
 sh = init_gsheets()
 
 # --- 2. DATABASE HELPER FUNCTIONS ---
-@st.cache_data(ttl=5) 
 def fetch_sheet_data(sheet_name):
     try:
-        ws = sh.worksheet(sheet_name)
-        df = pd.DataFrame(ws.get_all_records())
-        df = df.replace({'TRUE': True, 'FALSE': False, 'True': True, 'False': False}).infer_objects(copy=False)
-        return df
+        return sheets_store.read_sheet("BPS_Database", sheet_name, ttl=5)
     except:
         return pd.DataFrame()
 
-def clear_sheet_cache():
-    fetch_sheet_data.clear()
-
 def append_sheet_df(sheet_name, df):
     if df.empty: return
     try: 
-        ws = sh.worksheet(sheet_name)
+        sheets_store.get_table("BPS_Database", sheet_name).handle()
     except WorksheetNotFound:
         ws = sh.add_worksheet(title=sheet_name, rows=1000, cols=20)
         ws.append_row(list(df.columns))
     
     df = df.fillna("").astype(str)
-    ws.append_rows(df.values.tolist())
-    clear_sheet_cache()
-
-# --- 3. SECURE IMAGE FETCHING ---
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_secure_image_bytes(file_id):
-    try:
-        authed_session = get_drive_session()
-        url = f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media"
-        response = authed_session.get(url)
-        if response.status_code == 200: return response.content
-        return None
-    except Exception: return None
-
-def get_secure_photo_uri(url):
-    fallback_image = "https://www.w3schools.com/howto/img_avatar.png"
-    if pd.isna(url) or url == "" or not isinstance(url, str): return fallback_image
-
-    file_id = None
-    match = re.search(r"(?:id=|/d/)([\w-]+)", url)
-    if match: file_id = match.group(1)
-
-    if file_id:
-        image_bytes = fetch_secure_image_bytes(file_id)
-        if image_bytes:
-            b64_str = base64.b64encode(image_bytes).decode()
-            return f"data:image/jpeg;base64,{b64_str}"
-            
-    return url if url.startswith("http") else fallback_image
+    sheets_store.append_rows("BPS_Database", sheet_name, df.values.tolist())
 
 # --- START NEW APP UI BELOW ---
 
@@ -771,7 +729,7 @@ with tab_search:
                     if photo_url == 'nan' or not photo_url:
                         photo_url = str(row.get('Thumb_URL', '')).strip()
                         
-                    img_uri = get_secure_photo_uri(photo_url)
+                    img_uri = photo_store.get_photo_uri(photo_url)
                     
                     c1, c2 = st.columns(2)
                     
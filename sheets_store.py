@@ -0,0 +1,758 @@
+import streamlit as st
+import pandas as pd
+import os
+import json
+import threading
+import time
+import re
+import zlib
+import math
+import random
+import numbers
+import concurrent.futures
+import gspread
+import requests
+from gspread.utils import numericise, numericise_all, rowcol_to_a1
+from google.oauth2.service_account import Credentials
+import api_metrics
+
+api_metrics.install()
+
+# ==========================================
+# SHARED SHEETS DATA LAYER
+# ==========================================
+# One in-memory DataFrame per (spreadsheet, worksheet) for the whole server
+# process. Pages read through read_sheet(); once a copy is older than the
+# caller's ttl, only the rows appended since the last sync are downloaded.
+# A full reload happens on first use, when the header or the last known row
+# has changed (rows deleted / sheet rewritten), and when a cell was edited in
+# the middle of the sheet. For the last case every tail sync also re-reads a
+# window of already-known rows, moving through the sheet from one sync to the
+# next, and compares a CRC32 of it with the cached rows. The window grows
+# with the time since the last probe (never below PROBE_ROWS), so one pass
+# over the whole sheet takes at most PROBE_PASS_SECONDS however often it is
+# synced, and a hand edit anywhere is noticed within that time without ever
+# downloading the sheet on a timer.
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive.readonly"]
+PROBE_PASS_SECONDS = 1800
+PROBE_ROWS = 50
+BOOL_VALUES = {'TRUE': True, 'FALSE': False, 'True': True, 'False': False}
+
+@st.cache_resource
+def get_google_credentials():
+    return Credentials.from_service_account_info(dict(st.secrets["gcp_service_account"]), scopes=SCOPES)
+
+# ==========================================
+# SPREADSHEET REGISTRY & SHARED CLIENT
+# ==========================================
+# client.open(title) costs a Drive search plus a metadata fetch every time.
+# Spreadsheets are instead known by a logical name (their title) that is
+# resolved to a key once: from the [spreadsheet_keys] table in secrets when
+# it lists the name, else by one title search whose result is kept in
+# KEYS_FILE across restarts. They are then opened with open_by_key on one
+# shared client, whose HTTP session keeps enough pooled connections alive
+# for the parallel syncs and background writers.
+
+KEYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".spreadsheet_keys.json")
+HTTP_POOL_SIZE = 16
+
+@st.cache_resource
+def get_client():
+    """The process-wide authorized gspread client; use it instead of calling gspread.authorize() in a page."""
+    client = gspread.authorize(get_google_credentials())
+    client.http_client.session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+    return client
+
+@st.cache_resource
+def _keys():
+    keys = {}
+    try:
+        with open(KEYS_FILE, encoding="utf-8") as f: keys.update(json.load(f))
+    except Exception: pass
+    try: keys.update({str(k): str(v) for k, v in st.secrets.get("spreadsheet_keys", {}).items()})
+    except Exception: pass
+    return keys, threading.Lock()
+
+def _save_keys(keys):
+    try:
+        tmp = KEYS_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(keys, f, indent=1, sort_keys=True)
+        os.replace(tmp, KEYS_FILE)
+    except OSError: pass
+
+def spreadsheet_key(name):
+    """Key of the spreadsheet with logical name (title) name; searched by title only the first time."""
+    keys, lock = _keys()
+    with lock: key = keys.get(name)
+    if key is None:
+        key = get_client().open(name).id
+        with lock:
+            keys[name] = key
+            _save_keys(keys)
+    return key
+
+def forget_key(name):
+    """Drops a remembered key, e.g. after the spreadsheet was replaced by a new file of the same title."""
+    keys, lock = _keys()
+    with lock:
+        if keys.pop(name, None) is not None: _save_keys(keys)
+
+@st.cache_resource
+def open_spreadsheet(name):
+    """Spreadsheet for a logical name, opened by key on the shared client."""
+    try: return get_client().open_by_key(spreadsheet_key(name))
+    except gspread.exceptions.SpreadsheetNotFound:
+        forget_key(name)
+        return get_client().open_by_key(spreadsheet_key(name))
+
+@st.cache_resource
+def _handles():
+    return {}, threading.Lock()
+
+def worksheet_handle(spreadsheet, worksheet):
+    """Worksheet object from a per-spreadsheet cache filled by one worksheets() call; raises WorksheetNotFound."""
+    handles, lock = _handles()
+    with lock: found = handles.get(spreadsheet, {}).get(worksheet)
+    if found is None:
+        listed = {ws.title: ws for ws in open_spreadsheet(spreadsheet).worksheets()}
+        with lock: handles[spreadsheet] = listed
+        found = listed.get(worksheet)
+    if found is None: raise gspread.exceptions.WorksheetNotFound(worksheet)
+    return found
+
+def forget_handles(spreadsheet):
+    """Drops the cached worksheet list, e.g. after a tab was added, renamed or deleted."""
+    handles, lock = _handles()
+    with lock: handles.pop(spreadsheet, None)
+
+def _a1(worksheet, rng=None):
+    title = "'" + worksheet.replace("'", "''") + "'"
+    return f"{title}!{rng}" if rng else title
+
+def fetch_ranges(spreadsheet, ranges):
+    """Values of several A1 ranges in one values:batchGet call, one list of rows per range."""
+    resp = open_spreadsheet(spreadsheet).values_batch_get(ranges)
+    return [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+
+def _trim(row):
+    row = list(row)
+    while row and row[-1] == "": row.pop()
+    return row
+
+def _pad(row, width):
+    row = list(row)[:width]
+    return row + [""] * (width - len(row))
+
+def _cells(row, width):
+    # Rows appended through append_rows() may hold numbers; the sheet gives them back as text.
+    return ["" if v is None else v if isinstance(v, str) else str(v) for v in _pad(row, width)]
+
+def checksum(rows, width):
+    """CRC32 of rows as the sheet returns them, for cheap comparison of a cached block with a fresh read."""
+    crc = 0
+    for r in rows: crc = zlib.crc32(("\x1f".join(_cells(r, width)) + "\x1e").encode("utf-8"), crc)
+    return crc
+
+class SheetTable:
+    """Process-wide cached copy of one worksheet, kept in sync by tail fetches."""
+
+    def __init__(self, spreadsheet, worksheet):
+        self.spreadsheet = spreadsheet
+        self.worksheet = worksheet
+        self.lock = threading.RLock()
+        self.ws = None
+        self.header = []
+        self.rows = []
+        self.df = pd.DataFrame()
+        self.synced_at = 0.0
+        self.loaded_at = 0.0
+        self.probe_at = 0
+        self.probed_at = 0.0
+        self.probe = (0, 0)
+        # Bumped whenever existing rows may have moved (reload, keyed write); plain appends keep it.
+        self.generation = 0
+
+    @property
+    def row_count(self): return len(self.rows)
+
+    @property
+    def last_row(self): return self.rows[-1] if self.rows else list(self.header)
+
+    def handle(self):
+        if self.ws is None: self.ws = worksheet_handle(self.spreadsheet, self.worksheet)
+        return self.ws
+
+    def to_frame(self, rows):
+        width = len(self.header)
+        typed = [[BOOL_VALUES.get(v, v) if isinstance(v, str) else v for v in numericise_all(_pad(r, width))] for r in rows]
+        return pd.DataFrame(typed, columns=self.header)
+
+    def full_load(self):
+        self.handle()
+        self.apply_sync(fetch_ranges(self.spreadsheet, [_a1(self.worksheet)]))
+
+    def load_values(self, values):
+        self.header = list(values[0]) if values else []
+        self.rows = [_pad(r, len(self.header)) for r in values[1:]]
+        self.df = self.to_frame(self.rows) if self.header else pd.DataFrame()
+        self.generation += 1
+
+    def sync(self):
+        ranges = self.sync_ranges()
+        self.handle()  # raises WorksheetNotFound for a missing tab
+        self.apply_sync(fetch_ranges(self.spreadsheet, ranges))
+
+    def sync_ranges(self):
+        """A1 ranges the next sync needs: the whole sheet, or the header, the tail from the last known row and a probe window."""
+        # loaded_at is cleared by invalidate() to ask for a full reload.
+        if not self.header or not self.loaded_at: return [_a1(self.worksheet)]
+        # Row 1 is the header, so the last known data row sits on sheet row row_count + 1.
+        # Re-reading it alongside the header proves nothing above the tail has moved.
+        end_col = re.sub(r"\d", "", rowcol_to_a1(1, len(self.header)))
+        ranges = [_a1(self.worksheet, "1:1"), _a1(self.worksheet, f"A{self.row_count + 1}:{end_col}")]
+        start, end = self.probe = self.probe_window()
+        if end > start: ranges.append(_a1(self.worksheet, f"A{start + 2}:{end_col}{end + 1}"))
+        return ranges
+
+    def probe_window(self):
+        """Data-row positions [start, end) re-checked by the next tail sync; the last row is covered by the tail itself."""
+        known = self.row_count - 1
+        if known <= 0: return 0, 0
+        # Enough rows that, at the pace of the syncs so far, a full pass fits in PROBE_PASS_SECONDS.
+        size = max(PROBE_ROWS, math.ceil(known * (time.time() - self.probed_at) / PROBE_PASS_SECONDS))
+        start = self.probe_at if self.probe_at < known else 0
+        return start, min(known, start + size)
+
+    def apply_sync(self, values):
+        """Folds the values fetched for sync_ranges() into the cached copy."""
+        if len(values) == 1:
+            self.load_values(values[0])
+            self.synced_at = self.loaded_at = self.probed_at = time.time()
+            self.probe_at = 0
+            return
+        width = len(self.header)
+        header_rng, tail_rng = values[:2]
+        header = header_rng[0] if header_rng else []
+        tail = [_pad(r, width) for r in tail_rng]
+        if _trim(header) != _trim(self.header) or not tail or _cells(tail[0], width) != _cells(self.last_row, width):
+            return self.full_load()
+        if len(values) > 2:
+            # The values API leaves out trailing empty rows, so pad the probe back to the window's length.
+            start, end = self.probe
+            probe = list(values[2]) + [[]] * (end - start - len(values[2]))
+            if checksum(probe, width) != checksum(self.rows[start:end], width): return self.full_load()
+            self.probe_at, self.probed_at = end, time.time()
+
+        self.extend(tail[1:])
+        self.synced_at = time.time()
+
+    def extend(self, rows):
+        if not rows: return
+        rows = [_pad(r, len(self.header)) for r in rows]
+        self.df = pd.concat([self.df, self.to_frame(rows)], ignore_index=True) if not self.df.empty else self.to_frame(rows)
+        self.rows.extend(rows)
+
+    def splice(self, positions, rows):
+        """Mirrors a keyed write: positions[i] takes rows[i], extra rows are appended, extra positions dropped."""
+        rows = [_pad(r, len(self.header)) for r in rows]
+        fresh = self.to_frame(rows)
+        updated = dict(zip(positions, range(len(rows))))
+        gone = set(positions[len(rows):])
+        old_ids, old_at, new_ids, new_at, out = [], [], [], [], []
+        for i, r in enumerate(self.rows):
+            if i in gone: continue
+            if i in updated: new_ids.append(updated[i]); new_at.append(len(out)); out.append(rows[updated[i]])
+            else: old_ids.append(i); old_at.append(len(out)); out.append(r)
+        for j in range(len(positions), len(rows)): new_ids.append(j); new_at.append(len(out)); out.append(rows[j])
+        kept = self.df.iloc[old_ids].set_axis(old_at) if old_ids else None
+        added = fresh.iloc[new_ids].set_axis(new_at) if new_ids else None
+        parts = [f for f in (kept, added) if f is not None]
+        self.df = pd.concat(parts).sort_index() if parts else self.to_frame([])
+        self.rows = out
+        self.generation += 1
+        self.synced_at = time.time()
+
+    def widen(self, columns):
+        """Adds columns to the right of the header, blank in every cached row."""
+        self.header = self.header + list(columns)
+        self.rows = [_pad(r, len(self.header)) for r in self.rows]
+        self.df = self.to_frame(self.rows)
+        self.generation += 1
+
+    def positions(self, where):
+        """Data-row positions (0 = first row under the header) matching where; a list value matches any of its items.
+
+        Cells and wanted values are compared as the sheet shows them, numbers by value ("05" matches 5).
+        """
+        if not self.rows or any(c not in self.header for c in where): return []
+        wanted = [(self.header.index(c), {_norm(x) for x in v} if isinstance(v, (list, tuple, set)) else {_norm(v)}) for c, v in where.items()]
+        return [p for p, r in enumerate(self.rows) if all(_norm(r[c]) in ok for c, ok in wanted)]
+
+@st.cache_resource
+def _registry():
+    return {}, threading.Lock()
+
+def get_table(spreadsheet, worksheet):
+    tables, lock = _registry()
+    with lock:
+        key = (spreadsheet, worksheet)
+        if key not in tables: tables[key] = SheetTable(spreadsheet, worksheet)
+        return tables[key]
+
+def synced_table(spreadsheet, worksheet, ttl=600):
+    """The cached SheetTable, tail-synced first if older than ttl seconds. Hold table.lock while reading it."""
+    table = get_table(spreadsheet, worksheet)
+    with table.lock:
+        fresh = time.time() - table.synced_at < ttl
+        api_metrics.record_cache(f"sheets_store:{spreadsheet}/{worksheet}", fresh)
+        if not fresh:
+            try: table.sync()
+            except Exception:
+                # Serve the last good copy through API hiccups; only fail if nothing was ever loaded.
+                table.ws = None
+                forget_handles(spreadsheet)
+                if not table.header: raise
+    return table
+
+# ==========================================
+# BATCHED MULTI-SHEET SYNC
+# ==========================================
+# A page that needs several worksheets syncs them together: every stale
+# table of one spreadsheet goes into a single values:batchGet, and the
+# spreadsheets are fetched side by side, so a cold load costs about one
+# round trip (the slowest spreadsheet) instead of one per worksheet.
+
+@st.cache_resource
+def _timings():
+    return {}
+
+def _sync_spreadsheet(spreadsheet, worksheets, ttl):
+    tables = [get_table(spreadsheet, w) for w in sorted(set(worksheets))]
+    started = time.time()
+    missing = []
+    for t in tables: t.lock.acquire()
+    try:
+        stale = []
+        for t in tables:
+            fresh = time.time() - t.synced_at < ttl
+            api_metrics.record_cache(f"sheets_store:{spreadsheet}/{t.worksheet}", fresh)
+            if fresh: continue
+            try: t.handle()
+            except gspread.exceptions.WorksheetNotFound: missing.append(t.worksheet); continue
+            stale.append(t)
+        if stale:
+            plans = [t.sync_ranges() for t in stale]
+            try:
+                values = fetch_ranges(spreadsheet, [r for plan in plans for r in plan])
+                for t, plan in zip(stale, plans):
+                    t.apply_sync(values[:len(plan)])
+                    values = values[len(plan):]
+            except Exception:
+                forget_handles(spreadsheet)
+                for t in stale: t.ws = None
+                if any(not t.header for t in stale): raise
+    finally:
+        for t in tables: t.lock.release()
+    elapsed = time.time() - started
+    _timings()[spreadsheet] = (elapsed, len(tables), time.time())
+    return missing, elapsed
+
+def read_sheets(wanted, ttl=600):
+    """Copies of several worksheets, {spreadsheet: [worksheet, ...]} -> {(spreadsheet, worksheet): DataFrame}.
+
+    Worksheets that do not exist are left out of the result. Also returns {spreadsheet: seconds spent syncing}.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(wanted))) as exe:
+        futures = {s: exe.submit(_sync_spreadsheet, s, ws, ttl) for s, ws in wanted.items()}
+        results = {s: f.result() for s, f in futures.items()}
+    frames = {}
+    for s, ws in wanted.items():
+        for w in ws:
+            if w in results[s][0]: continue
+            table = get_table(s, w)
+            with table.lock: frames[(s, w)] = table.df.copy()
+    return frames, {s: r[1] for s, r in results.items()}
+
+def last_timings():
+    """{spreadsheet: (seconds, worksheets, finished_at)} of the most recent batched sync of each spreadsheet."""
+    return dict(_timings())
+
+def version(spreadsheet, worksheet, ttl=600):
+    """(generation, row count) of the worksheet after a sync; changes whenever its data does. None if it cannot be read."""
+    try: table = synced_table(spreadsheet, worksheet, ttl)
+    except Exception: return None
+    with table.lock: return table.generation, table.row_count
+
+def read_sheet(spreadsheet, worksheet, ttl=600):
+    """Returns a copy of the cached worksheet, pulling newly appended rows first if it is older than ttl seconds."""
+    table = synced_table(spreadsheet, worksheet, ttl)
+    with table.lock: return table.df.copy()
+
+def read_values(spreadsheet, worksheet, ttl=600):
+    """Header plus rows of the cached worksheet as the sheet shows them (text, padded to the header), like get_all_values()."""
+    table = synced_table(spreadsheet, worksheet, ttl)
+    with table.lock:
+        width = len(table.header)
+        return [list(table.header)] + [_cells(r, width) for r in table.rows] if table.header else []
+
+def synced_row_count(spreadsheet, worksheet):
+    """Data rows on the sheet right now: the cached copy after pulling anything appended since the last sync."""
+    table = synced_table(spreadsheet, worksheet, ttl=0)
+    with table.lock: return table.row_count
+
+def _shown_as_typed(v, user_entered):
+    # Formulas show their result; typed dates, times and numbers may come back reformatted.
+    v = _raw(v).strip()
+    if v.startswith("="): return False
+    return not (user_entered and v and re.fullmatch(r"[\d\s:./,-]*(?:[AaPp][Mm])?", v))
+
+def find_rows(spreadsheet, worksheet, rows, after=0, user_entered=False):
+    """Position of the first data row where rows sit as one block, at or after position after; None if they are not there.
+
+    Pulls appended rows first. Formula cells are not compared, as the sheet shows their result, and for
+    user_entered rows neither are cells that Sheets parses as numbers, dates or times.
+    """
+    table = synced_table(spreadsheet, worksheet, ttl=0)
+    with table.lock:
+        width = len(table.header)
+        want = [[_norm(v) if _shown_as_typed(v, user_entered) else None for v in _pad(r, width)] for r in rows]
+        if not want or not width: return None
+        for start in range(max(0, after), table.row_count - len(want) + 1):
+            block = table.rows[start:start + len(want)]
+            if all(w is None or w == _norm(v) for wr, r in zip(want, block) for w, v in zip(wr, r)): return start
+    return None
+
+def invalidate(spreadsheet, worksheet=None):
+    """Forces a full reload on next read. Use after rewriting or editing rows in place."""
+    tables, lock = _registry()
+    with lock: targets = [t for (s, w), t in tables.items() if s == spreadsheet and (worksheet is None or w == worksheet)]
+    for t in targets:
+        with t.lock: t.loaded_at = t.synced_at = 0.0
+
+def mark_stale(spreadsheet, worksheet=None):
+    """Makes the next read fetch appended rows only. Use after plain appends."""
+    tables, lock = _registry()
+    with lock: targets = [t for (s, w), t in tables.items() if s == spreadsheet and (worksheet is None or w == worksheet)]
+    for t in targets:
+        with t.lock: t.synced_at = 0.0
+
+# ==========================================
+# WRITE PACING
+# ==========================================
+# Every write below goes through paced(): it takes a token from one bucket
+# shared by all pages, refilled at WRITES_PER_MINUTE (just under Google's
+# 60 writes per minute per user), so a burst such as every teacher
+# submitting MDM at 11:15 is spread out instead of rejected. A write that
+# still comes back 429 is retried with jittered exponential backoff. After a
+# timeout, a dropped connection or a 5xx the write may or may not have been
+# applied, so only writes that land on fixed cells (idempotent=True) are
+# retried then; appends and row inserts or deletes raise instead, for the
+# caller to check the sheet before sending them again.
+
+WRITES_PER_MINUTE = 55
+WRITE_BURST = 10
+WRITE_ATTEMPTS = 4
+RETRY_BASE_SECONDS = 1
+RETRY_MAX_SECONDS = 16
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Hands out up to per_minute tokens a minute, at most burst at once; take() waits for one."""
+
+    def __init__(self, per_minute, burst):
+        self.rate, self.capacity = per_minute / 60.0, float(burst)
+        self.tokens, self.stamp = float(burst), time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+@st.cache_resource
+def _write_bucket():
+    return TokenBucket(WRITES_PER_MINUTE, WRITE_BURST)
+
+def _status(e): return getattr(getattr(e, "response", None), "status_code", None)
+
+def in_doubt(e):
+    """True if a write that raised e may still have been applied (timeout, dropped connection, 5xx)."""
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)): return True
+    return _status(e) in RETRY_STATUSES - {429}
+
+def paced(send, idempotent=True):
+    """Runs send() (one Sheets write request) within the write quota, retrying 429 answers.
+
+    Failures that leave the write in doubt are retried only for idempotent writes.
+    """
+    for attempt in range(WRITE_ATTEMPTS):
+        _write_bucket().take()
+        try: return send()
+        except Exception as e:
+            retry = _status(e) == 429 or (idempotent and in_doubt(e))
+            if attempt == WRITE_ATTEMPTS - 1 or not retry: raise
+            time.sleep(min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+# ==========================================
+# WRITE-THROUGH HELPERS
+# ==========================================
+# Writes go to Google first, then the same rows are patched into the cached
+# copy of that one worksheet, so nobody has to re-download anything.
+
+def _first_row(updated_range):
+    m = re.search(r"![A-Z]+(\d+)", str(updated_range))
+    return int(m.group(1)) if m else None
+
+def append_rows(spreadsheet, worksheet, values, value_input_option="RAW"):
+    """Appends rows to the worksheet and to its cached copy (USER_ENTERED rows, e.g. formulas, are re-read instead).
+
+    Raises without retrying when the append may have landed anyway (see in_doubt()).
+    """
+    table = get_table(spreadsheet, worksheet)
+    with table.lock: ws = table.handle()
+    # Sent without the table lock, so readers of the cached copy never wait on the quota or a backoff.
+    resp = paced(lambda: ws.append_rows(values, value_input_option=value_input_option), idempotent=False)
+    with table.lock:
+        if not table.header: return
+        # Only patch if our rows landed straight after the last row we know about;
+        # otherwise someone else appended in between and a tail sync picks up both.
+        landed = _first_row(resp.get("updates", {}).get("updatedRange")) == table.row_count + 2
+        if landed and value_input_option == "RAW": table.extend(values)
+        else: table.synced_at = 0.0
+
+def column_a_end(spreadsheet, worksheet):
+    """Sheet row of the last filled cell in column A (0 if it is empty), like len(ws.col_values(1))."""
+    return len(fetch_ranges(spreadsheet, [_a1(worksheet, "A:A")])[0])
+
+def write_rows_at(spreadsheet, worksheet, first_row, values, value_input_option="RAW"):
+    """Writes rows from column A of sheet row first_row down, over whatever formatting or checkboxes are there."""
+    table = get_table(spreadsheet, worksheet)
+    with table.lock: ws = table.handle()
+    # Fixed cells: a retry after a timeout rewrites the same rows instead of adding them again.
+    paced(lambda: ws.update(range_name=f"A{first_row}", values=values, value_input_option=value_input_option))
+    with table.lock:
+        # Rows landing inside the cached range replace known rows, which only a reload picks up.
+        if first_row - 2 < table.row_count: table.loaded_at = 0.0
+        table.synced_at = 0.0
+
+def overwrite(spreadsheet, worksheet, values):
+    """Replaces the worksheet (header row first) and its cached copy with values."""
+    table = get_table(spreadsheet, worksheet)
+    with table.lock:
+        ws = table.handle()
+        paced(ws.clear)
+        if values: paced(lambda: ws.update(values=values, range_name='A1'))
+        table.load_values(values)
+        table.synced_at = table.loaded_at = time.time()
+
+# ==========================================
+# KEYED ROW UPDATES
+# ==========================================
+# Instead of reading a whole sheet, filtering it and rewriting it with
+# clear() + update(), these locate the target rows in the cached copy and
+# send one batch_update that touches only those rows.
+
+def _is_blank(v): return v is None or (isinstance(v, numbers.Number) and not isinstance(v, bool) and pd.isna(v))
+
+def _cell(v):
+    if isinstance(v, bool): return {"userEnteredValue": {"boolValue": v}}
+    if _is_blank(v): return {"userEnteredValue": {"stringValue": ""}}
+    if isinstance(v, numbers.Number): return {"userEnteredValue": {"numberValue": v.item() if hasattr(v, "item") else v}}
+    return {"userEnteredValue": {"stringValue": str(v)}}
+
+def _raw(v):
+    # What Sheets will hand back for a value written by _cell().
+    if isinstance(v, bool): return "TRUE" if v else "FALSE"
+    if _is_blank(v): return ""
+    if isinstance(v, numbers.Number) and float(v).is_integer(): return str(int(v))
+    return str(v)
+
+def _norm(v):
+    # Numbers compare by value, so "05", 5 and 5.0 are the same cell.
+    return str(numericise(_raw(v).strip()))
+
+def _row_data(row): return {"values": [_cell(v) for v in row]}
+
+def _delete_requests(sheet_id, positions):
+    # Contiguous runs become one deleteDimension each, issued bottom-up so earlier indices stay valid.
+    runs = []
+    for p in sorted(positions):
+        if runs and runs[-1][1] == p: runs[-1][1] = p + 1
+        else: runs.append([p, p + 1])
+    return [{"deleteDimension": {"range": {"sheetId": sheet_id, "dimension": "ROWS", "startIndex": a + 1, "endIndex": b + 1}}} for a, b in reversed(runs)]
+
+def replace_rows(spreadsheet, worksheet, where, records):
+    """Replaces the rows matching where with records (dicts keyed by header) in one batch_update; no match appends.
+
+    Record fields the header does not have yet become new columns at its right end, in the same batch_update.
+    """
+    table = get_table(spreadsheet, worksheet)
+    with table.lock:
+        table.sync()
+        if not table.header: raise ValueError(f"{worksheet} has no header row")
+        extra = list(dict.fromkeys(k for r in records for k in r if k not in table.header))
+        header = table.header + extra
+        new_rows = [[r.get(h, "") for h in header] for r in records]
+        old = table.positions(where)
+        ws = table.handle()
+        reqs = []
+        if extra:
+            if len(header) > ws.col_count: reqs.append({"appendDimension": {"sheetId": ws.id, "dimension": "COLUMNS", "length": len(header) - ws.col_count}})
+            reqs.append({"updateCells": {"rows": [_row_data(extra)], "fields": "userEnteredValue", "start": {"sheetId": ws.id, "rowIndex": 0, "columnIndex": len(table.header)}}})
+        reqs += [{"updateCells": {"rows": [_row_data(r)], "fields": "userEnteredValue", "start": {"sheetId": ws.id, "rowIndex": p + 1, "columnIndex": 0}}} for p, r in zip(old, new_rows)]
+        if len(new_rows) > len(old): reqs.append({"appendCells": {"sheetId": ws.id, "rows": [_row_data(r) for r in new_rows[len(old):]], "fields": "userEnteredValue"}})
+        reqs += _delete_requests(ws.id, old[len(new_rows):])
+        if not reqs: return
+        paced(lambda: ws.spreadsheet.batch_update({"requests": reqs}), idempotent=len(old) == len(new_rows))
+
+        if extra:
+            table.widen(extra)
+            if len(header) > ws.col_count:
+                # The handle still reports the old grid size.
+                table.ws = None
+                forget_handles(spreadsheet)
+        table.splice(old, [[_raw(v) for v in r] for r in new_rows])
+
+def delete_rows(spreadsheet, worksheet, where):
+    """Deletes every row matching where in one batch_update. Returns the number of rows removed."""
+    table = get_table(spreadsheet, worksheet)
+    with table.lock:
+        table.sync()
+        old = table.positions(where)
+        if not old: return 0
+        ws = table.handle()
+        paced(lambda: ws.spreadsheet.batch_update({"requests": _delete_requests(ws.id, old)}), idempotent=False)
+        table.splice(old, [])
+        return len(old)
+
+def update_cells(spreadsheet, worksheet, position, values, expect=None):
+    """Sets some cells of one data row ({header: value}) in one values:batchUpdate, entered as if typed, and patches the cached copy.
+
+    Syncs first. With expect ({header: value}) nothing is written unless the row still holds those values,
+    so a position taken from an older copy cannot hit a row that has moved. Returns True if written.
+    """
+    table = get_table(spreadsheet, worksheet)
+    with table.lock:
+        table.sync()
+        missing = [h for h in list(values) + list(expect or {}) if h not in table.header]
+        if missing: raise ValueError(f"{worksheet} has no column {', '.join(missing)}")
+        if position >= table.row_count: return False
+        if any(_norm(table.rows[position][table.header.index(h)]) != _norm(v) for h, v in (expect or {}).items()): return False
+        cols = {table.header.index(h): v for h, v in values.items()}
+        ws = table.handle()
+        paced(lambda: ws.batch_update([{"range": rowcol_to_a1(position + 2, c + 1), "values": [[v]]} for c, v in cols.items()], raw=False))
+        row = list(table.rows[position])
+        for c, v in cols.items(): row[c] = _raw(v)
+        table.splice([position], [row])
+        return True
+
+# ==========================================
+# KEYED UPSERTS
+# ==========================================
+# For sheets holding one row per key (e.g. one row per student): a key ->
+# row position index is kept next to the cached table and updated by every
+# upsert, and saves arriving within COALESCE_SECONDS of each other go out
+# together as one batch_update.
+
+COALESCE_SECONDS = 0.5
+
+class KeyIndex:
+    def __init__(self, key):
+        self.key = key
+        self.generation = None
+        self.counted = 0
+        self.positions = {}
+
+    def caught_up(self, table):
+        # Caller holds table.lock.
+        if self.generation != table.generation or self.counted > table.row_count:
+            self.generation, self.counted, self.positions = table.generation, 0, {}
+        if self.counted < table.row_count and self.key in table.header:
+            col = table.header.index(self.key)
+            for pos, r in enumerate(table.rows[self.counted:], start=self.counted):
+                self.positions.setdefault(str(r[col]).strip(), pos)
+        self.counted = table.row_count
+        return self.positions
+
+@st.cache_resource
+def _key_indexes():
+    return {}, threading.Lock()
+
+def _key_index(spreadsheet, worksheet, key):
+    indexes, lock = _key_indexes()
+    with lock: return indexes.setdefault((spreadsheet, worksheet, key), KeyIndex(key))
+
+def upsert_rows(spreadsheet, worksheet, key, records):
+    """Writes records (dicts keyed by header) over the rows with the same key, appending new keys, in one batch_update."""
+    table = get_table(spreadsheet, worksheet)
+    index = _key_index(spreadsheet, worksheet, key)
+    with table.lock:
+        # Positions must come from the sheet as it is now: a reload after deletes or a sort bumps the generation and rebuilds the index.
+        table.sync()
+        if key not in table.header: raise ValueError(f"{worksheet} has no {key} column")
+        positions = index.caught_up(table)
+        latest = {str(r.get(key, "")).strip(): r for r in records}
+        found = [(positions[k], r) for k, r in latest.items() if k in positions]
+        fresh = [r for k, r in latest.items() if k not in positions]
+        ws = table.handle()
+        rows = [[r.get(h, "") for h in table.header] for _, r in found] + [[r.get(h, "") for h in table.header] for r in fresh]
+        reqs = [{"updateCells": {"rows": [_row_data(row)], "fields": "userEnteredValue", "start": {"sheetId": ws.id, "rowIndex": p + 1, "columnIndex": 0}}} for (p, _), row in zip(found, rows)]
+        if fresh: reqs.append({"appendCells": {"sheetId": ws.id, "rows": [_row_data(row) for row in rows[len(found):]], "fields": "userEnteredValue"}})
+        if not reqs: return
+        paced(lambda: ws.spreadsheet.batch_update({"requests": reqs}), idempotent=not fresh)
+
+        start = table.row_count
+        table.splice([p for p, _ in found], [[_raw(v) for v in row] for row in rows])
+        for i, r in enumerate(fresh): positions[str(r.get(key, "")).strip()] = start + i
+        index.generation, index.counted = table.generation, table.row_count
+
+class UpsertQueue:
+    """Collects upserts for one worksheet and flushes them together after COALESCE_SECONDS."""
+
+    def __init__(self, spreadsheet, worksheet, key):
+        self.spreadsheet, self.worksheet, self.key = spreadsheet, worksheet, key
+        self.pending = {}   # key -> (record, futures waiting on it); a later save of the same key wins
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def submit(self, record):
+        fut = concurrent.futures.Future()
+        with self.lock:
+            k = str(record.get(self.key, "")).strip()
+            waiting = self.pending.get(k, (None, []))[1]
+            self.pending[k] = (record, waiting + [fut])
+            if self.timer is None:
+                self.timer = threading.Timer(COALESCE_SECONDS, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return fut
+
+    def flush(self):
+        with self.lock: batch, self.pending, self.timer = self.pending, {}, None
+        if not batch: return
+        try:
+            upsert_rows(self.spreadsheet, self.worksheet, self.key, [rec for rec, _ in batch.values()])
+            error = None
+        except Exception as e: error = e
+        for _, futures in batch.values():
+            for fut in futures:
+                if error is None: fut.set_result(True)
+                else: fut.set_exception(error)
+
+@st.cache_resource
+def _upsert_queues():
+    return {}, threading.Lock()
+
+def queue_upsert(spreadsheet, worksheet, key, record):
+    """Queues one keyed upsert; returns a Future that resolves once the batch holding it has been written."""
+    queues, lock = _upsert_queues()
+    with lock: queue = queues.setdefault((spreadsheet, worksheet, key), UpsertQueue(spreadsheet, worksheet, key))
+    return queue.submit(record)
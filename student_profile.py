@@ -7,9 +7,9 @@ st.write("---")
 import pandas as pd
 import gspread
 from google.oauth2.service_account import Credentials
-from google.auth.transport.requests import AuthorizedSession
 import datetime
 import pytz
+import photo_store, cache_registry
 
 # --- 1. PAGE CONFIGURATION ---
 st.set_page_config(page_title="BPS Student Profile", page_icon="🎓", layout="wide")
@@ -32,7 +32,7 @@ def get_gspread_client():
     return gspread.authorize(creds)
 
 # --- 3. DATA LOADING & CACHING ---
-@st.cache_data(ttl=600)
+@cache_registry.cached(("BPS_Database", "students_master"), ("BPS_Database", "mdm_log"), ("BPS_Database", "student_attendance_master"), ("BPS_Database", "form_distribution_log"), ttl=600)
 def load_database_data():
     client = get_gspread_client()
     
@@ -47,6 +47,11 @@ def load_database_data():
         st.error(f"Could not find worksheet in BPS_Database: {e}.")
         st.stop()
         
+    return df_master, df_mdm, df_attendance, df_forms
+
+@cache_registry.cached("Students Profile", ttl=600)
+def load_profile_logs():
+    client = get_gspread_client()
     try:
         db_log = client.open("Students Profile")
         log_ws = db_log.sheet1 
@@ -68,24 +73,9 @@ def load_database_data():
         st.error(f"Could not connect to 'Students Profile'. Error: {e}")
         df_logs = pd.DataFrame(columns=["Date", "Class", "Section", "Roll", "Name", "Log Type", "Details"])
         
-    return df_master, df_mdm, df_attendance, df_forms, df_logs
+    return df_logs
 
 # --- 4. SECURE IMAGE FETCHER ---
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_secure_image_bytes(file_id):
-    try:
-        creds = get_google_credentials()
-        authed_session = AuthorizedSession(creds)
-        url = f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media"
-        response = authed_session.get(url)
-        
-        if response.status_code == 200:
-            return response.content
-        else:
-            return None
-    except Exception as e:
-        return None
-
 def display_student_photo(url):
     fallback_image = "https://www.w3schools.com/howto/img_avatar.png"
     
@@ -101,7 +91,7 @@ def display_student_photo(url):
             pass
 
     if file_id:
-        image_bytes = fetch_secure_image_bytes(file_id)
+        image_bytes = photo_store.get_photo_bytes(url, 300)
         if image_bytes:
             st.image(image_bytes, width=150)
         else:
@@ -116,7 +106,8 @@ def display_student_photo(url):
 
 # Attempt to load data
 try:
-    df_master, df_mdm, df_attendance, df_forms, df_logs = load_database_data()
+    df_master, df_mdm, df_attendance, df_forms = load_database_data()
+    df_logs = load_profile_logs()
 except Exception as e:
     st.warning("Please configure your Google Sheets connection and secrets to view live data.")
     st.stop()
@@ -326,7 +317,7 @@ if app_mode == "🎓 Student Profiles":
                                     selected_roll, selected_name, log_type, log_notes
                                 ])
                                 
-                                st.cache_data.clear()
+                                cache_registry.invalidate("Students Profile")
                                 st.success("✅ Log saved successfully!")
                                 st.rerun() 
 
@@ -0,0 +1,274 @@
+import streamlit as st
+import pandas as pd
+import os
+import json
+import time
+import random
+import sqlite3
+import functools
+import contextlib
+import threading
+from gspread.utils import numericise_all
+import sheets_store, cache_registry
+
+# ==========================================
+# OFFLINE-FIRST APPEND QUEUE
+# ==========================================
+# Log rows are written to a local SQLite file first, so a button press never
+# waits on Google and nothing is lost if the network drops. A background
+# worker sends them in order, one append_rows call per worksheet, backing off
+# (with jitter) while Google is unreachable. Pages overlay the rows still
+# waiting onto what they read, and call drain() before editing rows in place
+# so row numbers cannot shift under a queued append.
+#
+# Rows queued by many teachers at once are merged per worksheet, so the
+# 11:15 MDM rush costs one paced append_rows per worksheet rather than one
+# request per submit. submit() lets a form wait for its rows to arrive
+# while they still go out with everyone else's.
+#
+# A batch whose append failed in a way that may still have written it (a
+# timeout, a dropped connection, a 5xx) is kept "in doubt" together with the
+# sheet's row count from before the attempt. Before it is sent again the
+# sheet's new rows are read back; if the batch is already there it is
+# dropped from the queue instead, so an ambiguous failure never duplicates
+# up to BATCH_ROWS rows.
+#
+# Rows queued with below_column_a=True are not sent with values:append,
+# which finds the table by itself and can land below formatted, checkbox or
+# formula ranges; they are written from column A of the row under the last
+# filled cell of column A, as those pages always did.
+
+QUEUE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".write_queue.sqlite")
+BATCH_ROWS = 200
+BASE_BACKOFF_SECONDS = 2
+MAX_BACKOFF_SECONDS = 300
+IDLE_SECONDS = 30
+SUBMIT_TIMEOUT_SECONDS = 20
+INPUT_OPTIONS = ("RAW", "USER_ENTERED")
+TARGETS = ("append", "column_a")
+
+def _connect():
+    conn = sqlite3.connect(QUEUE_DB, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""CREATE TABLE IF NOT EXISTS pending (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, spreadsheet TEXT, worksheet TEXT, row TEXT,
+        queued_at REAL, attempts INTEGER DEFAULT 0, next_try REAL DEFAULT 0, last_error TEXT, input TEXT DEFAULT 'RAW', doubt INTEGER, target TEXT DEFAULT 'append')""")
+    have = [c[1] for c in conn.execute("PRAGMA table_info(pending)")]
+    for column, kind in (("input", "TEXT DEFAULT 'RAW'"), ("doubt", "INTEGER"), ("target", "TEXT DEFAULT 'append'")):
+        if column in have: continue
+        # Queue files from before this column; another connection may be adding it at the same moment.
+        try: conn.execute(f"ALTER TABLE pending ADD COLUMN {column} {kind}")
+        except sqlite3.OperationalError: pass
+    return conn
+
+@contextlib.contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn: yield conn
+    finally: conn.close()
+
+@st.cache_resource
+def _state():
+    # One flush at a time, so the worker and drain() never send the same rows twice.
+    # The condition is notified whenever a batch has been sent, for submit() to check its rows.
+    return threading.Lock(), threading.Event(), threading.Condition()
+
+def _retry_later(conn, found, error, doubt=None):
+    wait = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** found[0][2]) * random.uniform(0.5, 1.5)
+    # COALESCE keeps the earliest row count of a batch that was already in doubt.
+    conn.executemany("UPDATE pending SET attempts=attempts+1, next_try=?, last_error=?, doubt=COALESCE(doubt, ?) WHERE id=?",
+                     [(time.time() + wait, str(error)[:300], doubt, r[0]) for r in found])
+    conn.commit()
+
+def _flush_group(conn, spreadsheet, worksheet, force=False):
+    """Sends the oldest queued rows of one worksheet. Returns True if nothing is left waiting there."""
+    while True:
+        found = conn.execute("SELECT id, row, attempts, next_try, input, doubt, target FROM pending WHERE spreadsheet=? AND worksheet=? ORDER BY id LIMIT ?",
+                             (spreadsheet, worksheet, BATCH_ROWS)).fetchall()
+        if not found: return True
+        if not force and found[0][3] > time.time(): return False
+        # Consecutive rows with the same value input option and target go out as one request;
+        # a batch in doubt is taken exactly as it was last sent.
+        option, doubt, target = found[0][4] or "RAW", found[0][5], found[0][6] or "append"
+        run = [found[0]]
+        for r in found[1:]:
+            if (r[4] or "RAW") != option or r[5] != doubt or (r[6] or "append") != target: break
+            run.append(r)
+        found, ids = run, [r[0] for r in run]
+        rows = [json.loads(r[1]) for r in found]
+        landed = False
+        if doubt is not None:
+            try: landed = sheets_store.find_rows(spreadsheet, worksheet, rows, after=doubt, user_entered=option == "USER_ENTERED") is not None
+            except Exception as e:
+                _retry_later(conn, found, e)
+                return False
+        if not landed:
+            at = None  # data-row position the batch goes to, or the sheet's row count before an append
+            try:
+                if target == "column_a":
+                    at = sheets_store.column_a_end(spreadsheet, worksheet) - 1
+                    sheets_store.write_rows_at(spreadsheet, worksheet, at + 2, rows, value_input_option=option)
+                else:
+                    # Fresh, so a matching block already above the real append point is never taken for this batch.
+                    at = sheets_store.synced_row_count(spreadsheet, worksheet)
+                    sheets_store.append_rows(spreadsheet, worksheet, rows, value_input_option=option)
+            except Exception as e:
+                _retry_later(conn, found, e, at if sheets_store.in_doubt(e) else None)
+                return False
+        conn.executemany("DELETE FROM pending WHERE id=?", [(i,) for i in ids])
+        conn.commit()
+        cache_registry.invalidate(spreadsheet, worksheet, reload=False)
+        sent = _state()[2]
+        with sent: sent.notify_all()
+
+def flush(force=False):
+    """Sends every worksheet's queued rows that are due (all of them with force=True)."""
+    lock = _state()[0]
+    with lock, _db() as conn:
+        groups = conn.execute("SELECT spreadsheet, worksheet FROM pending GROUP BY spreadsheet, worksheet ORDER BY MIN(id)").fetchall()
+        for spreadsheet, worksheet in groups: _flush_group(conn, spreadsheet, worksheet, force)
+
+def _next_due():
+    with _db() as conn:
+        (due,) = conn.execute("SELECT MIN(next_try) FROM pending").fetchone()
+    return None if due is None else max(0.0, due - time.time())
+
+@st.cache_resource
+def _worker():
+    wake = _state()[1]
+    def run():
+        while True:
+            try:
+                flush()
+                due = _next_due()
+            except Exception: due = IDLE_SECONDS
+            wake.wait(IDLE_SECONDS if due is None else min(due, IDLE_SECONDS))
+            wake.clear()
+    thread = threading.Thread(target=run, name="write-queue", daemon=True)
+    thread.start()
+    return thread
+
+def _plain(v): return v.item() if hasattr(v, "item") else str(v)
+
+def _queue(spreadsheet, worksheet, rows, user_entered, below_column_a=False):
+    option, target = INPUT_OPTIONS[bool(user_entered)], TARGETS[bool(below_column_a)]
+    with _db() as conn:
+        ids = [conn.execute("INSERT INTO pending (spreadsheet, worksheet, row, queued_at, input, target) VALUES (?, ?, ?, ?, ?, ?)",
+                            (spreadsheet, worksheet, json.dumps(list(row), default=_plain), time.time(), option, target)).lastrowid for row in rows]
+    _worker()
+    _state()[1].set()
+    return ids
+
+def append_row(spreadsheet, worksheet, row, user_entered=False, below_column_a=False):
+    """Queues one row for worksheet and returns at once; the background worker sends it.
+
+    user_entered=True sends it as if typed, so formulas and dates are parsed by Sheets.
+    below_column_a=True writes it under the last filled cell of column A instead of appending it.
+    """
+    _queue(spreadsheet, worksheet, [row], user_entered, below_column_a)
+
+def _waiting(ids):
+    with _db() as conn:
+        (n,) = conn.execute(f"SELECT COUNT(*) FROM pending WHERE id IN ({','.join('?' * len(ids))})", ids).fetchone()
+    return n
+
+def submit(spreadsheet, worksheet, rows, user_entered=False, timeout=SUBMIT_TIMEOUT_SECONDS):
+    """Queues rows and waits up to timeout seconds for the worker to send them.
+
+    Returns True once they are on the sheet, False if they are still queued (they stay saved and go out later).
+    """
+    ids = _queue(spreadsheet, worksheet, rows, user_entered)
+    if not ids: return True
+    sent, until = _state()[2], time.time() + timeout
+    with sent:
+        while _waiting(ids):
+            left = until - time.time()
+            if left <= 0: return False
+            sent.wait(min(left, 1.0))
+    return True
+
+def drain(spreadsheet, worksheet):
+    """Sends this worksheet's queued rows now. Raises if they cannot be sent, so no in-place edit runs on shifted rows."""
+    lock = _state()[0]
+    with lock, _db() as conn:
+        if not _flush_group(conn, spreadsheet, worksheet, force=True):
+            raise ConnectionError(f"{pending_count(spreadsheet, worksheet)} queued {worksheet} rows could not be sent yet")
+
+def pending_rows(spreadsheet, worksheet):
+    """Rows still waiting for worksheet, oldest first."""
+    with _db() as conn:
+        found = conn.execute("SELECT row FROM pending WHERE spreadsheet=? AND worksheet=? ORDER BY id", (spreadsheet, worksheet)).fetchall()
+    return [json.loads(r[0]) for r in found]
+
+def pending_count(spreadsheet=None, worksheet=None):
+    with _db() as conn:
+        (n,) = conn.execute("SELECT COUNT(*) FROM pending WHERE (? IS NULL OR spreadsheet=?) AND (? IS NULL OR worksheet=?)",
+                            (spreadsheet, spreadsheet, worksheet, worksheet)).fetchone()
+    return n
+
+def _shown(v):
+    # Formulas of user-entered rows have no value until Sheets computes them.
+    return "" if str(v).startswith("=") else str(v)
+
+def pending_values(spreadsheet, worksheet):
+    """Queued rows as get_all_values() would show them (formula cells blank), oldest first."""
+    return [[_shown(v) for v in r] for r in pending_rows(spreadsheet, worksheet)]
+
+def below_column_a(data, spreadsheet, worksheet):
+    """get_all_values() result with the worksheet's queued rows written in under the last filled cell of column A.
+
+    Mirrors what sending them with below_column_a=True does: cells past a queued row's end keep their values.
+    """
+    if not data: return data
+    width = len(data[0])
+    data = [list(r) for r in data]
+    at = max((i for i, r in enumerate(data) if r and str(r[0]).strip()), default=0) + 1
+    for q in pending_values(spreadsheet, worksheet):
+        under = data[at] if at < len(data) else []
+        row = (q + list(under)[len(q):] + [""] * width)[:width]
+        if at < len(data): data[at] = row
+        else: data.append(row)
+        at += 1
+    return data
+
+def _typed(row, width, booleans=False):
+    # What get_all_records() (or with booleans, sheets_store.read_sheet()) would give back for the row once it is on the sheet.
+    values = numericise_all([_shown(v) for v in list(row)[:width]] + [""] * (width - len(row)))
+    return [sheets_store.BOOL_VALUES.get(v, v) if isinstance(v, str) else v for v in values] if booleans else values
+
+def with_pending(df, spreadsheet, worksheet, booleans=False):
+    """df (as read by get_all_records) with the worksheet's queued rows added at the end.
+
+    booleans=True types TRUE / FALSE cells as bools, as in sheets_store.read_sheet() copies.
+    """
+    rows = pending_rows(spreadsheet, worksheet)
+    if not rows or len(df.columns) == 0: return df
+    extra = pd.DataFrame([_typed(r, len(df.columns), booleans) for r in rows], columns=df.columns)
+    return pd.concat([df, extra], ignore_index=True) if not df.empty else extra
+
+def pending_records(records, header, spreadsheet, worksheet):
+    """get_all_records()-style list with the worksheet's queued rows added at the end."""
+    rows = pending_rows(spreadsheet, worksheet)
+    if not rows or not header: return records
+    return list(records) + [dict(zip(header, _typed(r, len(header)))) for r in rows]
+
+def overlay(spreadsheet, worksheet):
+    """Decorator for a cached DataFrame loader: adds queued rows to what it returns; .clear() still reaches the cache."""
+    def wrap(loader):
+        @functools.wraps(loader)
+        def load(*args, **kwargs): return with_pending(loader(*args, **kwargs), spreadsheet, worksheet)
+        load.clear = loader.clear
+        return load
+    return wrap
+
+def render_pending(spreadsheet):
+    """Shows how many entries are still waiting to reach Google, with a manual retry."""
+    n = pending_count(spreadsheet)
+    if not n: return
+    c1, c2 = st.columns([3, 1])
+    c1.warning(f"📤 {n} entr{'y' if n == 1 else 'ies'} saved on this device, waiting to sync with Google Sheets.")
+    if c2.button("🔁 Sync now", key=f"wq_sync_{spreadsheet}", use_container_width=True):
+        try: flush(force=True)
+        except Exception: pass
+        st.rerun()